@@ -4,201 +4,782 @@ Data Analytics Dashboard - Advanced Version
 Sistema avanzado de análisis de datos empresariales con pandas, SQLite y más funcionalidades
 """
 
-from fastapi import FastAPI, HTTPException, Query, Response
+from fastapi import FastAPI, HTTPException, Path, Query, Request, Response
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse, FileResponse
+from starlette.background import BackgroundTask
+from fastapi.responses import HTMLResponse, FileResponse, StreamingResponse
+from pydantic import BaseModel, Field
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
+from email.utils import formatdate, parsedate_to_datetime
+import asyncio
+import hashlib
 import json
 import os
+import tempfile
+import time
 from typing import Dict, List, Optional
 import uvicorn
 import pandas as pd
 import numpy as np
 
-from database import DatabaseManager
+from database import DatabaseManager, EXPORT_FORMATS, WorkingSetExceededError, column_types
+from cache import SummaryCache
+from compression import CompressionMiddleware
+from cube import (BASE_MEASURES, CUBE_DIMENSIONS, CUBE_MEASURES, cube_grouping, cube_table,
+                  finer_groupings, parse_names, roll_up)
+from executor import DatabaseExecutor, QueueFullError
+from jobs import DONE, ExportJobManager
+from serialization import JSON_CELL_BYTES, FastJSONResponse, columnar, dumps
+from streaming import (ARROW_AVAILABLE, ArrowUnavailableError, arrow_chunks, csv_chunks,
+                       ndjson_chunks, parquet_chunks)
+
+# Referencia para medir el tiempo hasta poder atender la primera petición
+STARTUP_STARTED_AT = time.perf_counter()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Inicializar datos al arrancar y liberar recursos al apagar"""
+    print(f"Inicializando base de datos (modo {SEED_MODE})...")
+    seeded = db.seed(SEED_MODE, SEED_ROWS)
+    startup_metrics.update(
+        seed_mode=SEED_MODE,
+        seeded=seeded,
+        time_to_first_request_ms=round((time.perf_counter() - STARTUP_STARTED_AT) * 1000, 1)
+    )
+    print(f"Base de datos {'inicializada con datos de muestra' if seeded else 'sin cambios'}; "
+          f"listo para peticiones en {startup_metrics['time_to_first_request_ms']} ms")
+    # Exportaciones caducadas, también las que dejó un proceso anterior
+    export_jobs.sweep()
+    sweeper = asyncio.create_task(sweep_exports())
+    yield
+    sweeper.cancel()
+    # Cerrar pools de trabajo y conexiones
+    query_executor.shutdown(wait=False)
+    export_executor.shutdown(wait=False)
+    ingest_executor.shutdown(wait=False)
+    export_jobs.shutdown(wait=False)
+    db.close()
 
 app = FastAPI(
     title="Data Analytics Dashboard - Advanced",
     description="Sistema avanzado de análisis de datos empresariales con pandas y SQLite",
-    version="2.0.0"
+    version="2.0.0",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse
 )
 
+# Compresión gzip/brotli negociada para respuestas de texto por encima del umbral
+app.add_middleware(CompressionMiddleware,
+                   minimum_size=int(os.getenv("COMPRESSION_MIN_SIZE", "1024")))
+
+# Caché HTTP: los estáticos se reutilizan STATIC_MAX_AGE segundos y el
+# dashboard se revalida siempre con su ETag
+STATIC_CACHE_CONTROL = f"public, max-age={int(os.getenv('STATIC_MAX_AGE', '3600'))}"
+DASHBOARD_PATH = os.path.join("static", "dashboard_advanced.html")
+
+class CachedStaticFiles(StaticFiles):
+    """StaticFiles con Cache-Control (ETag y Last-Modified ya los pone Starlette)"""
+
+    def file_response(self, *args, **kwargs):
+        response = super().file_response(*args, **kwargs)
+        response.headers.setdefault("Cache-Control", STATIC_CACHE_CONTROL)
+        return response
+
 # Montar archivos estáticos
-app.mount("/static", StaticFiles(directory="static"), name="static")
+app.mount("/static", CachedStaticFiles(directory="static"), name="static")
 
 # Inicializar base de datos
-db = DatabaseManager()
+# ANALYTICS_BACKEND=duckdb agrega resumen y tendencias con DuckDB sobre un
+# espejo Parquet de sales (DUCKDB_MIRROR_DIR, por defecto <DATABASE_PATH>.mirror);
+# ANALYTICS_BACKEND=snapshot lo hace con NumPy sobre una copia de sales en memoria.
+# MAX_WORKING_SET_MB limita la memoria de cada lectura a DataFrame y del snapshot
+# (las lecturas que lo superan se rechazan y el snapshot se degrada a SQLite)
+MAX_WORKING_SET_MB = int(os.getenv("MAX_WORKING_SET_MB", "0"))
+db = DatabaseManager(
+    os.getenv("DATABASE_PATH", "analytics.db"),
+    pool_size=int(os.getenv("DB_POOL_SIZE", "8")),
+    backend=os.getenv("ANALYTICS_BACKEND", "sqlite"),
+    mirror_dir=os.getenv("DUCKDB_MIRROR_DIR") or None,
+    max_working_set=MAX_WORKING_SET_MB * 1024 * 1024 or None
+)
+
+# Siembra al arrancar: seed-if-empty (por defecto), never o always
+SEED_MODE = os.getenv("STARTUP_SEED_MODE", "seed-if-empty")
+SEED_ROWS = int(os.getenv("STARTUP_SEED_ROWS", "1000"))
+startup_metrics: Dict = {}
+
+# Pools acotados para el trabajo síncrono de sqlite3/pandas: uno para consultas
+# y otro para exportaciones, para que una exportación larga no bloquee /health
+query_executor = DatabaseExecutor(
+    max_workers=int(os.getenv("DB_WORKERS", "4")),
+    max_queue=int(os.getenv("DB_QUEUE_DEPTH", "64")),
+    timeout=float(os.getenv("DB_REQUEST_TIMEOUT", "30")),
+    name="db-query"
+)
+export_executor = DatabaseExecutor(
+    max_workers=int(os.getenv("EXPORT_WORKERS", "2")),
+    max_queue=int(os.getenv("EXPORT_QUEUE_DEPTH", "4")),
+    timeout=float(os.getenv("EXPORT_REQUEST_TIMEOUT", "300")),
+    name="db-export",
+    processes=os.getenv("EXPORT_PROCESSES", "1") == "1"
+)
+
+# Ingesta masiva: un solo worker (SQLite admite un escritor) y cuerpo en disco
+# a partir de INGEST_SPOOL_BYTES
+ingest_executor = DatabaseExecutor(
+    max_workers=1,
+    max_queue=int(os.getenv("INGEST_QUEUE_DEPTH", "4")),
+    timeout=float(os.getenv("INGEST_REQUEST_TIMEOUT", "600")),
+    name="db-ingest"
+)
+INGEST_SPOOL_BYTES = int(os.getenv("INGEST_SPOOL_BYTES", str(16 * 1024 * 1024)))
+
+# Paginación de /api/sales
+DEFAULT_PAGE_SIZE = int(os.getenv("SALES_PAGE_SIZE", "1000"))
+MAX_PAGE_SIZE = int(os.getenv("SALES_MAX_PAGE_SIZE", "10000"))
+STREAM_CHUNK_SIZE = int(os.getenv("STREAM_CHUNK_SIZE", "5000"))
+# Filas por row group en Parquet (bloques mayores comprimen mejor)
+PARQUET_ROW_GROUP_SIZE = int(os.getenv("PARQUET_ROW_GROUP_SIZE", "100000"))
+
+# Formatos columnares tipados (requieren pyarrow)
+COLUMNAR_MEDIA_TYPES = {
+    "arrow": "application/vnd.apache.arrow.stream",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+# Caché compartida de resúmenes (se invalida al escribir en sales)
+summary_cache = SummaryCache(
+    ttl=float(os.getenv("SUMMARY_CACHE_TTL", "30")),
+    maxsize=int(os.getenv("SUMMARY_CACHE_SIZE", "128"))
+)
+db.add_change_listener(summary_cache.invalidate)
+
+def data_cache_prefix():
+    """Base de las claves de caché: base de datos, backend y versión de sus datos"""
+    return (db.db_path, db.backend, db.get_data_version())
+
+def data_cache_key(*parts):
+    """Clave de caché ligada a la base de datos, su backend y la versión de sus datos"""
+    return data_cache_prefix() + parts
+
+def get_summary(**filters):
+    """Obtener el resumen analítico desde la caché compartida
+
+    La clave incluye la versión de datos guardada en SQLite, de modo que las
+    escrituras hechas por otros workers también dejan obsoleta la entrada.
+    """
+    key = data_cache_key("summary", tuple(sorted(filters.items())))
+    return summary_cache.get_or_compute(key, lambda: db.get_analytics_summary(**filters))
+
+def get_trends(by="product"):
+    """Obtener las tendencias desde la caché compartida"""
+    key = data_cache_key("trends", by)
+    return summary_cache.get_or_compute(key, lambda: db.get_trends(by))
+
+def get_cuboid(dims, **filters):
+    """Cuboide para dims desde la caché compartida
+
+    Si ya hay en caché un cuboide más fino con los mismos filtros se agrega
+    en pandas desde él (el más pequeño que sirva); si no, se calcula con una
+    consulta agrupada. En ambos casos el resultado queda cacheado para
+    servir después cuboides aún más gruesos.
+    """
+    # Una sola versión de datos para todas las claves: no se mezclan cuboides de dos versiones
+    prefix = data_cache_prefix() + ("cube", tuple(sorted(filters.items())))
+    grouping = cube_grouping(dims)
+
+    def compute():
+        for finer in finer_groupings(grouping):
+            found, cuboid = summary_cache.get(prefix + (finer,))
+            if found:
+                return roll_up(cuboid, grouping)
+        return db.get_cube(grouping, **filters)
+
+    return summary_cache.get_or_compute(prefix + (grouping,), compute)
+
+def get_filters(include_dates=False):
+    """Obtener las opciones de filtro desde la caché compartida"""
+    key = data_cache_key("filters", include_dates)
+    return summary_cache.get_or_compute(key, lambda: db.get_filter_options(include_dates))
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Comprobar si If-None-Match incluye el ETag actual"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = [value.strip() for value in header.split(",")]
+    return "*" in candidates or etag in candidates
+
+async def cache_validators(request: Request, tag: str):
+    """Cabeceras ETag/Last-Modified según la versión de datos y respuesta 304 si procede
 
-@app.on_event("startup")
-async def startup_event():
-    """Inicializar datos de muestra al arrancar"""
-    print("Inicializando base de datos...")
-    db.generate_sample_data(1000)  # Generar 1000 registros de muestra
-    print("Base de datos inicializada correctamente")
+    Devuelve (cabeceras, respuesta 304 o None). Se consulta antes de calcular
+    nada, así que una revalidación no ejecuta la agregación.
+    """
+    version, modified = await run_db(db.get_data_state)
+    etag = f'W/"{tag}-{version}"'
+    headers = {
+        "ETag": etag,
+        "Last-Modified": formatdate(modified, usegmt=True),
+        "Cache-Control": "no-cache",
+    }
+    if request.headers.get("if-none-match"):
+        fresh = etag_matches(request, etag)
+    else:
+        fresh = not_modified_since(request, modified)
+    return headers, (Response(status_code=304, headers=headers) if fresh else None)
+
+def query_tag(request: Request, name: str) -> str:
+    """Etiqueta de ETag que distingue cada combinación de parámetros de consulta"""
+    if not request.query_params:
+        return name
+    return f"{name}-{hashlib.sha1(str(request.query_params).encode('utf-8')).hexdigest()[:12]}"
+
+def not_modified_since(request: Request, modified: int) -> bool:
+    """Comprobar If-Modified-Since (solo se usa si no hay If-None-Match)"""
+    header = request.headers.get("if-modified-since")
+    if not header:
+        return False
+    try:
+        return modified <= parsedate_to_datetime(header).timestamp()
+    except (TypeError, ValueError):
+        return False
+
+_dashboard_cache: Dict = {"mtime": None}
+
+def load_dashboard():
+    """HTML del dashboard en memoria; solo se relee si cambia el fichero"""
+    mtime = os.stat(DASHBOARD_PATH).st_mtime_ns
+    if _dashboard_cache["mtime"] != mtime:
+        with open(DASHBOARD_PATH, "rb") as f:
+            content = f.read()
+        _dashboard_cache.update(
+            mtime=mtime,
+            content=content,
+            etag=f'"{hashlib.sha1(content).hexdigest()[:16]}"'
+        )
+    return _dashboard_cache["content"], _dashboard_cache["etag"]
+
+# Los trabajos esperan en un hilo de export_jobs, pero openpyxl y la
+# serialización se ejecutan en export_executor (procesos con EXPORT_PROCESSES=1)
+def run_excel_job(path, progress):
+    """Exportación Excel en segundo plano con el resumen de la caché"""
+    export_executor.call_with_progress(db.export_to_excel, path, get_summary(), progress=progress)
+
+def run_csv_job(path, progress, table, gzip=False):
+    """Exportación CSV en segundo plano"""
+    export_executor.call_with_progress(db.export_to_csv, table, path, gzip=gzip, progress=progress)
+
+def run_arrow_job(path, progress, table):
+    """Exportación Arrow IPC en segundo plano"""
+    export_executor.call_with_progress(db.export_table, table, "arrow", path, progress=progress)
+
+def run_parquet_job(path, progress, table):
+    """Exportación Parquet en segundo plano"""
+    export_executor.call_with_progress(db.export_table, table, "parquet", path, progress=progress,
+                                       chunk_size=PARQUET_ROW_GROUP_SIZE)
+
+# Trabajos de exportación asíncronos: el cliente encola, consulta el progreso
+# y descarga el fichero sin mantener abierta una conexión larga
+export_jobs = ExportJobManager(
+    {"excel": run_excel_job, "csv": run_csv_job, "arrow": run_arrow_job,
+     "parquet": run_parquet_job},
+    directory=os.getenv("EXPORT_JOBS_DIR", os.path.join("exports", "jobs")),
+    max_workers=int(os.getenv("EXPORT_JOB_WORKERS", "2")),
+    max_queue=int(os.getenv("EXPORT_JOB_QUEUE_DEPTH", "8")),
+    retention=float(os.getenv("EXPORT_JOB_RETENTION", "3600"))
+)
+
+# Segundos entre barridos del directorio de exportaciones
+EXPORT_JOB_SWEEP_INTERVAL = float(os.getenv("EXPORT_JOB_SWEEP_INTERVAL", "300"))
+
+async def sweep_exports():
+    """Borrar periódicamente las exportaciones caducadas aunque no lleguen peticiones"""
+    while True:
+        await asyncio.sleep(EXPORT_JOB_SWEEP_INTERVAL)
+        try:
+            await asyncio.to_thread(export_jobs.sweep)
+        except Exception as e:
+            print(f"Error al limpiar exportaciones: {e}")
+
+EXPORT_MEDIA_TYPES = {
+    "excel": 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    "csv": 'text/csv',
+    **COLUMNAR_MEDIA_TYPES,
+}
+
+class ExportRequest(BaseModel):
+    """Cuerpo de POST /api/exports"""
+    kind: str = Field("excel", pattern="^(excel|csv|arrow|parquet)$", description="Tipo de exportación")
+    table: str = Field("sales", description="Tabla a exportar (CSV, Arrow y Parquet)")
+    gzip: bool = Field(False, description="Comprimir el CSV con gzip")
+
+def export_job_payload(job) -> Dict:
+    """Estado público de un trabajo de exportación"""
+    payload = job.to_dict()
+    payload["download_url"] = f"/api/exports/{job.id}/download" if job.status == DONE else None
+    return payload
+
+async def run_db(fn, *args, executor: DatabaseExecutor = query_executor, **kwargs):
+    """Ejecutar una llamada síncrona a la base de datos fuera del event loop"""
+    try:
+        return await executor.run(fn, *args, **kwargs)
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Tiempo de espera agotado")
 
 @app.get("/", response_class=HTMLResponse)
-async def dashboard():
+async def dashboard(request: Request):
     """Servir el dashboard principal"""
-    with open("static/dashboard_advanced.html", "r", encoding="utf-8") as f:
-        return HTMLResponse(content=f.read())
+    content, etag = load_dashboard()
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    return HTMLResponse(content=content, headers=headers)
 
 @app.get("/api/data")
-async def get_analytics_data():
-    """Obtener todos los datos de análisis"""
+async def get_analytics_data(
+    request: Request,
+    response: Response,
+    start_date: Optional[str] = Query(None, description="Fecha de inicio (YYYY-MM-DD)"),
+    end_date: Optional[str] = Query(None, description="Fecha de fin (YYYY-MM-DD)"),
+    product: Optional[str] = Query(None, description="Filtrar por producto"),
+    region: Optional[str] = Query(None, description="Filtrar por región"),
+):
+    """Obtener todos los datos de análisis
+
+    Con filtros se agregan en el servidor solo las ventas que cumplen; el
+    crecimiento se calcula hasta end_date.
+    """
+    filters = {name: value for name, value in (("start_date", start_date), ("end_date", end_date),
+                                               ("product", product), ("region", region)) if value}
     try:
-        data = db.get_analytics_summary()
+        headers, not_modified = await cache_validators(request, query_tag(request, "data"))
+        if not_modified:
+            return not_modified
+        data = await run_db(get_summary, **filters)
+        response.headers.update(headers)
         return {"success": True, "data": data}
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/api/sales")
-async def get_sales_data(
+@app.get("/api/totals")
+async def get_range_totals(
+    request: Request,
+    response: Response,
     start_date: Optional[str] = Query(None, description="Fecha de inicio (YYYY-MM-DD)"),
     end_date: Optional[str] = Query(None, description="Fecha de fin (YYYY-MM-DD)"),
     product: Optional[str] = Query(None, description="Filtrar por producto"),
-    region: Optional[str] = Query(None, description="Filtrar por región")
+    region: Optional[str] = Query(None, description="Filtrar por región"),
+    compare: Optional[str] = Query(None, description="previous, mom, qoq, yoy o custom"),
+    compare_start: Optional[str] = Query(None, description="Inicio del periodo con compare=custom"),
+    compare_end: Optional[str] = Query(None, description="Fin del periodo con compare=custom"),
 ):
-    """Obtener datos de ventas con filtros opcionales"""
+    """Totales de un rango de fechas cualquiera y comparación con otro periodo
+
+    Se responden desde el índice de sumas prefijas: el coste no depende de
+    la longitud del rango.
+    """
     try:
-        df = db.get_sales_data(start_date, end_date)
-        
-        # Aplicar filtros adicionales
-        if product and product != "":
-            df = df[df['product'] == product]
+        headers, not_modified = await cache_validators(request, query_tag(request, "totals"))
+        if not_modified:
+            return not_modified
+        data = await run_db(db.compare_periods, start_date or None, end_date or None,
+                            compare or None, product or None, region or None,
+                            compare_start or None, compare_end or None)
+        response.headers.update(headers)
+        return {"success": True, "data": data}
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/cube")
+async def get_cube_data(
+    request: Request,
+    response: Response,
+    dims: str = Query("month", description=f"Dimensiones separadas por comas ({', '.join(CUBE_DIMENSIONS)})"),
+    measures: str = Query(",".join(BASE_MEASURES),
+                          description=f"Medidas separadas por comas ({', '.join(CUBE_MEASURES)})"),
+    start_date: Optional[str] = Query(None, description="Fecha de inicio (YYYY-MM-DD)"),
+    end_date: Optional[str] = Query(None, description="Fecha de fin (YYYY-MM-DD)"),
+    product: Optional[str] = Query(None, description="Filtrar por producto"),
+    region: Optional[str] = Query(None, description="Filtrar por región"),
+    category: Optional[str] = Query(None, description="Filtrar por categoría de producto"),
+):
+    """Cubo OLAP: medidas agregadas por cualquier combinación de dimensiones
+
+    La respuesta es columnar ({dims, measures, columns, data}) y está
+    ordenada por las dimensiones en el orden pedido.
+    """
+    filters = {name: value for name, value in (("start_date", start_date), ("end_date", end_date),
+                                               ("product", product), ("region", region),
+                                               ("category", category)) if value}
+    try:
+        dim_names = parse_names(dims, CUBE_DIMENSIONS, "Dimensiones")
+        measure_names = parse_names(measures, CUBE_MEASURES, "Medidas")
+        if not measure_names:
+            raise ValueError("Indica al menos una medida")
+        headers, not_modified = await cache_validators(request, query_tag(request, "cube"))
+        if not_modified:
+            return not_modified
         
-        if region and region != "":
-            df = df[df['region'] == region]
+        def load_cube():
+            table = cube_table(get_cuboid(dim_names, **filters), dim_names, measure_names)
+            return {"dims": list(dim_names), "measures": list(measure_names), **columnar(table)}
         
-        return {"success": True, "data": df.to_dict('records')}
+        data = await run_db(load_cube)
+        response.headers.update(headers)
+        return {"success": True, "data": data}
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/sales")
+async def get_sales_data(
+    request: Request,
+    start_date: Optional[str] = Query(None, description="Fecha de inicio (YYYY-MM-DD)"),
+    end_date: Optional[str] = Query(None, description="Fecha de fin (YYYY-MM-DD)"),
+    product: Optional[str] = Query(None, description="Filtrar por producto"),
+    region: Optional[str] = Query(None, description="Filtrar por región"),
+    cursor: Optional[int] = Query(None, description="Devolver filas con id mayor que el cursor"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Tamaño de página"),
+    fields: Optional[str] = Query(None, description="Columnas separadas por comas"),
+    response_format: str = Query("json", alias="format", pattern="^(json|ndjson|csv|arrow|parquet)$",
+                                 description="Formato de respuesta"),
+    layout: str = Query("records", pattern="^(records|columns)$",
+                        description="JSON por registros o {columns, data} por filas")
+):
+    """Obtener datos de ventas con filtros opcionales
+
+    Con limit o cursor la respuesta se pagina por id y next_cursor indica
+    el cursor de la página siguiente (None en la última). Con format=ndjson
+    o format=csv el resultado completo se transmite por bloques. Con
+    layout=columns el JSON es {columns: [...], data: [[...], ...]}.
+    format=arrow (stream Arrow IPC) y format=parquet devuelven columnas
+    tipadas construidas desde los bloques del cursor; requieren pyarrow (501).
+    """
+    field_list = [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+    headers, not_modified = await cache_validators(request, query_tag(request, "sales"))
+    if not_modified:
+        return not_modified
+    
+    if response_format != "json":
+        chunk_size = PARQUET_ROW_GROUP_SIZE if response_format == "parquet" else STREAM_CHUNK_SIZE
+        try:
+            columns, row_chunks = db.iter_sales_rows(start_date, end_date, product, region,
+                                                     field_list, after_id=cursor, limit=limit,
+                                                     chunk_size=chunk_size)
+            if response_format in COLUMNAR_MEDIA_TYPES:
+                encoder = arrow_chunks if response_format == "arrow" else parquet_chunks
+                chunks = encoder(columns, column_types(columns), row_chunks)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except ArrowUnavailableError as e:
+            raise HTTPException(status_code=501, detail=str(e))
+        if response_format in COLUMNAR_MEDIA_TYPES:
+            filename = f"sales.{EXPORT_FORMATS[response_format]}"
+            return StreamingResponse(chunks, media_type=COLUMNAR_MEDIA_TYPES[response_format],
+                                     headers={**headers,
+                                              "Content-Disposition": f'attachment; filename="{filename}"'})
+        if response_format == "ndjson":
+            return StreamingResponse(ndjson_chunks(columns, row_chunks),
+                                     media_type="application/x-ndjson", headers=headers)
+        return StreamingResponse(csv_chunks(columns, row_chunks), media_type="text/csv",
+                                 headers={**headers,
+                                          "Content-Disposition": 'attachment; filename="sales.csv"'})
+    
+    def load_sales():
+        # La consulta y la codificación JSON se hacen en el pool, no en el event loop
+        if limit is None and cursor is None:
+            df = db.get_sales_data(start_date, end_date, product, region, field_list)
+            next_cursor = None
+        else:
+            df, next_cursor = db.get_sales_page(start_date, end_date, product, region, field_list,
+                                                after_id=cursor, limit=limit or DEFAULT_PAGE_SIZE)
+        # Los dicts por registro y el JSON ocupan varias veces lo que el DataFrame
+        db.check_working_set(int(df.memory_usage(deep=True).sum()) + df.size * JSON_CELL_BYTES,
+                             "La respuesta JSON de ventas")
+        if layout == "columns":
+            return dumps({"success": True, **columnar(df), "next_cursor": next_cursor})
+        return dumps({"success": True, "data": df.to_dict('records'), "next_cursor": next_cursor})
+    
+    try:
+        body = await run_db(load_sales)
+        return Response(content=body, media_type="application/json", headers=headers)
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except WorkingSetExceededError as e:
+        raise HTTPException(status_code=413,
+                            detail=f"{e}; usa limit/cursor o format=ndjson|csv|arrow|parquet")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/sales/bulk")
+async def bulk_ingest_sales(
+    request: Request,
+    input_format: Optional[str] = Query(None, alias="format", pattern="^(ndjson|csv)$",
+                                        description="Formato del cuerpo (por defecto según Content-Type)")
+):
+    """Añadir ventas en bloque desde un cuerpo NDJSON o CSV
+
+    El cuerpo se copia por bloques a un fichero temporal (en memoria hasta
+    INGEST_SPOOL_BYTES) y se inserta fuera del event loop. La respuesta
+    informa de filas recibidas, insertadas, rechazadas y filas por segundo.
+    Con SQLite en un núcleo se insertan unas 45-50k filas/s (benchmark.py ingest).
+    """
+    if input_format is None:
+        content_type = request.headers.get("content-type", "")
+        input_format = "csv" if "csv" in content_type else "ndjson"
+    
+    with tempfile.SpooledTemporaryFile(max_size=INGEST_SPOOL_BYTES) as body:
+        async for chunk in request.stream():
+            body.write(chunk)
+        body.seek(0)
+        try:
+            report = await run_db(db.ingest, body, input_format, executor=ingest_executor)
+        except HTTPException:
+            raise
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+    return {"success": True, "data": report}
+
 @app.get("/api/products")
-async def get_products_data():
+async def get_products_data(request: Request, response: Response):
     """Obtener datos de productos"""
     try:
-        data = db.get_analytics_summary()
+        headers, not_modified = await cache_validators(request, "products")
+        if not_modified:
+            return not_modified
+        data = await run_db(get_summary)
+        response.headers.update(headers)
         return {"success": True, "data": data["product_data"]}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/regions")
-async def get_regions_data():
+async def get_regions_data(request: Request, response: Response):
     """Obtener datos de regiones"""
     try:
-        data = db.get_analytics_summary()
+        headers, not_modified = await cache_validators(request, "regions")
+        if not_modified:
+            return not_modified
+        data = await run_db(get_summary)
+        response.headers.update(headers)
         return {"success": True, "data": data["region_data"]}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/metrics")
-async def get_metrics():
+async def get_metrics(request: Request, response: Response):
     """Obtener métricas generales"""
     try:
-        data = db.get_analytics_summary()
+        headers, not_modified = await cache_validators(request, "metrics")
+        if not_modified:
+            return not_modified
+        data = await run_db(get_summary)
+        response.headers.update(headers)
         return {"success": True, "data": data["metrics"]}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/export/csv/{table_name}")
-async def export_csv(table_name: str):
-    """Exportar datos a CSV"""
+async def export_csv(
+    table_name: str,
+    gzip: bool = Query(False, description="Comprimir el CSV con gzip")
+):
+    """Exportar datos a CSV transmitiendo las filas directamente desde la base de datos"""
+    if table_name not in ['sales', 'products', 'regions']:
+        raise HTTPException(status_code=400, detail="Tabla no válida")
+    
     try:
-        if table_name not in ['sales', 'products', 'regions']:
-            raise HTTPException(status_code=400, detail="Tabla no válida")
-        
-        filename = db.export_to_csv(table_name)
-        return FileResponse(
-            filename, 
-            media_type='text/csv',
-            filename=filename
-        )
+        chunks = db.iter_table_csv(table_name, gzip=gzip, chunk_size=STREAM_CHUNK_SIZE)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    filename = f"{table_name}_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+    if gzip:
+        filename += ".gz"
+    return StreamingResponse(
+        chunks,
+        media_type='application/gzip' if gzip else 'text/csv',
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@app.get("/api/export/{export_format}/{table_name}")
+async def export_columnar(
+    table_name: str,
+    export_format: str = Path(..., pattern="^(arrow|parquet)$", description="arrow o parquet")
+):
+    """Exportar una tabla como stream Arrow IPC o Parquet con columnas tipadas"""
+    if table_name not in ['sales', 'products', 'regions']:
+        raise HTTPException(status_code=400, detail="Tabla no válida")
+    
+    chunk_size = PARQUET_ROW_GROUP_SIZE if export_format == "parquet" else STREAM_CHUNK_SIZE
+    try:
+        chunks = db.iter_table(table_name, export_format, chunk_size=chunk_size)
+    except ArrowUnavailableError as e:
+        raise HTTPException(status_code=501, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    
+    filename = (f"{table_name}_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+                f".{EXPORT_FORMATS[export_format]}")
+    return StreamingResponse(
+        chunks,
+        media_type=COLUMNAR_MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
 
 @app.get("/api/export/excel")
 async def export_excel():
-    """Exportar todos los datos a Excel"""
+    """Exportar todos los datos a Excel
+
+    El libro se escribe en un fichero temporal que se borra después de enviarlo.
+    """
+    fd, path = tempfile.mkstemp(suffix=".xlsx", prefix="analytics_export_")
+    os.close(fd)
     try:
-        filename = db.export_to_excel()
-        return FileResponse(
-            filename,
-            media_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            filename=filename
-        )
+        # El resumen sale de la caché compartida en lugar de volver a agregar sales
+        summary = await run_db(get_summary)
+        await run_db(db.export_to_excel, path, summary, executor=export_executor)
+    except HTTPException:
+        os.remove(path)
+        raise
     except Exception as e:
+        os.remove(path)
         raise HTTPException(status_code=500, detail=str(e))
+    
+    return FileResponse(
+        path,
+        media_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        filename=f"analytics_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
+        background=BackgroundTask(os.remove, path)
+    )
+
+@app.post("/api/exports", status_code=202)
+async def create_export_job(request: ExportRequest, response: Response):
+    """Encolar una exportación en segundo plano
+
+    Devuelve 202 con el trabajo creado, o 200 con el trabajo existente si ya
+    hay uno idéntico para la versión actual de los datos.
+    """
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    if request.kind == "csv":
+        if request.table not in ['sales', 'products', 'regions']:
+            raise HTTPException(status_code=400, detail="Tabla no válida")
+        params = {"table": request.table, "gzip": request.gzip}
+        filename = f"{request.table}_export_{timestamp}.csv" + (".gz" if request.gzip else "")
+    elif request.kind in COLUMNAR_MEDIA_TYPES:
+        if request.table not in ['sales', 'products', 'regions']:
+            raise HTTPException(status_code=400, detail="Tabla no válida")
+        if not ARROW_AVAILABLE:
+            raise HTTPException(status_code=501, detail="Los formatos arrow y parquet requieren el paquete pyarrow")
+        params = {"table": request.table}
+        filename = f"{request.table}_export_{timestamp}.{EXPORT_FORMATS[request.kind]}"
+    else:
+        params = {}
+        filename = f"analytics_export_{timestamp}.xlsx"
+    
+    try:
+        version = await run_db(db.get_data_version)
+        job, created = export_jobs.submit(request.kind, params, filename, version=version)
+    except HTTPException:
+        raise
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    response.status_code = 202 if created else 200
+    response.headers["Location"] = f"/api/exports/{job.id}"
+    return {"success": True, "data": export_job_payload(job)}
+
+@app.get("/api/exports/{job_id}")
+async def get_export_job(job_id: str):
+    """Estado y progreso (filas escritas) de una exportación"""
+    job = export_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Exportación no encontrada o caducada")
+    return {"success": True, "data": export_job_payload(job)}
+
+@app.get("/api/exports/{job_id}/download")
+async def download_export_job(job_id: str):
+    """Descargar el fichero de una exportación terminada"""
+    job = export_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Exportación no encontrada o caducada")
+    if job.status != DONE:
+        raise HTTPException(status_code=409, detail=f"Exportación no disponible: {job.status}")
+    
+    media_type = EXPORT_MEDIA_TYPES[job.kind]
+    if job.params.get("gzip"):
+        media_type = 'application/gzip'
+    return FileResponse(job.path, media_type=media_type, filename=job.filename)
 
 @app.get("/api/filters")
-async def get_filter_options():
-    """Obtener opciones para filtros"""
+async def get_filter_options(
+    request: Request,
+    response: Response,
+    include_dates: bool = Query(False, description="Incluir la lista completa de fechas")
+):
+    """Obtener opciones para filtros
+
+    Por defecto solo devuelve los límites de fechas. La respuesta lleva un
+    ETag ligado a la versión de los datos; con If-None-Match se responde 304.
+    """
     try:
-        # Obtener fechas disponibles
-        sales_df = db.get_sales_data()
-        
-        # Verificar que hay datos
-        if len(sales_df) == 0:
-            return {
-                "success": True,
-                "data": {
-                    "dates": {
-                        "min": None,
-                        "max": None,
-                        "available": []
-                    },
-                    "products": [],
-                    "regions": []
-                }
-            }
-        
-        dates = sorted(sales_df['date'].unique().tolist())
+        headers, not_modified = await cache_validators(
+            request, "filters-dates" if include_dates else "filters")
+        if not_modified:
+            return not_modified
         
-        # Obtener productos únicos
-        products = sorted(sales_df['product'].unique().tolist())
-        
-        # Obtener regiones únicas
-        regions = sorted(sales_df['region'].unique().tolist())
-        
-        return {
-            "success": True,
-            "data": {
-                "dates": {
-                    "min": min(dates) if dates else None,
-                    "max": max(dates) if dates else None,
-                    "available": dates
-                },
-                "products": products,
-                "regions": regions
-            }
-        }
+        data = await run_db(get_filters, include_dates)
+        response.headers.update(headers)
+        return {"success": True, "data": data}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/trends")
-async def get_trends_analysis():
+async def get_trends_analysis(
+    request: Request,
+    response: Response,
+    by: str = Query("product", pattern="^(product|region|product_region)$",
+                    description="Agrupación: product, region o product_region")
+):
     """Obtener análisis de tendencias"""
     try:
-        sales_df = db.get_sales_data()
-        sales_df['date'] = pd.to_datetime(sales_df['date'])
-        
-        # Análisis de tendencias por producto
-        product_trends = {}
-        for product in sales_df['product'].unique():
-            product_data = sales_df[sales_df['product'] == product]
-            monthly_sales = product_data.groupby(product_data['date'].dt.to_period('M'))['sales_amount'].sum()
-            
-            # Calcular tendencia (pendiente de regresión lineal simple)
-            if len(monthly_sales) > 1:
-                x = np.arange(len(monthly_sales))
-                y = monthly_sales.values
-                trend = np.polyfit(x, y, 1)[0]  # Pendiente
-                product_trends[product] = {
-                    'trend': round(trend, 2),
-                    'direction': 'up' if trend > 0 else 'down',
-                    'strength': 'strong' if abs(trend) > 1000 else 'weak'
-                }
-        
-        return {"success": True, "data": product_trends}
+        headers, not_modified = await cache_validators(request, f"trends-{by}")
+        if not_modified:
+            return not_modified
+        data = await run_db(get_trends, by)
+        response.headers.update(headers)
+        return {"success": True, "data": data}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -207,13 +788,18 @@ async def health_check():
     """Health check del sistema"""
     try:
         # Verificar conexión a base de datos
-        db.get_analytics_summary()
-        return {
+        await run_db(get_summary)
+        health = {
             "status": "healthy", 
             "timestamp": datetime.now().isoformat(),
             "database": "connected",
-            "version": "2.0.0"
+            "backend": db.backend,
+            "version": "2.0.0",
+            "startup": startup_metrics
         }
+        if db.backend == "snapshot":
+            health["snapshot"] = await run_db(lambda: db.sales_snapshot().memory_usage())
+        return health
     except Exception as e:
         return {
             "status": "unhealthy",
@@ -0,0 +1,605 @@
+#!/usr/bin/env python3
+"""
+Benchmarks para Data Analytics Dashboard
+Mediciones de rendimiento que no forman parte de los tests unitarios
+
+Uso:
+    python benchmark.py loadtest --rows 50000 --exports 4
+    python benchmark.py indexes --rows 1000000 10000000
+    python benchmark.py stream --rows 100000 5000000
+    python benchmark.py ingest --rows 1000000 --base-rows 1000000
+    python benchmark.py json --rows 100000 500000
+    python benchmark.py columnar --rows 100000 1000000
+    python benchmark.py backends --rows 1000000 10000000 50000000
+    python benchmark.py snapshot --rows 1000000 5000000
+    python benchmark.py totals --rows 1000000 --queries 1000
+    python benchmark.py cube --rows 1000000
+"""
+
+import argparse
+import asyncio
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+
+def percentile(values, pct):
+    """Percentil pct (0-100) de una lista de valores"""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def report_latencies(label, latencies):
+    """Imprimir p50/p99 en milisegundos"""
+    print(f"{label:<28} n={len(latencies):<5} "
+          f"p50={percentile(latencies, 50) * 1000:8.2f} ms  "
+          f"p99={percentile(latencies, 99) * 1000:8.2f} ms  "
+          f"max={max(latencies) * 1000:8.2f} ms")
+
+
+def cmd_loadtest(args):
+    """Latencia de /health sin carga y con exportaciones en curso"""
+    import httpx
+
+    db_path = os.path.join(tempfile.mkdtemp(), "loadtest.db")
+    os.environ["DATABASE_PATH"] = db_path
+    import app_advanced
+
+    print(f"Generando {args.rows} registros en {db_path}...")
+    app_advanced.db.generate_sample_data(args.rows, return_df=False)
+
+    async def probe_health(client, duration):
+        latencies = []
+        deadline = time.perf_counter() + duration
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            response = await client.get("/health")
+            latencies.append(time.perf_counter() - start)
+            response.raise_for_status()
+            await asyncio.sleep(args.interval)
+        return latencies
+
+    async def run_exports(client):
+        async def one_export():
+            response = await client.get("/api/export/excel", timeout=None)
+            return response.status_code
+        return await asyncio.gather(*(one_export() for _ in range(args.exports)))
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=app_advanced.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            baseline = await probe_health(client, args.duration)
+
+            exports = asyncio.create_task(run_exports(client))
+            under_load = []
+            while not exports.done():
+                under_load.extend(await probe_health(client, 0.5))
+            statuses = await exports
+        return baseline, under_load, statuses
+
+    baseline, under_load, statuses = asyncio.run(scenario())
+
+    print()
+    report_latencies("/health sin carga", baseline)
+    report_latencies(f"/health con {args.exports} exportaciones", under_load)
+    print(f"Estados de exportación: {statuses}")
+
+    ratio = percentile(under_load, 99) / max(percentile(baseline, 99), 1e-9)
+    print(f"Relación p99 con carga / sin carga: {ratio:.2f}x")
+
+
+def time_query(conn, sql, params, repeat):
+    """Mediana del tiempo de ejecución de una consulta (en segundos)"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        conn.execute(sql, params).fetchall()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def cmd_indexes(args):
+    """Tiempo de consultas por rango de fechas y filtros con y sin índices"""
+    from database import DatabaseManager, SALES_INDEXES
+
+    queries = [
+        ("rango 30 días",
+         "SELECT COUNT(*), SUM(sales_amount) FROM sales WHERE date BETWEEN ? AND ?",
+         ("{start}", "{end}")),
+        ("producto + rango",
+         "SELECT COUNT(*), SUM(sales_amount) FROM sales WHERE product = ? AND date BETWEEN ? AND ?",
+         ("Laptop Pro", "{start}", "{end}")),
+        ("región + rango",
+         "SELECT COUNT(*), SUM(sales_amount) FROM sales WHERE region = ? AND date BETWEEN ? AND ?",
+         ("Norte", "{start}", "{end}")),
+        ("filas de 7 días",
+         "SELECT * FROM sales WHERE date BETWEEN ? AND ?",
+         ("{start}", "{week_end}")),
+    ]
+
+    for rows in args.rows:
+        db_path = os.path.join(tempfile.mkdtemp(), f"indexes_{rows}.db")
+        db = DatabaseManager(db_path)
+        print(f"\nGenerando {rows} registros en {db_path}...")
+        db.generate_sample_data(rows, return_df=False)
+
+        with db.pool.reader() as conn:
+            max_date = conn.execute("SELECT MAX(date) FROM sales").fetchone()[0]
+        end = datetime.strptime(max_date, '%Y-%m-%d')
+        dates = {
+            "start": (end - timedelta(days=30)).strftime('%Y-%m-%d'),
+            "end": max_date,
+            "week_end": (end - timedelta(days=23)).strftime('%Y-%m-%d'),
+        }
+
+        results = {}
+        for indexed in (False, True):
+            with db.pool.writer() as conn:
+                for name in SALES_INDEXES:
+                    conn.execute(f"DROP INDEX IF EXISTS {name}")
+                if indexed:
+                    for index_sql in SALES_INDEXES.values():
+                        conn.execute(index_sql)
+                conn.execute("ANALYZE")
+            with db.pool.reader() as conn:
+                for label, sql, params in queries:
+                    bound = tuple(p.format(**dates) for p in params)
+                    results[(label, indexed)] = time_query(conn, sql, bound, args.repeat)
+
+        print(f"{'consulta':<20} {'sin índices':>14} {'con índices':>14} {'mejora':>8}")
+        for label, _, _ in queries:
+            before, after = results[(label, False)], results[(label, True)]
+            print(f"{label:<20} {before * 1000:11.2f} ms {after * 1000:11.2f} ms "
+                  f"{before / max(after, 1e-9):7.1f}x")
+        db.close()
+        if not args.keep:
+            os.remove(db_path)
+
+
+def rss_anon_kb():
+    """Memoria anónima (heap) residente del proceso en KiB, sin páginas de ficheros"""
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('RssAnon:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def peak_rss_kb():
+    """RSS pico del proceso actual en KiB
+
+    En Linux se usa VmHWM porque ru_maxrss conserva el pico del proceso
+    padre a través de fork/exec.
+    """
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def cmd_stream_child(args):
+    """Proceso hijo: consumir /api/sales en streaming y mostrar su RSS pico"""
+    from database import DatabaseManager
+    from streaming import csv_chunks, ndjson_chunks
+
+    db = DatabaseManager(args.db)
+    encoder = ndjson_chunks if args.format == 'ndjson' else csv_chunks
+    total = 0
+    if args.rows_only:
+        columns, chunks = db.iter_sales_rows(chunk_size=1)
+        next(chunks, None)
+        chunks.close()
+    else:
+        columns, chunks = db.iter_sales_rows()
+        for chunk in encoder(columns, chunks):
+            total += len(chunk)
+    anon = rss_anon_kb()
+    db.close()
+    print(peak_rss_kb(), anon, total)
+
+
+def cmd_stream(args):
+    """RSS pico al transmitir toda la tabla sales como NDJSON/CSV"""
+    import subprocess
+
+    from database import DatabaseManager
+
+    def child(db_path, fmt, rows_only=False):
+        command = [sys.executable, os.path.abspath(__file__), '_stream_child',
+                   '--db', db_path, '--format', fmt]
+        if rows_only:
+            command.append('--rows-only')
+        output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+        maxrss_kb, anon_kb, total = output.split()
+        return int(maxrss_kb) / 1024, int(anon_kb) / 1024, int(total)
+
+    # El RSS pico incluye las páginas del fichero mapeadas con mmap_size (caché
+    # de páginas compartida); la memoria anónima es la que reserva el proceso
+    print(f"{'filas':>10} {'formato':>8} {'RSS pico':>10} {'anon base':>10} {'anon final':>11} {'bytes':>14}")
+    for rows in args.rows:
+        db_path = os.path.join(tempfile.mkdtemp(), f"stream_{rows}.db")
+        db = DatabaseManager(db_path)
+        db.generate_sample_data(rows, return_df=False)
+        db.close()
+
+        for fmt in ('ndjson', 'csv'):
+            _, base_anon, _ = child(db_path, fmt, rows_only=True)
+            peak_rss, anon, total = child(db_path, fmt)
+            print(f"{rows:>10} {fmt:>8} {peak_rss:7.1f} MB {base_anon:7.1f} MB "
+                  f"{anon:8.1f} MB {total:>14}")
+        os.remove(db_path)
+
+
+def cmd_ingest(args):
+    """Filas por segundo de DatabaseManager.ingest con NDJSON y CSV"""
+    import io
+
+    import numpy as np
+    import pandas as pd
+
+    from database import DatabaseManager, SAMPLE_PRODUCTS, SAMPLE_REGIONS
+
+    rng = np.random.default_rng(0)
+    dates = pd.date_range(end=datetime.now(), periods=365, freq='D').strftime('%Y-%m-%d').to_numpy()
+    quantity = rng.integers(1, 10, args.rows)
+    sales_amount = np.round(rng.uniform(50, 2000, args.rows) * quantity, 2)
+    df = pd.DataFrame({
+        'date': dates[rng.integers(0, len(dates), args.rows)],
+        'product': np.array(SAMPLE_PRODUCTS)[rng.integers(0, len(SAMPLE_PRODUCTS), args.rows)],
+        'region': np.array(SAMPLE_REGIONS)[rng.integers(0, len(SAMPLE_REGIONS), args.rows)],
+        'sales_amount': sales_amount,
+        'profit': np.round(sales_amount * rng.uniform(0.1, 0.4, args.rows), 2),
+        'quantity': quantity,
+    })
+    bodies = {
+        'csv': df.to_csv(index=False).encode('utf-8'),
+        'ndjson': df.to_json(orient='records', lines=True).encode('utf-8'),
+    }
+
+    print(f"{'formato':>8} {'filas base':>12} {'insertadas':>12} {'segundos':>9} {'filas/s':>10}")
+    for fmt, body in bodies.items():
+        db_path = os.path.join(tempfile.mkdtemp(), f"ingest_{fmt}.db")
+        db = DatabaseManager(db_path)
+        db.generate_sample_data(args.base_rows, return_df=False)
+        report = db.ingest(io.BytesIO(body), fmt, chunk_size=args.chunk_size)
+        db.close()
+        os.remove(db_path)
+        print(f"{fmt:>8} {args.base_rows:>12} {report['rows_inserted']:>12} "
+              f"{report['seconds']:>9.2f} {report['rows_per_second']:>10}")
+
+
+def cmd_json(args):
+    """Codificación de /api/sales: encoder por defecto frente a FastJSONResponse"""
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse
+
+    import serialization
+    from database import DatabaseManager
+
+    print(f"orjson: {'sí' if serialization.orjson else 'no (json estándar)'}")
+    print(f"{'filas':>10} {'codificación':>22} {'segundos':>9} {'MB':>8}")
+    for rows in args.rows:
+        db_path = os.path.join(tempfile.mkdtemp(), f"json_{rows}.db")
+        db = DatabaseManager(db_path)
+        db.generate_sample_data(rows, return_df=False)
+        df = db.get_sales_data()
+        db.close()
+        os.remove(db_path)
+
+        encodings = {
+            'por defecto (registros)': lambda: JSONResponse(
+                jsonable_encoder({"success": True, "data": df.to_dict('records')})).body,
+            'rápida (registros)': lambda: serialization.dumps(
+                {"success": True, "data": df.to_dict('records')}),
+            'rápida (columnas)': lambda: serialization.dumps(
+                {"success": True, **serialization.columnar(df)}),
+        }
+        for label, encode in encodings.items():
+            best = float('inf')
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                body = encode()
+                best = min(best, time.perf_counter() - start)
+            print(f"{rows:>10} {label:>22} {best:>9.3f} {len(body) / 1e6:>8.1f}")
+
+
+def cmd_columnar(args):
+    """Tamaño y tiempo de lectura en el cliente: JSON frente a Arrow IPC y Parquet"""
+    import io
+    import json
+
+    import pandas as pd
+
+    import serialization
+    import streaming
+    from database import DatabaseManager, column_types
+
+    if not streaming.ARROW_AVAILABLE:
+        print("pyarrow no está instalado: solo se mide JSON")
+
+    def run(encode, parse, repeat):
+        best_encode = best_parse = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            body = encode()
+            best_encode = min(best_encode, time.perf_counter() - start)
+            start = time.perf_counter()
+            parse(body)
+            best_parse = min(best_parse, time.perf_counter() - start)
+        return body, best_encode, best_parse
+
+    print(f"{'filas':>10} {'formato':>14} {'codificar s':>12} {'leer s':>8} {'MB':>8}")
+    for rows in args.rows:
+        db_path = os.path.join(tempfile.mkdtemp(), f"columnar_{rows}.db")
+        db = DatabaseManager(db_path)
+        db.generate_sample_data(rows, return_df=False)
+
+        def cursor_chunks():
+            return db.iter_sales_rows(chunk_size=args.chunk_size)[1]
+
+        columns = db.iter_sales_rows()[0]
+
+        def parse_columns(body):
+            payload = json.loads(body)
+            return pd.DataFrame(payload['data'], columns=payload['columns'])
+
+        formats = {
+            'json': (lambda: serialization.dumps({"success": True,
+                                                  "data": db.get_sales_data().to_dict('records')}),
+                     lambda body: pd.DataFrame(json.loads(body)['data'])),
+            'json columnas': (lambda: serialization.dumps({"success": True,
+                                                           **serialization.columnar(db.get_sales_data())}),
+                              parse_columns),
+        }
+        if streaming.ARROW_AVAILABLE:
+            pa, pq = streaming.pa, streaming.pq
+            formats['arrow'] = (
+                lambda: b"".join(streaming.arrow_chunks(columns, column_types(columns), cursor_chunks())),
+                lambda body: pa.ipc.open_stream(body).read_pandas())
+            formats['parquet'] = (
+                lambda: b"".join(streaming.parquet_chunks(columns, column_types(columns), cursor_chunks())),
+                lambda body: pq.read_table(io.BytesIO(body)).to_pandas())
+
+        for label, (encode, parse) in formats.items():
+            body, encode_seconds, parse_seconds = run(encode, parse, args.repeat)
+            print(f"{rows:>10} {label:>14} {encode_seconds:>12.3f} {parse_seconds:>8.3f} "
+                  f"{len(body) / 1e6:>8.1f}")
+        db.close()
+        os.remove(db_path)
+
+
+def best_of(fn, repeat):
+    """Mejor tiempo en segundos de repeat ejecuciones"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def cmd_backends(args):
+    """Latencia de resumen y tendencias: SQLite (tabla y rollup) frente a DuckDB"""
+    import duckdb_backend
+    from database import DatabaseManager
+
+    def sqlite_full_scan(db):
+        # Las mismas agregaciones que el resumen, pero sobre sales en lugar de sales_daily
+        with db.pool.reader() as conn:
+            conn.execute("SELECT SUM(sales_amount), SUM(profit), SUM(quantity), "
+                         "AVG(sales_amount) FROM sales").fetchone()
+            for group in ("strftime('%Y-%m', date)", "product", "region"):
+                conn.execute(f"SELECT {group}, SUM(sales_amount), SUM(quantity) "
+                             f"FROM sales GROUP BY 1").fetchall()
+
+    print(f"{'filas':>10} {'motor':>22} {'resumen s':>10} {'tendencias s':>13}")
+    for rows in args.rows:
+        temp_dir = tempfile.mkdtemp()
+        db = DatabaseManager(os.path.join(temp_dir, f"backends_{rows}.db"))
+        db.generate_sample_data(rows, return_df=False)
+
+        print(f"{rows:>10} {'sqlite (tabla sales)':>22} "
+              f"{best_of(lambda: sqlite_full_scan(db), args.repeat):>10.3f} {'-':>13}")
+        print(f"{rows:>10} {'sqlite (sales_daily)':>22} "
+              f"{best_of(lambda: db.get_analytics_summary(engine='sql'), args.repeat):>10.3f} "
+              f"{best_of(lambda: db.get_trends('product_region', 'sql'), args.repeat):>13.3f}")
+        if duckdb_backend.duckdb is None:
+            print("duckdb no está instalado: se omite el backend duckdb")
+        else:
+            start = time.perf_counter()
+            db._duckdb_backend().refresh()
+            print(f"{rows:>10} {'duckdb (espejo)':>22} construcción del espejo: "
+                  f"{time.perf_counter() - start:.1f} s")
+            print(f"{rows:>10} {'duckdb (espejo)':>22} "
+                  f"{best_of(lambda: db.get_analytics_summary(engine='duckdb'), args.repeat):>10.3f} "
+                  f"{best_of(lambda: db.get_trends('product_region', 'duckdb'), args.repeat):>13.3f}")
+        db.close()
+        shutil.rmtree(temp_dir)
+
+
+def cmd_snapshot(args):
+    """Memoria por millón de filas y latencia del snapshot NumPy frente a SQLite"""
+    from database import DatabaseManager
+
+    filtered = {'start_date': (datetime.now() - timedelta(days=180)).strftime('%Y-%m-%d'),
+                'end_date': (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d'),
+                'region': 'Norte'}
+    for rows in args.rows:
+        temp_dir = tempfile.mkdtemp()
+        db = DatabaseManager(os.path.join(temp_dir, f"snapshot_{rows}.db"))
+        db.generate_sample_data(rows, return_df=False)
+
+        start = time.perf_counter()
+        db.sales_snapshot().refresh()
+        build = time.perf_counter() - start
+        usage = db.sales_snapshot().memory_usage()
+        frame = db.get_sales_data()
+        frame_bytes = frame.memory_usage(deep=True).sum()
+        del frame
+        print(f"{rows} filas: snapshot construido en {build:.1f} s, "
+              f"{usage['bytes_per_million_rows'] / 1e6:.1f} MB por millón de filas "
+              f"(DataFrame de pandas: {frame_bytes / rows:.1f} MB por millón)")
+
+        print(f"{'motor':>10} {'resumen ms':>11} {'filtrado ms':>12} {'tendencias ms':>14}")
+        for engine in ('sql', 'snapshot'):
+            summary = best_of(lambda: db.get_analytics_summary(engine=engine), args.repeat)
+            summary_filtered = best_of(
+                lambda: db.get_analytics_summary(engine=engine, **filtered), args.repeat)
+            trends = best_of(lambda: db.get_trends('product_region', engine), args.repeat)
+            print(f"{engine:>10} {summary * 1000:>11.2f} {summary_filtered * 1000:>12.2f} "
+                  f"{trends * 1000:>14.2f}")
+        db.close()
+        shutil.rmtree(temp_dir)
+
+
+def cmd_totals(args):
+    """Totales de rangos aleatorios: SUM sobre sales_daily frente al índice de sumas prefijas"""
+    import random
+
+    from database import DatabaseManager
+
+    temp_dir = tempfile.mkdtemp()
+    db = DatabaseManager(os.path.join(temp_dir, "totals.db"))
+    db.generate_sample_data(args.rows, return_df=False)
+    start = time.perf_counter()
+    db.prefix_index().refresh()
+    print(f"{args.rows} filas: índice construido en {time.perf_counter() - start:.3f} s")
+    first, last = db.prefix_index().bounds()
+    first_day = datetime.strptime(first, '%Y-%m-%d')
+    span = (datetime.strptime(last, '%Y-%m-%d') - first_day).days
+    rng = random.Random(42)
+    ranges = []
+    for _ in range(args.queries):
+        start, end = sorted(rng.randint(0, span) for _ in range(2))
+        ranges.append(((first_day + timedelta(days=start)).strftime('%Y-%m-%d'),
+                       (first_day + timedelta(days=end)).strftime('%Y-%m-%d')))
+
+    def sql_totals():
+        with db.pool.reader() as conn:
+            for start, end in ranges:
+                conn.execute("SELECT SUM(sales_amount), SUM(profit), SUM(quantity), SUM(orders) "
+                             "FROM sales_daily WHERE date BETWEEN ? AND ?", (start, end)).fetchone()
+
+    def index_totals():
+        for start, end in ranges:
+            db.range_totals(start, end)
+
+    for label, fn in (("sql (sales_daily)", sql_totals), ("sumas prefijas", index_totals)):
+        elapsed = best_of(fn, args.repeat)
+        print(f"{label:>18}: {elapsed / args.queries * 1e6:.1f} µs por rango")
+    db.close()
+    shutil.rmtree(temp_dir)
+
+
+def cmd_cube(args):
+    """Cuboides de /api/cube: consulta agrupada frente a roll-up desde el cuboide más fino"""
+    from cube import cube_grouping, roll_up
+    from database import DatabaseManager
+
+    temp_dir = tempfile.mkdtemp()
+    db = DatabaseManager(os.path.join(temp_dir, "cube.db"))
+    db.generate_sample_data(args.rows, return_df=False)
+    base = db.get_cube(cube_grouping(['day', 'product', 'region']))
+    print(f"{args.rows} filas: cuboide base (día, producto, región) de {len(base)} filas")
+    print(f"{'dimensiones':>24} {'consulta ms':>12} {'roll-up ms':>11}")
+    for dims in (['month'], ['week', 'region'], ['category'], ['month', 'product', 'region'], []):
+        grouping = cube_grouping(dims)
+        query = best_of(lambda: db.get_cube(grouping), args.repeat)
+        rolled = best_of(lambda: roll_up(base, grouping), args.repeat)
+        print(f"{','.join(dims) or '(total)':>24} {query * 1000:>12.2f} {rolled * 1000:>11.2f}")
+    db.close()
+    shutil.rmtree(temp_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks - Data Analytics Dashboard')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    loadtest = subparsers.add_parser('loadtest', help='p99 de /health durante exportaciones')
+    loadtest.add_argument('--rows', type=int, default=50000, help='Registros de ventas a generar')
+    loadtest.add_argument('--exports', type=int, default=2, help='Exportaciones Excel concurrentes')
+    loadtest.add_argument('--duration', type=float, default=2.0, help='Segundos de medición sin carga')
+    loadtest.add_argument('--interval', type=float, default=0.01, help='Pausa entre sondeos de /health')
+    loadtest.set_defaults(func=cmd_loadtest)
+
+    indexes = subparsers.add_parser('indexes', help='consultas por rango con y sin índices')
+    indexes.add_argument('--rows', type=int, nargs='+', default=[1000000, 10000000],
+                         help='Tamaños de la tabla sales a medir')
+    indexes.add_argument('--repeat', type=int, default=5, help='Repeticiones por consulta')
+    indexes.add_argument('--keep', action='store_true', help='Conservar las bases de datos generadas')
+    indexes.set_defaults(func=cmd_indexes)
+
+    stream = subparsers.add_parser('stream', help='RSS pico del streaming de /api/sales')
+    stream.add_argument('--rows', type=int, nargs='+', default=[100000, 5000000],
+                        help='Tamaños de la tabla sales a medir')
+    stream.set_defaults(func=cmd_stream)
+
+    ingest = subparsers.add_parser('ingest', help='filas/s de la ingesta masiva')
+    ingest.add_argument('--rows', type=int, default=1000000, help='Filas a ingerir')
+    ingest.add_argument('--base-rows', type=int, default=0, help='Filas ya presentes en sales')
+    ingest.add_argument('--chunk-size', type=int, default=50000, help='Filas por transacción')
+    ingest.set_defaults(func=cmd_ingest)
+
+    json_bench = subparsers.add_parser('json', help='tiempo de codificación JSON de /api/sales')
+    json_bench.add_argument('--rows', type=int, nargs='+', default=[100000, 500000],
+                            help='Tamaños de tabla a codificar')
+    json_bench.add_argument('--repeat', type=int, default=3, help='Repeticiones (se toma la mejor)')
+    json_bench.set_defaults(func=cmd_json)
+
+    columnar = subparsers.add_parser('columnar', help='JSON frente a Arrow/Parquet en /api/sales')
+    columnar.add_argument('--rows', type=int, nargs='+', default=[100000, 1000000],
+                          help='Tamaños de tabla a comparar')
+    columnar.add_argument('--chunk-size', type=int, default=100000, help='Filas por RecordBatch')
+    columnar.add_argument('--repeat', type=int, default=3, help='Repeticiones (se toma la mejor)')
+    columnar.set_defaults(func=cmd_columnar)
+
+    backends = subparsers.add_parser('backends', help='agregaciones en SQLite frente a DuckDB')
+    backends.add_argument('--rows', type=int, nargs='+', default=[1000000, 10000000, 50000000],
+                          help='Tamaños de tabla a comparar')
+    backends.add_argument('--repeat', type=int, default=3, help='Repeticiones (se toma la mejor)')
+    backends.set_defaults(func=cmd_backends)
+
+    snapshot = subparsers.add_parser('snapshot', help='memoria y latencia del snapshot NumPy')
+    snapshot.add_argument('--rows', type=int, nargs='+', default=[1000000, 5000000],
+                          help='Tamaños de tabla a medir')
+    snapshot.add_argument('--repeat', type=int, default=5, help='Repeticiones (se toma la mejor)')
+    snapshot.set_defaults(func=cmd_snapshot)
+
+    totals = subparsers.add_parser('totals', help='totales de rangos de fechas con sumas prefijas')
+    totals.add_argument('--rows', type=int, default=1000000, help='Filas de la tabla sales')
+    totals.add_argument('--queries', type=int, default=1000, help='Rangos aleatorios a consultar')
+    totals.add_argument('--repeat', type=int, default=3, help='Repeticiones (se toma la mejor)')
+    totals.set_defaults(func=cmd_totals)
+
+    cube = subparsers.add_parser('cube', help='cuboides por consulta frente a roll-up')
+    cube.add_argument('--rows', type=int, default=1000000, help='Filas de la tabla sales')
+    cube.add_argument('--repeat', type=int, default=5, help='Repeticiones (se toma la mejor)')
+    cube.set_defaults(func=cmd_cube)
+
+    stream_child = subparsers.add_parser('_stream_child')
+    stream_child.add_argument('--db', required=True)
+    stream_child.add_argument('--format', choices=['ndjson', 'csv'], default='ndjson')
+    stream_child.add_argument('--rows-only', action='store_true')
+    stream_child.set_defaults(func=cmd_stream_child)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Cache module for Data Analytics Dashboard
+Caché en memoria (TTL + LRU) para resúmenes analíticos con coalescencia de peticiones
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+class _Flight:
+    """Cálculo en curso compartido por todas las peticiones de la misma clave"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error: Optional[BaseException] = None
+
+
+class SummaryCache:
+    """Caché LRU acotada con expiración por TTL
+
+    Las peticiones concurrentes que fallan sobre la misma clave esperan a un
+    único cálculo en lugar de repetirlo. invalidate() descarta todas las
+    entradas y evita que los cálculos ya en curso se guarden.
+    """
+
+    def __init__(self, ttl: float = 30.0, maxsize: int = 128,
+                 clock: Callable[[], float] = time.monotonic):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._inflight: Dict[Hashable, _Flight] = {}
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, key: Hashable):
+        """Buscar una entrada vigente (llamar con el lock adquirido)"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        expires_at, value = entry
+        if expires_at <= self._clock():
+            del self._entries[key]
+            return False, None
+        self._entries.move_to_end(key)
+        return True, value
+
+    def get(self, key: Hashable):
+        """Devolver (encontrado, valor) sin calcular nada"""
+        with self._lock:
+            found, value = self._lookup(key)
+            if found:
+                self.hits += 1
+            return found, value
+
+    def set(self, key: Hashable, value: Any):
+        """Guardar un valor, expulsando la entrada menos usada si hace falta"""
+        with self._lock:
+            self._store(key, value)
+
+    def _store(self, key: Hashable, value: Any):
+        self._entries[key] = (self._clock() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any]):
+        """Devolver el valor cacheado o calcularlo una sola vez por clave"""
+        with self._lock:
+            found, value = self._lookup(key)
+            if found:
+                self.hits += 1
+                return value
+            self.misses += 1
+            flight = self._inflight.get(key)
+            owner = flight is None
+            if owner:
+                flight = _Flight()
+                self._inflight[key] = flight
+                generation = self._generation
+
+        if not owner:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = compute()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                if self._inflight.get(key) is flight:
+                    del self._inflight[key]
+                if flight.error is None and generation == self._generation:
+                    self._store(key, flight.value)
+            flight.event.set()
+        return flight.value
+
+    def invalidate(self):
+        """Descartar todas las entradas (p. ej. tras escribir en sales)"""
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._inflight.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Compression module for Data Analytics Dashboard
+Middleware ASGI que comprime las respuestas con brotli o gzip según Accept-Encoding
+"""
+
+import zlib
+from typing import Optional
+
+try:
+    import brotli
+except ImportError:  # brotli es opcional; sin él solo se ofrece gzip
+    brotli = None
+
+# Tipos de contenido que merece la pena comprimir
+COMPRESSIBLE_TYPES = (
+    "application/json",
+    "application/x-ndjson",
+    "application/javascript",
+    "image/svg+xml",
+    "text/",
+)
+
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """Elegir 'br' o 'gzip' a partir de Accept-Encoding (None si ninguno vale)"""
+    accepted = {}
+    for item in accept_encoding.split(","):
+        token, _, params = item.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[token.strip().lower()] = quality
+    for encoding in ("br", "gzip"):
+        if encoding == "br" and brotli is None:
+            continue
+        if accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+
+def encoded_etag(etag: bytes, encoding: str) -> bytes:
+    """ETag de la representación comprimida: los fuertes llevan sufijo '-gzip'/'-br'
+
+    Un ETag fuerte identifica los bytes exactos del cuerpo, así que la versión
+    comprimida necesita uno distinto. Los débiles ya admiten representaciones
+    equivalentes y se dejan tal cual.
+    """
+    if etag.startswith(b"W/") or not etag.endswith(b'"'):
+        return etag
+    return etag[:-1] + b"-" + encoding.encode("latin-1") + b'"'
+
+
+def strip_encoded_etags(if_none_match: bytes) -> tuple:
+    """Quitar de If-None-Match los sufijos de codificación añadidos por encoded_etag
+
+    Devuelve (cabecera para la aplicación, True si algún candidato traía sufijo),
+    de modo que la aplicación compara con su propio ETag sin conocer la compresión.
+    """
+    candidates = []
+    stripped = False
+    for candidate in if_none_match.split(b","):
+        candidate = candidate.strip()
+        if not candidate.startswith(b"W/"):
+            for encoding in (b"br", b"gzip"):
+                suffix = b"-" + encoding + b'"'
+                if candidate.endswith(suffix):
+                    candidate = candidate[:-len(suffix)] + b'"'
+                    stripped = True
+                    break
+        candidates.append(candidate)
+    return b", ".join(candidates), stripped
+
+
+def _vary_accept_encoding(headers: list, vary: Optional[bytes]) -> list:
+    """Añadir Accept-Encoding a Vary conservando el valor previo"""
+    headers = [(name, value) for name, value in headers if name != b"vary"]
+    headers.append((b"vary", vary + b", Accept-Encoding" if vary else b"Accept-Encoding"))
+    return headers
+
+
+class _Compressor:
+    """Compresor incremental con la misma interfaz para gzip y brotli"""
+
+    def __init__(self, encoding: str, gzip_level: int, brotli_quality: int):
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=brotli_quality)
+            self._zlib = None
+        else:
+            self._brotli = None
+            self._zlib = zlib.compressobj(gzip_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes) -> bytes:
+        """Comprimir un bloque y vaciar el búfer para no retrasar el streaming"""
+        if self._brotli is not None:
+            return self._brotli.process(data) + self._brotli.flush()
+        return self._zlib.compress(data) + self._zlib.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        if self._brotli is not None:
+            return self._brotli.finish()
+        return self._zlib.flush()
+
+
+class CompressionMiddleware:
+    """Comprimir respuestas de tipos de texto por encima de minimum_size bytes
+
+    Se respeta Accept-Encoding (brotli si está instalado y el cliente lo
+    acepta, si no gzip). Las respuestas que ya traen Content-Encoding, las
+    binarias y las pequeñas se envían tal cual. Las respuestas en streaming
+    se comprimen bloque a bloque. Al comprimir, un ETag fuerte recibe el
+    sufijo de la codificación; If-None-Match se traduce de vuelta antes de
+    llegar a la aplicación y el 304 resultante devuelve el ETag con sufijo.
+    """
+
+    def __init__(self, app, minimum_size: int = 1024, gzip_level: int = 6,
+                 brotli_quality: int = 4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope.get("headers") or [])
+        encoding = negotiate_encoding(headers.get(b"accept-encoding", b"").decode("latin-1"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        if_none_match = headers.get(b"if-none-match")
+        revalidating_encoded = False
+        if if_none_match:
+            if_none_match, revalidating_encoded = strip_encoded_etags(if_none_match)
+            scope = {**scope, "headers": [
+                (name, if_none_match if name == b"if-none-match" else value)
+                for name, value in scope["headers"]
+            ]}
+
+        start_message = None
+        compressor = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start_message, compressor, passthrough
+            if message["type"] == "http.response.start":
+                if message["status"] == 304 and revalidating_encoded:
+                    # El cliente guarda la versión comprimida: validar con su ETag
+                    response_headers = dict(message.get("headers") or [])
+                    new_headers = [
+                        (name, encoded_etag(value, encoding) if name == b"etag" else value)
+                        for name, value in message["headers"]
+                    ]
+                    message = {**message, "headers": _vary_accept_encoding(
+                        new_headers, response_headers.get(b"vary"))}
+                    passthrough = True
+                    await send(message)
+                    return
+                start_message = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if compressor is None:
+                response_headers = dict(start_message.get("headers") or [])
+                content_type = response_headers.get(b"content-type", b"").decode("latin-1")
+                compressible = (
+                    b"content-encoding" not in response_headers
+                    and content_type.startswith(COMPRESSIBLE_TYPES)
+                    and (more_body or len(body) >= self.minimum_size)
+                )
+                if not compressible:
+                    passthrough = True
+                    await send(start_message)
+                    await send(message)
+                    return
+
+                compressor = _Compressor(encoding, self.gzip_level, self.brotli_quality)
+                new_headers = [
+                    (name, encoded_etag(value, encoding) if name == b"etag" else value)
+                    for name, value in start_message["headers"] if name != b"content-length"
+                ]
+                new_headers = _vary_accept_encoding(new_headers, response_headers.get(b"vary"))
+                new_headers.append((b"content-encoding", encoding.encode("latin-1")))
+                if not more_body:
+                    compressed = compressor.compress(body) + compressor.finish()
+                    new_headers.append((b"content-length", str(len(compressed)).encode("latin-1")))
+                    await send({**start_message, "headers": new_headers})
+                    await send({"type": "http.response.body", "body": compressed})
+                    return
+                await send({**start_message, "headers": new_headers})
+
+            chunk = compressor.compress(body)
+            if not more_body:
+                chunk += compressor.finish()
+            await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Connection pool module for Data Analytics Dashboard
+Pool de conexiones SQLite: varias de lectura y una única de escritura
+"""
+
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+
+class ConnectionPool:
+    """Pool de conexiones SQLite reutilizables con pragmas ajustados
+
+    Las lecturas usan hasta `size` conexiones que se crean bajo demanda y se
+    devuelven a una cola al terminar. Todas las escrituras pasan por una
+    única conexión protegida por un lock, que es el modelo de concurrencia
+    de SQLite en modo WAL (lectores concurrentes, un solo escritor).
+    """
+
+    def __init__(self, db_path: str, size: int = 4, timeout: float = 30.0,
+                 mmap_size: int = 256 * 1024 * 1024, cache_size_kb: int = 64 * 1024):
+        self.db_path = db_path
+        self.size = size
+        self.timeout = timeout
+        self.mmap_size = mmap_size
+        self.cache_size_kb = cache_size_kb
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._writer = None
+
+    def _connect(self) -> sqlite3.Connection:
+        """Abrir una conexión nueva con los pragmas de rendimiento"""
+        conn = sqlite3.connect(self.db_path, timeout=self.timeout, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")
+        # Valor negativo: tamaño en KiB en lugar de páginas
+        conn.execute(f"PRAGMA cache_size=-{int(self.cache_size_kb)}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        return conn
+
+    def _acquire(self) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                create = True
+            else:
+                create = False
+        if create:
+            try:
+                return self._connect()
+            except BaseException:
+                with self._lock:
+                    self._created -= 1
+                raise
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise TimeoutError(f"No hay conexiones libres tras {self.timeout}s") from None
+
+    @contextmanager
+    def reader(self):
+        """Conexión de lectura prestada por el pool"""
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.put(conn)
+
+    @contextmanager
+    def writer(self):
+        """Conexión de escritura exclusiva; confirma al salir o revierte si falla"""
+        with self._write_lock:
+            if self._writer is None:
+                self._writer = self._connect()
+            conn = self._writer
+            try:
+                yield conn
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+
+    def close(self):
+        """Cerrar todas las conexiones; el pool vuelve a abrirlas si se reutiliza"""
+        with self._write_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Cube module for Data Analytics Dashboard
+Cuboides OLAP (dimensiones x medidas) y roll-up de un cuboide fino a uno más grueso
+"""
+
+from itertools import combinations
+from typing import FrozenSet, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from serialization import finite_round
+
+# Dimensiones y medidas que acepta /api/cube (en orden canónico)
+CUBE_DIMENSIONS = ('month', 'week', 'day', 'product', 'region', 'category')
+CUBE_MEASURES = ('sales_amount', 'profit', 'quantity', 'orders', 'avg_order_value')
+
+# Medidas aditivas guardadas en cada cuboide (avg_order_value se deriva de ellas)
+BASE_MEASURES = ('sales_amount', 'profit', 'quantity', 'orders')
+
+# Dimensión de la que se obtiene cada una al agregar un cuboide más fino
+DERIVED_FROM = {'month': 'day', 'week': 'day', 'category': 'product'}
+
+
+def parse_names(value: Optional[str], allowed: Tuple[str, ...], name: str) -> Tuple[str, ...]:
+    """Lista separada por comas sin repetidos; ValueError si hay nombres no válidos"""
+    names = tuple(dict.fromkeys(item.strip() for item in (value or "").split(",") if item.strip()))
+    invalid = [item for item in names if item not in allowed]
+    if invalid:
+        raise ValueError(f"{name} no válidas: {', '.join(invalid)} (admitidas: {', '.join(allowed)})")
+    return names
+
+
+def cube_grouping(dims) -> FrozenSet[str]:
+    """Columnas de agrupación del cuboide que responde a dims
+
+    Con product se agrupa también por category: no cambia las filas (cada
+    producto tiene una categoría) y permite agregar después por categoría.
+    """
+    grouping = set(dims)
+    if 'product' in grouping:
+        grouping.add('category')
+    return frozenset(grouping)
+
+
+def can_roll_up(finer: FrozenSet[str], grouping: FrozenSet[str]) -> bool:
+    """Si el cuboide agrupado por finer contiene la información de grouping"""
+    return all(dim in finer or DERIVED_FROM.get(dim) in finer for dim in grouping)
+
+
+def finer_groupings(grouping: FrozenSet[str]) -> List[FrozenSet[str]]:
+    """Cuboides desde los que se puede obtener grouping, de menos a más dimensiones"""
+    candidates = []
+    for size in range(len(grouping) + 1, len(CUBE_DIMENSIONS) + 1):
+        for dims in combinations(CUBE_DIMENSIONS, size):
+            finer = cube_grouping(dims)
+            if finer != grouping and finer not in candidates and can_roll_up(finer, grouping):
+                candidates.append(finer)
+    return candidates
+
+
+def roll_up(cuboid: pd.DataFrame, grouping: FrozenSet[str]) -> pd.DataFrame:
+    """Agregar un cuboide más fino a las columnas de grouping"""
+    frame = cuboid
+    if 'month' in grouping and 'month' not in frame:
+        frame = frame.assign(month=frame['day'].str[:7])
+    if 'week' in grouping and 'week' not in frame:
+        # Lunes de cada semana (el 1970-01-01 fue jueves: día 3 de la semana)
+        days = frame['day'].to_numpy().astype('datetime64[D]')
+        weekdays = (days.astype(np.int64) + 3) % 7
+        frame = frame.assign(week=(days - weekdays).astype(str))
+    columns = [dim for dim in CUBE_DIMENSIONS if dim in grouping]
+    if not columns:
+        return frame[list(BASE_MEASURES)].sum().to_frame().T
+    return (frame.groupby(columns, sort=True, dropna=False)[list(BASE_MEASURES)]
+            .sum().reset_index())
+
+
+def cube_table(cuboid: pd.DataFrame, dims: Tuple[str, ...],
+               measures: Tuple[str, ...]) -> pd.DataFrame:
+    """Columnas pedidas (dims en su orden y medidas) ordenadas por las dimensiones"""
+    table = cuboid[list(dims)].astype(object)
+    table = table.where(table.notna(), None)
+    for measure in measures:
+        if measure == 'avg_order_value':
+            orders = cuboid['orders'].to_numpy(dtype=float)
+            sales = cuboid['sales_amount'].to_numpy(dtype=float)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                values = sales / orders
+            table[measure] = finite_round(values)
+        elif measure in ('quantity', 'orders'):
+            table[measure] = cuboid[measure].astype(np.int64).to_numpy()
+        else:
+            table[measure] = finite_round(cuboid[measure])
+    if dims:
+        table = table.sort_values(list(dims), kind='stable', na_position='last')
+    return table.reset_index(drop=True)
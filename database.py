@@ -9,279 +9,1659 @@ import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 import json
-from typing import Dict, List, Optional
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+from connection_pool import ConnectionPool
+from cube import BASE_MEASURES, CUBE_DIMENSIONS
+from duckdb_backend import DuckDBBackend
+from serialization import finite_int, finite_round
+from prefix_index import PREFIX_MEASURES, PrefixSumIndex
+from snapshot import SalesSnapshot
+from streaming import arrow_chunks, csv_chunks, gzip_chunks, parquet_chunks
+
+# Esquema declarado de las tablas ({name} permite recrearlas en migraciones)
+TABLE_SCHEMAS = {
+    'sales': '''
+        CREATE TABLE IF NOT EXISTS {name} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            date TEXT NOT NULL,
+            product TEXT NOT NULL,
+            region TEXT NOT NULL,
+            sales_amount REAL NOT NULL,
+            profit REAL NOT NULL,
+            quantity INTEGER NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''',
+    'products': '''
+        CREATE TABLE IF NOT EXISTS {name} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT UNIQUE NOT NULL,
+            category TEXT NOT NULL,
+            price REAL NOT NULL,
+            cost REAL NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''',
+    'regions': '''
+        CREATE TABLE IF NOT EXISTS {name} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT UNIQUE NOT NULL,
+            country TEXT NOT NULL,
+            population INTEGER NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''',
+}
+
+# Columnas con datos de cada tabla (sin id ni created_at)
+TABLE_DATA_COLUMNS = {
+    'sales': ['date', 'product', 'region', 'sales_amount', 'profit', 'quantity'],
+    'products': ['name', 'category', 'price', 'cost'],
+    'regions': ['name', 'country', 'population'],
+}
+
+# Columnas públicas de cada tabla (SELECT * incluiría columnas generadas)
+TABLE_COLUMNS = {
+    table: ['id'] + columns + ['created_at']
+    for table, columns in TABLE_DATA_COLUMNS.items()
+}
+SALES_COLUMNS = TABLE_COLUMNS['sales']
+
+# Backends analíticos: agregaciones sobre el rollup de SQLite, con DuckDB
+# sobre un espejo Parquet de sales (requiere el paquete duckdb) o sobre un
+# snapshot NumPy de sales en memoria del proceso
+ANALYTICS_BACKENDS = ('sqlite', 'duckdb', 'snapshot')
+
+# Motor de agregación por defecto de cada backend
+BACKEND_ENGINES = {'sqlite': 'sql', 'duckdb': 'duckdb', 'snapshot': 'snapshot'}
+
+# Tipo lógico de cada columna pública, para los formatos tipados (Arrow/Parquet)
+COLUMN_TYPES = {
+    'id': 'integer', 'date': 'date', 'product': 'text', 'region': 'text',
+    'sales_amount': 'real', 'profit': 'real', 'quantity': 'integer',
+    'name': 'text', 'category': 'text', 'price': 'real', 'cost': 'real',
+    'country': 'text', 'population': 'integer', 'created_at': 'timestamp',
+}
+
+# Formatos de exportación de tablas y extensión de sus ficheros
+EXPORT_FORMATS = {'csv': 'csv', 'arrow': 'arrows', 'parquet': 'parquet'}
+
+def column_types(columns: List[str]) -> List[str]:
+    """Tipos lógicos de una lista de columnas"""
+    return [COLUMN_TYPES[column] for column in columns]
+
+def select_all_sql(table: str) -> str:
+    """SELECT de las columnas públicas de una tabla"""
+    return f"SELECT {', '.join(TABLE_COLUMNS[table])} FROM {table}"
+
+# Índices de cobertura: las consultas por rango de fechas y por producto/región
+# se resuelven solo con el índice, sin leer la tabla
+SALES_INDEXES = {
+    'idx_sales_date': "CREATE INDEX IF NOT EXISTS idx_sales_date "
+                      "ON sales(date, sales_amount, profit, quantity)",
+    'idx_sales_product_date': "CREATE INDEX IF NOT EXISTS idx_sales_product_date "
+                              "ON sales(product, date, sales_amount, profit, quantity)",
+    'idx_sales_region_date': "CREATE INDEX IF NOT EXISTS idx_sales_region_date "
+                             "ON sales(region, date, sales_amount, profit, quantity)",
+}
+
+# Hojas de la exportación a Excel y filas de datos por hoja
+# (Excel admite 1.048.576 filas incluida la cabecera)
+EXCEL_SHEETS = {'sales': 'Ventas', 'products': 'Productos', 'regions': 'Regiones'}
+EXCEL_MAX_DATA_ROWS = 1048576 - 1
+
+# Migraciones de esquema en orden (versión, método)
+SCHEMA_MIGRATIONS = [
+    (1, '_migrate_declared_schema'),
+    (2, '_migrate_sales_indexes'),
+    (3, '_migrate_sales_daily'),
+]
+
+# Agregado diario de sales: mucho más pequeño que la tabla y suficiente para
+# el resumen, las tendencias y los filtros
+SALES_DAILY_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS {name} (
+        date TEXT NOT NULL,
+        product TEXT NOT NULL,
+        region TEXT NOT NULL,
+        sales_amount REAL NOT NULL,
+        profit REAL NOT NULL,
+        quantity INTEGER NOT NULL,
+        orders INTEGER NOT NULL,
+        PRIMARY KEY (date, product, region)
+    ) WITHOUT ROWID
+'''
+SALES_DAILY_AGGREGATE_SQL = '''
+    SELECT date, product, region, SUM(sales_amount), SUM(profit), SUM(quantity), COUNT(*)
+    FROM sales
+    WHERE id > ? AND id <= ?
+    GROUP BY date, product, region
+'''
+
+# Catálogo de los datos de muestra
+SAMPLE_PRODUCTS = [
+    "Laptop Pro", "Smartphone X", "Tablet Air", "Monitor 4K",
+    "Keyboard RGB", "Mouse Wireless", "Headphones Pro", "Webcam HD",
+    "Speaker Bluetooth", "Charger Fast"
+]
+SAMPLE_REGIONS = ["Norte", "Sur", "Este", "Oeste", "Centro"]
+SAMPLE_CATEGORIES = ["Electronics", "Computing", "Audio", "Accessories"]
+
+# Agrupaciones de /api/trends y pendiente (€/mes) a partir de la cual es fuerte
+TREND_GROUPINGS = {
+    'product': ['product'],
+    'region': ['region'],
+    'product_region': ['product', 'region'],
+}
+TREND_STRONG_SLOPE = 1000
+
+# Expresión SQL de cada dimensión del cubo sobre sales_daily (d) y products (p);
+# la semana se identifica por su lunes
+CUBE_SQL_DIMENSIONS = {
+    'month': "strftime('%Y-%m', d.date)",
+    'week': "date(d.date, 'weekday 0', '-6 days')",
+    'day': "d.date",
+    'product': "d.product",
+    'region': "d.region",
+    'category': "p.category",
+}
+
+# Comparación de periodos: meses que se desplaza la ventana en cada modo
+# ('previous' toma la ventana de igual longitud justo anterior y 'custom'
+# la indicada en compare_start/compare_end)
+PERIOD_COMPARISONS = {'previous': None, 'mom': 1, 'qoq': 3, 'yoy': 12, 'custom': None}
+
+# Días desde 1970-01-01 para una fecha 'YYYY-MM-DD'
+DAY_NUMBER_SQL = "CAST(julianday(date) - 2440587.5 AS INTEGER)"
+EPOCH = datetime(1970, 1, 1)
+
+def summary_where(start_date: Optional[str] = None, end_date: Optional[str] = None,
+                  product: Optional[str] = None, region: Optional[str] = None) -> Tuple[str, List]:
+    """WHERE de los agregados filtrados (vacío si no hay filtros) y sus parámetros
+
+    Sirve tanto para sales_daily en SQLite como para el espejo en DuckDB;
+    las fechas son 'YYYY-MM-DD' e inclusivas.
+    """
+    clauses = []
+    params = []
+    for condition, value in (("date >= ?", start_date), ("date <= ?", end_date),
+                             ("product = ?", product), ("region = ?", region)):
+        if value:
+            clauses.append(condition)
+            params.append(value)
+    return (f"WHERE {' AND '.join(clauses)}" if clauses else ""), params
+
+
+def parse_day(value: Optional[str], name: str) -> Optional[datetime]:
+    """Validar una fecha 'YYYY-MM-DD' opcional"""
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        raise ValueError(f"{name} no válida (YYYY-MM-DD): {value}")
+
+
+def columns_of(rows: List[tuple], width: int) -> Tuple[tuple, ...]:
+    """Trasponer filas (nombre, valor, ...) a una tupla por columna"""
+    return tuple(zip(*rows)) if rows else ((),) * width
+
+
+def with_progress(row_chunks, progress: Optional[Callable[[int], None]]):
+    """Llamar a progress(n) cuando se ha consumido cada bloque de n filas"""
+    for rows in row_chunks:
+        yield rows
+        if progress is not None:
+            progress(len(rows))
+
+# Ingesta masiva: formatos aceptados, filas por transacción y errores de muestra
+INGEST_FORMATS = ('ndjson', 'csv')
+INGEST_CHUNK_SIZE = 50000
+INGEST_MAX_ERRORS = 20
+
+# Modos de siembra al arrancar el servidor
+SEED_MODES = ('seed-if-empty', 'never', 'always')
+
+# Lecturas a DataFrame: filas por bloque y tipos explícitos (las fechas se
+# parsean en cada bloque y producto/región se leen como categóricas)
+READ_CHUNK_SIZE = 50000
+SALES_READ_DTYPES = {'id': 'int64', 'sales_amount': 'float64', 'profit': 'float64',
+                     'quantity': 'int64'}
+CATEGORICAL_COLUMNS = ('product', 'region')
+
+
+class WorkingSetExceededError(Exception):
+    """La operación superaría la memoria de trabajo máxima (max_working_set)"""
+
+
+def concat_frames(frames: List[pd.DataFrame], columns: List[str]) -> pd.DataFrame:
+    """Unir bloques leídos con read_frames conservando las columnas categóricas"""
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    for name in CATEGORICAL_COLUMNS:
+        if name in columns:
+            categories = sorted(set().union(*(frame[name].cat.categories for frame in frames)))
+            for frame in frames:
+                frame[name] = frame[name].cat.set_categories(categories)
+    return pd.concat(frames, ignore_index=True)
+
+@contextmanager
+def file_lock(path: str):
+    """Lock exclusivo entre procesos sobre un fichero (fcntl o msvcrt en Windows)"""
+    with open(path, 'a+b') as handle:
+        if fcntl is not None:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+        else:
+            handle.seek(0)
+            while True:
+                # LK_LOCK solo reintenta durante 10 s
+                try:
+                    msvcrt.locking(handle.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+            else:
+                handle.seek(0)
+                msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+
+def to_day_number(date_str: str) -> int:
+    """Convertir 'YYYY-MM-DD' en número de día (mismo cálculo que DAY_NUMBER_SQL)"""
+    return (datetime.strptime(date_str[:10], '%Y-%m-%d') - EPOCH).days
+
+# Gestores creados al deserializar en un proceso del pool, uno por configuración
+_process_managers: Dict[tuple, 'DatabaseManager'] = {}
+_process_managers_lock = threading.Lock()
+
+def process_manager(config: Dict) -> 'DatabaseManager':
+    """Gestor de este proceso para config (lo usa pickle en los workers de un pool)
+
+    Cada tarea enviada a un ProcessPoolExecutor deserializa de nuevo el
+    gestor; reutilizar uno por proceso evita abrir (y no cerrar nunca) un
+    ConnectionPool por tarea.
+    """
+    key = tuple(sorted(config.items()))
+    with _process_managers_lock:
+        manager = _process_managers.get(key)
+        if manager is None:
+            manager = _process_managers[key] = DatabaseManager(**config)
+        return manager
 
 class DatabaseManager:
-    def __init__(self, db_path: str = "analytics.db"):
+    def __init__(self, db_path: str = "analytics.db", pool_size: int = 4,
+                 day_numbers: bool = False, backend: str = 'sqlite',
+                 mirror_dir: Optional[str] = None, max_working_set: Optional[int] = None):
+        if backend not in ANALYTICS_BACKENDS:
+            raise ValueError(f"Backend analítico no soportado: {backend}")
         self.db_path = db_path
+        self.pool_size = pool_size
+        self.day_numbers = day_numbers
+        self.backend = backend
+        self.mirror_dir = mirror_dir
+        # Bytes máximos que una lectura a DataFrame o el snapshot pueden ocupar (None: sin límite)
+        self.max_working_set = max_working_set
+        self.pool = ConnectionPool(db_path, size=pool_size)
+        self._change_listeners: List[Callable[[], None]] = []
+        self._duckdb: Optional[DuckDBBackend] = None
+        self._snapshot: Optional[SalesSnapshot] = None
+        self._prefix_index: Optional[PrefixSumIndex] = None
         self.init_database()
+        if backend == 'duckdb':
+            self._duckdb = DuckDBBackend(self, mirror_dir)
+    
+    def __reduce__(self):
+        """Enviar a un pool de procesos solo la configuración (sin listeners ni conexiones)
+
+        El proceso que lo recibe reutiliza su gestor para esa configuración
+        (process_manager) en lugar de abrir un pool de conexiones por tarea.
+        """
+        return process_manager, ({
+            'db_path': self.db_path,
+            'pool_size': self.pool_size,
+            'day_numbers': self.day_numbers,
+            'backend': self.backend,
+            'mirror_dir': self.mirror_dir,
+            'max_working_set': self.max_working_set,
+        },)
+    
+    def close(self):
+        """Cerrar las conexiones del pool (hook de apagado)"""
+        if self._duckdb is not None:
+            self._duckdb.close()
+        self.pool.close()
     
     def init_database(self):
-        """Inicializar la base de datos con tablas necesarias"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Tabla de ventas
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS sales (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                date TEXT NOT NULL,
-                product TEXT NOT NULL,
-                region TEXT NOT NULL,
-                sales_amount REAL NOT NULL,
-                profit REAL NOT NULL,
-                quantity INTEGER NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Tabla de productos
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS products (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT UNIQUE NOT NULL,
-                category TEXT NOT NULL,
-                price REAL NOT NULL,
-                cost REAL NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Tabla de regiones
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS regions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT UNIQUE NOT NULL,
-                country TEXT NOT NULL,
-                population INTEGER NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        """Inicializar la base de datos con tablas necesarias y aplicar migraciones"""
+        with self.pool.writer() as conn:
+            # Serializar la inicialización entre workers que arrancan a la vez
+            conn.execute("BEGIN IMMEDIATE")
+            cursor = conn.cursor()
+            
+            # Tablas de ventas, productos y regiones
+            for table, create_sql in TABLE_SCHEMAS.items():
+                cursor.execute(create_sql.format(name=table))
+            
+            # Metadatos (versión de los datos de ventas)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS metadata (
+                    key TEXT PRIMARY KEY,
+                    value INTEGER NOT NULL
+                )
+            ''')
+            cursor.execute("INSERT OR IGNORE INTO metadata (key, value) VALUES ('sales_version', 0)")
+            cursor.execute("INSERT OR IGNORE INTO metadata (key, value) VALUES ('rollup_last_id', 0)")
+            cursor.execute("INSERT OR IGNORE INTO metadata (key, value) VALUES ('sales_generation', 0)")
+            # Fin de la última siembra en milisegundos (ver seed)
+            cursor.execute("INSERT OR IGNORE INTO metadata (key, value) VALUES ('seeded_at', 0)")
+            cursor.execute("INSERT OR IGNORE INTO metadata (key, value) "
+                           "VALUES ('sales_modified', CAST(strftime('%s', 'now') AS INTEGER))")
+            
+            self._run_migrations(conn)
+            if self.day_numbers:
+                self._ensure_day_column(conn)
+    
+    def _run_migrations(self, conn: sqlite3.Connection):
+        """Aplicar las migraciones pendientes según PRAGMA user_version"""
+        current = conn.execute("PRAGMA user_version").fetchone()[0]
+        for version, migration in SCHEMA_MIGRATIONS:
+            if version > current:
+                getattr(self, migration)(conn)
+                conn.execute(f"PRAGMA user_version = {version}")
+    
+    @staticmethod
+    def _table_columns(conn: sqlite3.Connection, table: str) -> List[str]:
+        """Columnas de una tabla, incluidas las generadas"""
+        return [row[1] for row in conn.execute(f"PRAGMA table_xinfo({table})")]
+    
+    def _migrate_declared_schema(self, conn: sqlite3.Connection):
+        """Migración 1: reconstruir tablas que to_sql(if_exists='replace') dejó sin esquema
+
+        Las versiones anteriores sustituían las tablas por otras sin id, tipos
+        ni restricciones; se recrean con el esquema declarado conservando los datos.
+        """
+        for table, create_sql in TABLE_SCHEMAS.items():
+            columns = self._table_columns(conn, table)
+            if 'id' in columns:
+                continue
+            legacy = f"{table}_legacy"
+            conn.execute(f"ALTER TABLE {table} RENAME TO {legacy}")
+            conn.execute(create_sql.format(name=table))
+            copied = [c for c in TABLE_DATA_COLUMNS[table] if c in columns]
+            column_list = ", ".join(copied)
+            conn.execute(f"INSERT INTO {table} ({column_list}) SELECT {column_list} FROM {legacy}")
+            conn.execute(f"DROP TABLE {legacy}")
+    
+    def _migrate_sales_indexes(self, conn: sqlite3.Connection):
+        """Migración 2: índices de cobertura para rangos de fechas y filtros"""
+        for index_sql in SALES_INDEXES.values():
+            conn.execute(index_sql)
+    
+    def _migrate_sales_daily(self, conn: sqlite3.Connection):
+        """Migración 3: rollup diario sales_daily construido desde sales"""
+        conn.execute(SALES_DAILY_SCHEMA.format(name='sales_daily'))
+        self._rebuild_rollup(conn)
+    
+    def _ensure_day_column(self, conn: sqlite3.Connection):
+        """Añadir la fecha como número de día entero (opcional) con su índice
+
+        Es una columna generada virtual, así que no ocupa espacio en la tabla
+        y las escrituras no tienen que calcularla.
+        """
+        if 'day' not in self._table_columns(conn, 'sales'):
+            conn.execute(
+                f"ALTER TABLE sales ADD COLUMN day INTEGER "
+                f"GENERATED ALWAYS AS ({DAY_NUMBER_SQL}) VIRTUAL"
             )
-        ''')
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_sales_day "
+            "ON sales(day, sales_amount, profit, quantity)"
+        )
+    
+    def get_data_version(self) -> int:
+        """Versión de los datos de ventas; aumenta con cada escritura en sales"""
+        with self.pool.reader() as conn:
+            row = conn.execute("SELECT value FROM metadata WHERE key = 'sales_version'").fetchone()
+        return row[0] if row else 0
+    
+    def get_data_state(self) -> Tuple[int, int]:
+        """(versión, instante Unix de la última escritura) de los datos de ventas"""
+        with self.pool.reader() as conn:
+            state = dict(conn.execute(
+                "SELECT key, value FROM metadata WHERE key IN ('sales_version', 'sales_modified')"
+            ).fetchall())
+        return state.get('sales_version', 0), state.get('sales_modified', 0)
+    
+    def add_change_listener(self, callback: Callable[[], None]):
+        """Registrar una función a llamar cuando cambia la tabla sales"""
+        self._change_listeners.append(callback)
+    
+    def _mark_sales_changed(self, conn: sqlite3.Connection):
+        """Incrementar la versión de datos dentro de la transacción de escritura"""
+        conn.execute("UPDATE metadata SET value = value + 1 WHERE key = 'sales_version'")
+        conn.execute("UPDATE metadata SET value = CAST(strftime('%s', 'now') AS INTEGER) "
+                     "WHERE key = 'sales_modified'")
+    
+    def _notify_sales_changed(self):
+        """Avisar a los listeners después de confirmar una escritura en sales"""
+        for callback in self._change_listeners:
+            callback()
+    
+    @staticmethod
+    def _rollup_state(conn: sqlite3.Connection):
+        """(último id incorporado a sales_daily, id máximo de sales)"""
+        last_id = conn.execute(
+            "SELECT value FROM metadata WHERE key = 'rollup_last_id'"
+        ).fetchone()[0]
+        max_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM sales").fetchone()[0]
+        return last_id, max_id
+    
+    def refresh_rollup(self) -> int:
+        """Incorporar a sales_daily las ventas nuevas; devuelve los ids procesados
+
+        Solo se agregan las filas con id mayor que el último procesado, así
+        que el coste depende de lo insertado desde el último refresco y no
+        del tamaño de sales. Las lecturas lo llaman antes de consultar el
+        rollup, lo que también recoge inserciones hechas por otros procesos.
+        Los UPDATE/DELETE externos sobre sales no se detectan; check_rollup
+        los encuentra y repara.
+        """
+        with self.pool.reader() as conn:
+            last_id, max_id = self._rollup_state(conn)
+        if last_id == max_id:
+            return 0
+        with self.pool.writer() as conn:
+            return self._refresh_rollup(conn)
+    
+    def _refresh_rollup(self, conn: sqlite3.Connection) -> int:
+        """Refresco incremental dentro de una transacción de escritura"""
+        last_id, max_id = self._rollup_state(conn)
+        if max_id < last_id:
+            # sales se vació o se reescribió desde el último refresco
+            return self._rebuild_rollup(conn)
+        if max_id == last_id:
+            return 0
+        conn.execute(f'''
+            INSERT INTO sales_daily
+                (date, product, region, sales_amount, profit, quantity, orders)
+            {SALES_DAILY_AGGREGATE_SQL}
+            ON CONFLICT (date, product, region) DO UPDATE SET
+                sales_amount = sales_amount + excluded.sales_amount,
+                profit = profit + excluded.profit,
+                quantity = quantity + excluded.quantity,
+                orders = orders + excluded.orders
+        ''', (last_id, max_id))
+        conn.execute("UPDATE metadata SET value = ? WHERE key = 'rollup_last_id'", (max_id,))
+        return max_id - last_id
+    
+    def _rebuild_rollup(self, conn: sqlite3.Connection) -> int:
+        """Reconstruir sales_daily desde cero"""
+        conn.execute("DELETE FROM sales_daily")
+        conn.execute("UPDATE metadata SET value = 0 WHERE key = 'rollup_last_id'")
+        return self._refresh_rollup(conn)
+    
+    def check_rollup(self, repair: bool = False) -> Dict:
+        """Comparar el rollup incremental con uno reconstruido desde sales
+
+        Devuelve las filas de cada versión y cuántas claves (fecha, producto,
+        región) faltan, sobran o tienen valores distintos. Con repair=True
+        el rollup se sustituye por el reconstruido si hay diferencias.
+        """
+        with self.pool.writer() as conn:
+            self._refresh_rollup(conn)
+            conn.execute("DROP TABLE IF EXISTS temp.sales_daily_check")
+            conn.execute(SALES_DAILY_SCHEMA.format(name='temp.sales_daily_check'))
+            _, max_id = self._rollup_state(conn)
+            conn.execute(f"INSERT INTO temp.sales_daily_check {SALES_DAILY_AGGREGATE_SQL}",
+                         (0, max_id))
+            
+            different = '''
+                ABS(a.sales_amount - b.sales_amount) > 1e-6 * MAX(1, ABS(b.sales_amount))
+                OR ABS(a.profit - b.profit) > 1e-6 * MAX(1, ABS(b.profit))
+                OR a.quantity != b.quantity OR a.orders != b.orders
+            '''
+            report = {
+                'rollup_rows': conn.execute("SELECT COUNT(*) FROM sales_daily").fetchone()[0],
+                'rebuilt_rows': conn.execute(
+                    "SELECT COUNT(*) FROM temp.sales_daily_check").fetchone()[0],
+                'missing': conn.execute('''
+                    SELECT COUNT(*) FROM temp.sales_daily_check b
+                    LEFT JOIN sales_daily a USING (date, product, region)
+                    WHERE a.date IS NULL
+                ''').fetchone()[0],
+                'extra': conn.execute('''
+                    SELECT COUNT(*) FROM sales_daily a
+                    LEFT JOIN temp.sales_daily_check b USING (date, product, region)
+                    WHERE b.date IS NULL
+                ''').fetchone()[0],
+                'mismatched': conn.execute(f'''
+                    SELECT COUNT(*) FROM sales_daily a
+                    JOIN temp.sales_daily_check b USING (date, product, region)
+                    WHERE {different}
+                ''').fetchone()[0],
+            }
+            report['consistent'] = not (report['missing'] or report['extra'] or report['mismatched'])
+            report['repaired'] = repair and not report['consistent']
+            if report['repaired']:
+                conn.execute("DELETE FROM sales_daily")
+                conn.execute("INSERT INTO sales_daily SELECT * FROM temp.sales_daily_check")
+            conn.execute("DROP TABLE temp.sales_daily_check")
+        return report
+    
+    def ingest(self, source, fmt: str = 'ndjson', chunk_size: int = INGEST_CHUNK_SIZE) -> Dict:
+        """Añadir ventas desde un flujo NDJSON o CSV (fichero binario) sin reemplazar la tabla
+
+        Las filas se leen y validan por bloques de chunk_size con operaciones
+        vectorizadas; cada bloque se inserta con executemany en su propia
+        transacción, que también actualiza sales_daily y la versión de los
+        datos. Las filas no válidas (incluidas las líneas JSON mal formadas)
+        se descartan y se informa de las primeras. Un CSV sin las columnas
+        necesarias lanza ValueError; los bloques anteriores ya confirmados
+        se conservan.
+        """
+        if fmt not in INGEST_FORMATS:
+            raise ValueError(f"Formato no soportado: {fmt}")
+        columns = TABLE_DATA_COLUMNS['sales']
+        insert_sql = (f"INSERT INTO sales ({', '.join(columns)}) "
+                      f"VALUES ({', '.join('?' for _ in columns)})")
+        batches = (self._ndjson_batches(source, chunk_size) if fmt == 'ndjson'
+                   else self._csv_batches(source, chunk_size))
         
-        conn.commit()
-        conn.close()
+        start = time.perf_counter()
+        received = inserted = 0
+        errors = []
+        for batch in batches:
+            valid, batch_errors = self._validate_sales_batch(batch)
+            errors.extend((received + row + 1, reason)
+                          for row, reason in batch_errors[:INGEST_MAX_ERRORS - len(errors)])
+            received += len(batch)
+            if len(valid) == 0:
+                continue
+            # Insertar en el orden de los índices de sales reduce las páginas que se tocan
+            valid = valid.sort_values(['date', 'product', 'region'], kind='stable')
+            with self.pool.writer() as conn:
+                conn.executemany(insert_sql, zip(*(valid[c].tolist() for c in columns)))
+                self._refresh_rollup(conn)
+                self._mark_sales_changed(conn)
+            self._notify_sales_changed()
+            inserted += len(valid)
+        
+        elapsed = time.perf_counter() - start
+        return {
+            'rows_received': received,
+            'rows_inserted': inserted,
+            'rows_rejected': received - inserted,
+            'errors': [{'row': row, 'error': reason} for row, reason in errors],
+            'seconds': round(elapsed, 3),
+            'rows_per_second': round(inserted / elapsed) if elapsed > 0 else 0
+        }
+    
+    @staticmethod
+    def _ndjson_batches(source, chunk_size: int):
+        """Bloques de NDJSON como DataFrames; las líneas mal formadas quedan vacías"""
+        columns = TABLE_DATA_COLUMNS['sales']
+        
+        def parse_line(line):
+            try:
+                return json.loads(line)
+            except ValueError:
+                return {}
+        
+        def parse(lines):
+            try:
+                # Un solo json.loads por bloque es mucho más rápido que uno por línea
+                records = json.loads(b"[" + b",".join(lines) + b"]")
+            except ValueError:
+                records = None
+            if records is None or len(records) != len(lines):
+                # Una línea como '{...},{...}' aportaría dos registros: línea a línea
+                records = [parse_line(line) for line in lines]
+            records = [record if isinstance(record, dict) else {} for record in records]
+            return pd.DataFrame.from_records(records, columns=columns)
+        
+        lines = []
+        for line in source:
+            line = line.strip()
+            if not line:
+                continue
+            lines.append(line)
+            if len(lines) == chunk_size:
+                yield parse(lines)
+                lines = []
+        if lines:
+            yield parse(lines)
+    
+    @staticmethod
+    def _csv_batches(source, chunk_size: int):
+        """Bloques de CSV como DataFrames; exige una cabecera con las columnas de sales"""
+        columns = TABLE_DATA_COLUMNS['sales']
+        text_columns = {'date': str, 'product': str, 'region': str}
+        try:
+            reader = pd.read_csv(source, chunksize=chunk_size, dtype=text_columns)
+        except pd.errors.EmptyDataError:
+            return
+        with reader:
+            for batch in reader:
+                missing = [c for c in columns if c not in batch.columns]
+                if missing:
+                    raise ValueError(f"Faltan columnas en el CSV: {', '.join(missing)}")
+                yield batch[columns].reset_index(drop=True)
     
-    def generate_sample_data(self, num_records: int = 1000):
-        """Generar datos de muestra realistas usando pandas"""
-        np.random.seed(42)
+    @staticmethod
+    def _validate_sales_batch(batch: pd.DataFrame):
+        """Validar un bloque de ventas de forma vectorizada
+
+        Devuelve (filas válidas normalizadas, [(posición en el bloque, motivo)]).
+        """
+        def text(column):
+            # Columnas sin ningún texto (p. ej. todo números) son todas no válidas
+            values = batch[column]
+            if values.dtype == object or pd.api.types.is_string_dtype(values.dtype):
+                return values
+            return pd.Series(None, index=batch.index, dtype=object)
         
-        # Productos
-        products = [
-            "Laptop Pro", "Smartphone X", "Tablet Air", "Monitor 4K", 
-            "Keyboard RGB", "Mouse Wireless", "Headphones Pro", "Webcam HD",
-            "Speaker Bluetooth", "Charger Fast"
-        ]
+        dates = text('date')
+        product = text('product').str.strip()
+        region = text('region').str.strip()
+        sales_amount = pd.to_numeric(batch['sales_amount'], errors='coerce').astype(float)
+        profit = pd.to_numeric(batch['profit'], errors='coerce').astype(float)
+        quantity = pd.to_numeric(batch['quantity'], errors='coerce').astype(float)
         
-        # Regiones
-        regions = ["Norte", "Sur", "Este", "Oeste", "Centro"]
+        checks = {
+            # La longitud descarta variantes que to_datetime acepta, como '2024-1-5'
+            'fecha no válida (YYYY-MM-DD)': ~(
+                (dates.str.len() == 10).to_numpy(dtype=bool, na_value=False)
+                & pd.to_datetime(dates, format='%Y-%m-%d', errors='coerce').notna().to_numpy()
+            ),
+            'producto vacío': ~(product.str.len() > 0).to_numpy(dtype=bool, na_value=False),
+            'región vacía': ~(region.str.len() > 0).to_numpy(dtype=bool, na_value=False),
+            'sales_amount no numérico': ~np.isfinite(sales_amount.to_numpy()),
+            'profit no numérico': ~np.isfinite(profit.to_numpy()),
+            'quantity debe ser un entero positivo': ~(
+                np.isfinite(quantity) & (quantity > 0) & (quantity == np.floor(quantity))
+            ).to_numpy(),
+        }
+        invalid = np.zeros(len(batch), dtype=bool)
+        errors = []
+        for reason, mask in checks.items():
+            errors.extend((row, reason) for row in np.flatnonzero(mask & ~invalid))
+            invalid |= mask
+        errors.sort()
+        
+        valid = ~invalid
+        clean = pd.DataFrame({
+            'date': dates[valid],
+            'product': product[valid],
+            'region': region[valid],
+            'sales_amount': sales_amount[valid],
+            'profit': profit[valid],
+            'quantity': quantity[valid].astype(np.int64)
+        })
+        return clean, [(int(row), reason) for row, reason in errors]
+    
+    def has_sales_data(self) -> bool:
+        """Comprobar si sales tiene alguna fila (O(1), no cuenta la tabla)"""
+        with self.pool.reader() as conn:
+            return bool(conn.execute("SELECT EXISTS (SELECT 1 FROM sales)").fetchone()[0])
+    
+    def seed(self, mode: str = 'seed-if-empty', num_records: int = 1000, **kwargs) -> bool:
+        """Sembrar datos de muestra al arrancar según el modo; devuelve si se sembró
+
+        'never' no toca la base de datos, 'seed-if-empty' solo genera datos
+        si sales está vacía y 'always' los regenera en cada arranque. Un lock
+        de fichero junto a la base de datos hace que, con varios workers
+        arrancando a la vez, solo uno siembre: con 'seed-if-empty' el resto ve
+        la tabla llena y con 'always' ve en seeded_at una siembra terminada
+        después de que lo pidiera, así que no la repite.
+        """
+        if mode not in SEED_MODES:
+            raise ValueError(f"Modo de siembra no válido: {mode}")
+        if mode == 'never' or (mode == 'seed-if-empty' and self.has_sales_data()):
+            return False
         
-        # Categorías
-        categories = ["Electronics", "Computing", "Audio", "Accessories"]
+        requested = int(time.time() * 1000)
+        with file_lock(f"{self.db_path}.seed.lock"):
+            if mode == 'seed-if-empty' and self.has_sales_data():
+                return False
+            if mode == 'always' and self._seeded_at() >= requested:
+                return False
+            self.generate_sample_data(num_records, return_df=False, **kwargs)
+            with self.pool.writer() as conn:
+                conn.execute("UPDATE metadata SET value = ? WHERE key = 'seeded_at'",
+                             (int(time.time() * 1000),))
+        return True
+    
+    def _seeded_at(self) -> int:
+        with self.pool.reader() as conn:
+            return conn.execute("SELECT value FROM metadata WHERE key = 'seeded_at'").fetchone()[0]
+    
+    def generate_sample_data(self, num_records: int = 1000, seed: Optional[int] = 42,
+                             chunk_size: int = 100000, return_df: bool = True):
+        """Generar datos de muestra realistas de forma vectorizada
+
+        Cada bloque de chunk_size filas se genera con arrays de
+        np.random.default_rng(seed) y se inserta con executemany, todo en una
+        única transacción. El resultado es reproducible para la misma
+        semilla y chunk_size. Con return_df=False no se conserva el
+        DataFrame de ventas, de modo que la memoria depende de chunk_size y
+        no de num_records (útil para bases de datos de benchmark).
+        """
+        rng = np.random.default_rng(seed)
         
-        # Generar fechas (últimos 12 meses)
+        # Fechas (últimos 12 meses)
         start_date = datetime.now() - timedelta(days=365)
-        dates = pd.date_range(start=start_date, end=datetime.now(), freq='D')
-        
-        # Generar datos
-        data = []
-        for _ in range(num_records):
-            date = pd.to_datetime(np.random.choice(dates)).strftime('%Y-%m-%d')
-            product = np.random.choice(products)
-            region = np.random.choice(regions)
-            
-            # Precios realistas
-            base_price = np.random.uniform(50, 2000)
-            quantity = np.random.randint(1, 10)
-            sales_amount = base_price * quantity
-            profit = sales_amount * np.random.uniform(0.1, 0.4)
+        dates = pd.date_range(start=start_date, end=datetime.now(), freq='D').strftime('%Y-%m-%d')
+        dates = dates.to_numpy()
+        products = np.array(SAMPLE_PRODUCTS)
+        regions = np.array(SAMPLE_REGIONS)
+        
+        product_df = pd.DataFrame({
+            'name': SAMPLE_PRODUCTS,
+            'category': [SAMPLE_CATEGORIES[i % len(SAMPLE_CATEGORIES)]
+                         for i in range(len(SAMPLE_PRODUCTS))],
+            'price': rng.uniform(50, 2000, len(SAMPLE_PRODUCTS)),
+            'cost': rng.uniform(30, 1200, len(SAMPLE_PRODUCTS))
+        })
+        region_df = pd.DataFrame({
+            'name': SAMPLE_REGIONS,
+            'country': 'España',
+            'population': rng.integers(100000, 2000000, len(SAMPLE_REGIONS))
+        })
+        
+        columns = TABLE_DATA_COLUMNS['sales']
+        insert_sql = (f"INSERT INTO sales ({', '.join(columns)}) "
+                      f"VALUES ({', '.join('?' for _ in columns)})")
+        chunks = []
+        
+        with self.pool.writer() as conn:
+            self._clear_table(conn, 'sales')
+            # Los ids vuelven a empezar: los espejos incrementales deben reconstruirse
+            conn.execute("UPDATE metadata SET value = value + 1 WHERE key = 'sales_generation'")
+            # Reconstruir los índices al final es más rápido que mantenerlos fila a fila
+            indexes = self._drop_sales_indexes(conn)
+            for offset in range(0, num_records, chunk_size):
+                n = min(chunk_size, num_records - offset)
+                
+                # Precios realistas
+                base_price = rng.uniform(50, 2000, n)
+                quantity = rng.integers(1, 10, n)
+                sales_amount = base_price * quantity
+                profit = sales_amount * rng.uniform(0.1, 0.4, n)
+                chunk = {
+                    'date': dates[rng.integers(0, len(dates), n)],
+                    'product': products[rng.integers(0, len(products), n)],
+                    'region': regions[rng.integers(0, len(regions), n)],
+                    'sales_amount': np.round(sales_amount, 2),
+                    'profit': np.round(profit, 2),
+                    'quantity': quantity
+                }
+                conn.executemany(insert_sql, zip(*(chunk[c].tolist() for c in columns)))
+                if return_df:
+                    chunks.append(pd.DataFrame(chunk))
+            for index_sql in indexes:
+                conn.execute(index_sql)
+            self._rebuild_rollup(conn)
             
-            data.append({
-                'date': date,
-                'product': product,
-                'region': region,
-                'sales_amount': round(sales_amount, 2),
-                'profit': round(profit, 2),
-                'quantity': quantity
-            })
-        
-        # Crear DataFrame
-        df = pd.DataFrame(data)
-        
-        # Insertar en base de datos
-        conn = sqlite3.connect(self.db_path)
-        df.to_sql('sales', conn, if_exists='replace', index=False)
-        
-        # Insertar productos
-        product_data = []
-        for i, product in enumerate(products):
-            product_data.append({
-                'name': product,
-                'category': categories[i % len(categories)],
-                'price': np.random.uniform(50, 2000),
-                'cost': np.random.uniform(30, 1200)
-            })
-        
-        product_df = pd.DataFrame(product_data)
-        product_df.to_sql('products', conn, if_exists='replace', index=False)
-        
-        # Insertar regiones
-        region_data = []
-        for region in regions:
-            region_data.append({
-                'name': region,
-                'country': 'España',
-                'population': np.random.randint(100000, 2000000)
-            })
-        
-        region_df = pd.DataFrame(region_data)
-        region_df.to_sql('regions', conn, if_exists='replace', index=False)
-        
-        conn.close()
-        return df
-    
-    def get_sales_data(self, start_date: Optional[str] = None, end_date: Optional[str] = None):
-        """Obtener datos de ventas con filtros"""
-        conn = sqlite3.connect(self.db_path)
-        
-        query = "SELECT * FROM sales"
+            self._replace_rows(conn, 'products', product_df)
+            self._replace_rows(conn, 'regions', region_df)
+            self._mark_sales_changed(conn)
+        self._notify_sales_changed()
+        
+        if not return_df:
+            return None
+        if not chunks:
+            return pd.DataFrame(columns=columns)
+        return pd.concat(chunks, ignore_index=True)
+    
+    @staticmethod
+    def _clear_table(conn: sqlite3.Connection, table: str):
+        """Vaciar una tabla y reiniciar su autoincremento"""
+        conn.execute(f"DELETE FROM {table}")
+        conn.execute("DELETE FROM sqlite_sequence WHERE name = ?", (table,))
+    
+    @staticmethod
+    def _drop_sales_indexes(conn: sqlite3.Connection) -> List[str]:
+        """Eliminar los índices de sales y devolver su SQL para recrearlos"""
+        indexes = conn.execute(
+            "SELECT name, sql FROM sqlite_master "
+            "WHERE type = 'index' AND tbl_name = 'sales' AND sql IS NOT NULL"
+        ).fetchall()
+        for name, _ in indexes:
+            conn.execute(f"DROP INDEX {name}")
+        return [index_sql for _, index_sql in indexes]
+    
+    @staticmethod
+    def _replace_rows(conn: sqlite3.Connection, table: str, df: pd.DataFrame):
+        """Sustituir el contenido de una tabla sin recrearla (mantiene esquema e índices)"""
+        columns = TABLE_DATA_COLUMNS[table]
+        DatabaseManager._clear_table(conn, table)
+        placeholders = ", ".join("?" for _ in columns)
+        conn.executemany(
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})",
+            df[columns].itertuples(index=False, name=None)
+        )
+    
+    def _sales_filters(self, start_date: Optional[str] = None, end_date: Optional[str] = None,
+                       product: Optional[str] = None, region: Optional[str] = None):
+        """Construir la cláusula WHERE (sin la palabra clave) y sus parámetros"""
+        clauses = []
         params = []
         
-        if start_date and end_date:
-            query += " WHERE date BETWEEN ? AND ?"
+        start_date = start_date or None
+        end_date = end_date or None
+        
+        # Con day_numbers el rango se compara sobre enteros indexados
+        if self.day_numbers:
+            date_column = "day"
+            start_date = to_day_number(start_date) if start_date else None
+            end_date = to_day_number(end_date) if end_date else None
+        else:
+            date_column = "date"
+        
+        if start_date is not None and end_date is not None:
+            clauses.append(f"{date_column} BETWEEN ? AND ?")
             params.extend([start_date, end_date])
-        elif start_date:
-            query += " WHERE date >= ?"
+        elif start_date is not None:
+            clauses.append(f"{date_column} >= ?")
             params.append(start_date)
-        elif end_date:
-            query += " WHERE date <= ?"
+        elif end_date is not None:
+            clauses.append(f"{date_column} <= ?")
             params.append(end_date)
         
-        df = pd.read_sql_query(query, conn, params=params)
-        conn.close()
-        return df
-    
-    def get_analytics_summary(self):
-        """Obtener resumen analítico usando pandas"""
-        conn = sqlite3.connect(self.db_path)
+        if product:
+            clauses.append("product = ?")
+            params.append(product)
         
-        # Datos de ventas
-        sales_df = pd.read_sql_query("SELECT * FROM sales", conn)
-        sales_df['date'] = pd.to_datetime(sales_df['date'])
+        if region:
+            clauses.append("region = ?")
+            params.append(region)
         
-        # Métricas generales
-        total_sales = sales_df['sales_amount'].sum()
-        total_profit = sales_df['profit'].sum()
-        total_customers = sales_df['quantity'].sum()
-        avg_order_value = sales_df['sales_amount'].mean()
+        return clauses, params
+    
+    @staticmethod
+    def _validate_fields(fields: Optional[List[str]]) -> List[str]:
+        """Comprobar la proyección de columnas pedida"""
+        if not fields:
+            return list(SALES_COLUMNS)
+        invalid = [field for field in fields if field not in SALES_COLUMNS]
+        if invalid:
+            raise ValueError(f"Columnas no válidas: {', '.join(invalid)}")
+        return list(fields)
+    
+    def _sales_query(self, start_date: Optional[str] = None, end_date: Optional[str] = None,
+                     product: Optional[str] = None, region: Optional[str] = None,
+                     fields: Optional[List[str]] = None, after_id: Optional[int] = None,
+                     limit: Optional[int] = None):
+        """SQL y parámetros para leer ventas filtradas, ordenadas por id"""
+        columns = self._validate_fields(fields)
+        clauses, params = self._sales_filters(start_date, end_date, product, region)
         
-        # Crecimiento (comparar últimos 3 meses vs anteriores)
-        current_date = datetime.now()
-        three_months_ago = current_date - timedelta(days=90)
-        six_months_ago = current_date - timedelta(days=180)
+        if after_id is not None:
+            clauses.append("id > ?")
+            params.append(after_id)
         
-        recent_sales = sales_df[sales_df['date'] >= three_months_ago]['sales_amount'].sum()
-        previous_sales = sales_df[
-            (sales_df['date'] >= six_months_ago) & 
-            (sales_df['date'] < three_months_ago)
-        ]['sales_amount'].sum()
+        query = f"SELECT {', '.join(columns)} FROM sales"
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += " ORDER BY id"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        return query, params
+    
+    def get_sales_data(self, start_date: Optional[str] = None, end_date: Optional[str] = None,
+                       product: Optional[str] = None, region: Optional[str] = None,
+                       fields: Optional[List[str]] = None):
+        """Obtener datos de ventas con filtros
+
+        Se lee por bloques con tipos explícitos; si el DataFrame acumulado
+        supera max_working_set se aborta con WorkingSetExceededError antes
+        de leer el resto.
+        """
+        columns = self._validate_fields(fields)
+        query, params = self._sales_query(start_date, end_date, product, region, columns)
+        frames = []
+        used = 0
+        chunks = self.read_frames(query, params, columns)
+        try:
+            for chunk in chunks:
+                used += int(chunk.memory_usage(deep=True).sum())
+                self.check_working_set(used, "La lectura de ventas")
+                frames.append(chunk)
+        finally:
+            chunks.close()
+        return concat_frames(frames, columns)
+
+    def read_frames(self, query: str, params: List, columns: List[str],
+                    chunk_size: Optional[int] = None, parse_dates: bool = False):
+        """Recorrer el resultado de una consulta sobre sales como DataFrames por bloques
+
+        columns son las columnas que devuelve la consulta. Las numéricas se
+        leen con SALES_READ_DTYPES, producto y
+        región como categóricas y, con parse_dates, la fecha se convierte a
+        datetime una sola vez por bloque.
+        """
+        dtypes = {name: SALES_READ_DTYPES[name] for name in columns if name in SALES_READ_DTYPES}
+        with self.pool.reader() as conn:
+            for chunk in pd.read_sql_query(query, conn, params=params,
+                                           chunksize=chunk_size or READ_CHUNK_SIZE, dtype=dtypes):
+                for name in CATEGORICAL_COLUMNS:
+                    if name in chunk:
+                        chunk[name] = chunk[name].astype('category')
+                if parse_dates and 'date' in chunk:
+                    chunk['date'] = pd.to_datetime(chunk['date'], format='ISO8601')
+                yield chunk
+
+    def check_working_set(self, nbytes: int, operation: str):
+        """Rechazar una operación que ocuparía más de max_working_set bytes"""
+        if self.max_working_set is not None and nbytes > self.max_working_set:
+            raise WorkingSetExceededError(
+                f"{operation} necesita más de {self.max_working_set // (1024 * 1024)} MB "
+                f"de memoria de trabajo (max_working_set)")
+    
+    def get_sales_page(self, start_date: Optional[str] = None, end_date: Optional[str] = None,
+                       product: Optional[str] = None, region: Optional[str] = None,
+                       fields: Optional[List[str]] = None, after_id: Optional[int] = None,
+                       limit: int = 1000):
+        """Obtener una página de ventas con paginación por cursor sobre id
+
+        Devuelve (DataFrame, next_cursor); next_cursor es None en la última página.
+        """
+        columns = self._validate_fields(fields)
+        # El id es necesario para el cursor aunque no se haya pedido
+        query_columns = columns if 'id' in columns else ['id'] + columns
+        query, params = self._sales_query(start_date, end_date, product, region,
+                                          query_columns, after_id, limit + 1)
+        with self.pool.reader() as conn:
+            df = pd.read_sql_query(query, conn, params=params)
         
+        next_cursor = None
+        if len(df) > limit:
+            df = df.iloc[:limit]
+            next_cursor = int(df['id'].iloc[-1])
+        return df[columns], next_cursor
+    
+    def iter_sales_rows(self, start_date: Optional[str] = None, end_date: Optional[str] = None,
+                        product: Optional[str] = None, region: Optional[str] = None,
+                        fields: Optional[List[str]] = None, after_id: Optional[int] = None,
+                        limit: Optional[int] = None, chunk_size: int = 5000):
+        """Leer ventas filtradas por bloques sin materializar el resultado
+
+        Devuelve (columnas, iterador de listas de tuplas). La conexión de
+        lectura queda prestada mientras se consume el iterador.
+        """
+        columns = self._validate_fields(fields)
+        query, params = self._sales_query(start_date, end_date, product, region,
+                                          columns, after_id, limit)
+        return columns, self._iter_query(query, params, chunk_size)
+    
+    def _iter_query(self, query: str, params: List, chunk_size: int):
+        """Recorrer el resultado de una consulta con fetchmany"""
+        with self.pool.reader() as conn:
+            cursor = conn.execute(query, params)
+            try:
+                while True:
+                    rows = cursor.fetchmany(chunk_size)
+                    if not rows:
+                        break
+                    yield rows
+            finally:
+                cursor.close()
+    
+    def get_analytics_summary(self, start_date: Optional[str] = None,
+                              end_date: Optional[str] = None, product: Optional[str] = None,
+                              region: Optional[str] = None, engine: Optional[str] = None):
+        """Obtener resumen analítico, opcionalmente filtrado
+
+        engine="sql" agrega dentro de SQLite sobre el rollup sales_daily;
+        engine="duckdb" agrega con DuckDB sobre el espejo Parquet;
+        engine="snapshot" agrega con NumPy sobre el snapshot en memoria;
+        engine="pandas" carga la tabla completa y se mantiene como
+        implementación de referencia. Por defecto se usa el backend
+        configurado.
+
+        Los filtros se aplican a todos los agregados. El crecimiento compara
+        los 90 días que terminan en end_date (hoy si no se indica) con los
+        90 anteriores, con los filtros de producto y región pero sin recortar
+        por start_date.
+        """
+        parse_day(start_date, "start_date")
+        end_day = parse_day(end_date, "end_date")
+        now = datetime.now() if end_day is None else end_day + timedelta(days=1)
+        filters = {'start_date': start_date or None, 'end_date': end_date or None,
+                   'product': product or None, 'region': region or None}
+        if engine is None:
+            engine = BACKEND_ENGINES[self.backend]
+        if engine == "sql":
+            aggregates = self._summary_aggregates_sql(now, filters)
+        elif engine == "duckdb":
+            aggregates = self._summary_aggregates_duckdb(now, filters)
+        elif engine == "snapshot":
+            try:
+                aggregates = self._summary_aggregates_snapshot(now, filters)
+            except WorkingSetExceededError:
+                # Sin memoria para el snapshot se degrada al rollup de SQLite
+                aggregates = self._summary_aggregates_sql(now, filters)
+        elif engine == "pandas":
+            aggregates = self._summary_aggregates_pandas(now, filters)
+        else:
+            raise ValueError(f"Motor de agregación no soportado: {engine}")
+        return self._build_summary(aggregates)
+
+    @staticmethod
+    def _growth_windows(now: datetime):
+        """Límites de las ventanas de crecimiento (últimos 3 meses vs anteriores)"""
+        three_months_ago = now - timedelta(days=90)
+        six_months_ago = now - timedelta(days=180)
+        return three_months_ago, six_months_ago
+
+    @staticmethod
+    def _first_day_on_or_after(moment: datetime) -> str:
+        """Primer día 'YYYY-MM-DD' cuya medianoche es >= moment
+
+        Las fechas de ventas son días completos, así que comparar contra este
+        día en SQL equivale a comparar timestamps como hace pandas.
+        """
+        day = moment.date()
+        if moment.time() != datetime.min.time():
+            day += timedelta(days=1)
+        return day.strftime('%Y-%m-%d')
+
+    def _growth_filters(self, now: datetime, filters: Dict):
+        """Inicio de la ventana reciente y WHERE de las dos ventanas de crecimiento"""
+        three_months_ago, six_months_ago = self._growth_windows(now)
+        recent_start = self._first_day_on_or_after(three_months_ago)
+        growth_where, growth_params = summary_where(
+            self._first_day_on_or_after(six_months_ago), filters['end_date'],
+            filters['product'], filters['region'])
+        return recent_start, growth_where, growth_params
+
+    def _summary_aggregates_sql(self, now: datetime, filters: Dict) -> Dict:
+        """Agregados del resumen calculados con SUM ... GROUP BY sobre sales_daily"""
+        where, params = summary_where(**filters)
+        recent_start, growth_where, growth_params = self._growth_filters(now, filters)
+
+        self.refresh_rollup()
+        with self.pool.reader() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute(f'''
+                SELECT
+                    COALESCE(SUM(sales_amount), 0),
+                    COALESCE(SUM(profit), 0),
+                    COALESCE(SUM(quantity), 0),
+                    SUM(sales_amount) / SUM(orders)
+                FROM sales_daily {where}
+            ''', params)
+            total_sales, total_profit, total_quantity, avg_order_value = cursor.fetchone()
+
+            cursor.execute(f'''
+                SELECT
+                    COALESCE(SUM(CASE WHEN date >= ? THEN sales_amount END), 0),
+                    COALESCE(SUM(CASE WHEN date < ? THEN sales_amount END), 0)
+                FROM sales_daily {growth_where}
+            ''', [recent_start, recent_start] + growth_params)
+            recent_sales, previous_sales = cursor.fetchone()
+
+            cursor.execute(f'''
+                SELECT strftime('%Y-%m', date) AS month, SUM(sales_amount), SUM(profit)
+                FROM sales_daily {where}
+                GROUP BY month
+                ORDER BY month
+            ''', params)
+            monthly = cursor.fetchall()
+
+            cursor.execute(f'''
+                SELECT product, SUM(sales_amount) AS total, SUM(quantity)
+                FROM sales_daily {where}
+                GROUP BY product
+                ORDER BY total DESC, product
+            ''', params)
+            products = cursor.fetchall()
+
+            cursor.execute(f'''
+                SELECT region, SUM(sales_amount) AS total, SUM(quantity)
+                FROM sales_daily {where}
+                GROUP BY region
+                ORDER BY total DESC, region
+            ''', params)
+            regions = cursor.fetchall()
+
+        return {
+            'total_sales': total_sales,
+            'total_profit': total_profit,
+            'total_quantity': total_quantity,
+            'avg_order_value': avg_order_value if avg_order_value is not None else np.nan,
+            'recent_sales': recent_sales,
+            'previous_sales': previous_sales,
+            'monthly': monthly,
+            'products': products,
+            'regions': regions,
+        }
+
+    def _summary_aggregates_duckdb(self, now: datetime, filters: Dict) -> Dict:
+        """Agregados del resumen calculados con DuckDB sobre el espejo Parquet"""
+        recent_start, growth_where, growth_params = self._growth_filters(now, filters)
+        return self._duckdb_backend().summary_aggregates(
+            summary_where(**filters), recent_start, (growth_where, growth_params))
+
+    def _duckdb_backend(self) -> DuckDBBackend:
+        """Backend DuckDB (se crea bajo demanda si se pide engine='duckdb')"""
+        if self._duckdb is None:
+            self._duckdb = DuckDBBackend(self, self.mirror_dir)
+        return self._duckdb
+
+    def _summary_aggregates_snapshot(self, now: datetime, filters: Dict) -> Dict:
+        """Agregados del resumen calculados con NumPy sobre el snapshot en memoria"""
+        three_months_ago, six_months_ago = self._growth_windows(now)
+        growth_filters = {**filters, 'start_date': self._first_day_on_or_after(six_months_ago)}
+        return self.sales_snapshot().summary_aggregates(
+            filters, self._first_day_on_or_after(three_months_ago), growth_filters)
+
+    def sales_snapshot(self) -> SalesSnapshot:
+        """Snapshot NumPy de sales (se crea bajo demanda y se refresca en cada consulta)"""
+        if self._snapshot is None:
+            self._snapshot = SalesSnapshot(self)
+        return self._snapshot
+
+    def _summary_aggregates_pandas(self, now: datetime, filters: Dict) -> Dict:
+        """Agregados del resumen calculados en pandas (implementación de referencia)
+
+        Las ventas se leen por bloques de READ_CHUNK_SIZE filas y los
+        agregados parciales de cada bloque se acumulan, así que la memoria no
+        depende del tamaño de la tabla.
+        """
+        # Los filtros de producto y región (también para el crecimiento) se aplican en SQLite
+        columns = ['date', 'product', 'region', 'sales_amount', 'profit', 'quantity']
+        query, params = self._sales_query(product=filters['product'], region=filters['region'],
+                                          fields=columns)
+        three_months_ago, six_months_ago = self._growth_windows(now)
+
+        def fold(total, part):
+            return part if total is None else total.add(part, fill_value=0)
+
+        totals = {'sales_amount': 0.0, 'profit': 0.0, 'quantity': 0}
+        orders = 0
+        recent_sales = previous_sales = 0.0
+        monthly = product_sales = region_sales = None
+        for sales_df in self.read_frames(query, params, columns, parse_dates=True):
+            # Crecimiento (comparar últimos 3 meses vs anteriores, hasta end_date)
+            growth_df = sales_df[sales_df['date'] < now] if filters['end_date'] else sales_df
+            recent_sales += growth_df.loc[growth_df['date'] >= three_months_ago, 'sales_amount'].sum()
+            previous_sales += growth_df.loc[
+                (growth_df['date'] >= six_months_ago) &
+                (growth_df['date'] < three_months_ago), 'sales_amount'
+            ].sum()
+
+            # Filtro de fechas del resto de agregados
+            if filters['start_date']:
+                sales_df = sales_df[sales_df['date'] >= filters['start_date']]
+            if filters['end_date']:
+                sales_df = sales_df[sales_df['date'] <= filters['end_date']]
+
+            for name in totals:
+                totals[name] += sales_df[name].sum()
+            orders += len(sales_df)
+
+            # Ventas por mes, productos y regiones del bloque
+            monthly = fold(monthly, sales_df.groupby(sales_df['date'].dt.to_period('M'))[
+                ['sales_amount', 'profit']].sum())
+            product_part = sales_df.groupby('product', observed=True)[['sales_amount', 'quantity']].sum()
+            product_sales = fold(product_sales, product_part.set_axis(product_part.index.astype(str)))
+            region_part = sales_df.groupby('region', observed=True)[['sales_amount', 'quantity']].sum()
+            region_sales = fold(region_sales, region_part.set_axis(region_part.index.astype(str)))
+
+        def ranking(grouped):
+            if grouped is None:
+                return []
+            grouped = grouped.astype({'quantity': 'int64'}).sort_values('sales_amount', ascending=False)
+            return list(grouped.itertuples(name=None))
+
+        return {
+            'total_sales': totals['sales_amount'],
+            'total_profit': totals['profit'],
+            'total_quantity': totals['quantity'],
+            'avg_order_value': totals['sales_amount'] / orders if orders else np.nan,
+            'recent_sales': recent_sales,
+            'previous_sales': previous_sales,
+            'monthly': [] if monthly is None else [
+                (str(period), row['sales_amount'], row['profit'])
+                for period, row in monthly.sort_index().iterrows()
+            ],
+            'products': ranking(product_sales),
+            'regions': ranking(region_sales),
+        }
+
+    @staticmethod
+    def _build_summary(aggregates: Dict) -> Dict:
+        """Construir la respuesta del resumen a partir de los agregados
+
+        inf/nan se convierten a 0 con operaciones vectorizadas por serie.
+        """
+        recent_sales = aggregates['recent_sales']
+        previous_sales = aggregates['previous_sales']
         growth_rate = ((recent_sales - previous_sales) / previous_sales * 100) if previous_sales > 0 else 0.0
-        # Asegurar que growth_rate no sea inf o nan
-        if not np.isfinite(growth_rate):
-            growth_rate = 0.0
-        
-        # Ventas por mes (últimos 12 meses)
-        monthly_sales = sales_df.groupby(sales_df['date'].dt.to_period('M'))['sales_amount'].sum()
-        monthly_profit = sales_df.groupby(sales_df['date'].dt.to_period('M'))['profit'].sum()
-        
-        # Productos más vendidos
-        product_sales = sales_df.groupby('product').agg({
-            'sales_amount': 'sum',
-            'quantity': 'sum'
-        }).sort_values('sales_amount', ascending=False)
-        
-        # Ventas por región
-        region_sales = sales_df.groupby('region').agg({
-            'sales_amount': 'sum',
-            'quantity': 'sum'
-        }).sort_values('sales_amount', ascending=False)
-        
-        conn.close()
-        
-        # Asegurar que todos los valores son finitos
-        def safe_round(value, decimals=2):
-            """Redondear valor, convirtiendo inf/nan a 0"""
-            if not np.isfinite(value):
-                return 0.0
-            return round(float(value), decimals)
+        
+        months, monthly_sales, monthly_profit = columns_of(aggregates['monthly'], 3)
+        products, product_sales, product_quantity = columns_of(aggregates['products'], 3)
+        regions, region_sales, region_quantity = columns_of(aggregates['regions'], 3)
+        total_sales, total_profit, avg_order_value = finite_round(
+            [aggregates['total_sales'], aggregates['total_profit'], aggregates['avg_order_value']], 2)
         
         return {
             'metrics': {
-                'total_sales': safe_round(total_sales, 2),
-                'total_profit': safe_round(total_profit, 2),
-                'total_customers': int(total_customers) if np.isfinite(total_customers) else 0,
-                'avg_order_value': safe_round(avg_order_value, 2),
-                'growth_rate': safe_round(growth_rate, 1)
+                'total_sales': total_sales,
+                'total_profit': total_profit,
+                'total_customers': finite_int([aggregates['total_quantity']])[0],
+                'avg_order_value': avg_order_value,
+                'growth_rate': finite_round([growth_rate], 1)[0]
             },
             'monthly_data': {
-                'months': [str(period) for period in monthly_sales.index],
-                'sales': [safe_round(x, 2) for x in monthly_sales.values],
-                'profit': [safe_round(x, 2) for x in monthly_profit.values]
+                'months': list(months),
+                'sales': finite_round(monthly_sales, 2),
+                'profit': finite_round(monthly_profit, 2)
             },
             'product_data': {
-                'products': product_sales.index.tolist(),
-                'sales': [safe_round(x, 2) for x in product_sales['sales_amount'].values],
-                'quantity': [int(x) if np.isfinite(x) else 0 for x in product_sales['quantity'].values]
+                'products': list(products),
+                'sales': finite_round(product_sales, 2),
+                'quantity': finite_int(product_quantity)
             },
             'region_data': {
-                'regions': region_sales.index.tolist(),
-                'sales': [safe_round(x, 2) for x in region_sales['sales_amount'].values],
-                'customers': [int(x) if np.isfinite(x) else 0 for x in region_sales['quantity'].values]
+                'regions': list(regions),
+                'sales': finite_round(region_sales, 2),
+                'customers': finite_int(region_quantity)
+            }
+        }
+    
+    def get_filter_options(self, include_dates: bool = False) -> Dict:
+        """Índice de opciones de filtro leído de sales_daily
+
+        Devuelve productos y regiones con su número de ventas y los límites
+        de fechas. sales_daily se mantiene al día en cada escritura, así que
+        no se recorre sales. La lista completa de fechas solo se incluye con
+        include_dates=True porque crece con el histórico.
+        """
+        self.refresh_rollup()
+        with self.pool.reader() as conn:
+            product_counts = conn.execute(
+                "SELECT product, SUM(orders) FROM sales_daily GROUP BY product ORDER BY product"
+            ).fetchall()
+            region_counts = conn.execute(
+                "SELECT region, SUM(orders) FROM sales_daily GROUP BY region ORDER BY region"
+            ).fetchall()
+            min_date, max_date, days = conn.execute(
+                "SELECT MIN(date), MAX(date), COUNT(DISTINCT date) FROM sales_daily"
+            ).fetchone()
+            dates = {"min": min_date, "max": max_date, "days": days}
+            if include_dates:
+                dates["available"] = [row[0] for row in conn.execute(
+                    "SELECT DISTINCT date FROM sales_daily ORDER BY date")]
+        return {
+            "dates": dates,
+            "products": [name for name, _ in product_counts],
+            "regions": [name for name, _ in region_counts],
+            "counts": {
+                "products": dict(product_counts),
+                "regions": dict(region_counts)
             }
         }
     
-    def export_to_csv(self, table_name: str, filename: str = None):
-        """Exportar datos a CSV"""
+    def get_trends(self, by: str = 'product', engine: Optional[str] = None) -> Dict:
+        """Tendencia mensual de ventas (pendiente de regresión lineal) por grupo
+
+        SQLite agrega sales_daily por producto, región y mes; el resultado se pivota una
+        sola vez a una matriz (producto, región) x mes con los meses sin
+        ventas a cero, y las agrupaciones por producto o región suman filas
+        de esa misma matriz. Todas las pendientes se calculan a la vez con
+        ols_slopes. Con by='product_region' el resultado se anida por
+        producto y región. Con el backend duckdb o snapshot (o el engine
+        correspondiente) la agregación mensual se hace en DuckDB o NumPy.
+        """
+        if by not in TREND_GROUPINGS:
+            raise ValueError(f"Agrupación no válida: {by}")
+        
+        if engine is None:
+            engine = BACKEND_ENGINES[self.backend]
+        if engine not in ("sql", "duckdb", "snapshot"):
+            raise ValueError(f"Motor de agregación no soportado: {engine}")
+        monthly = None
+        if engine == "duckdb":
+            monthly = self._duckdb_backend().monthly_sales()
+        elif engine == "snapshot":
+            try:
+                monthly = self.sales_snapshot().monthly_sales()
+            except WorkingSetExceededError:
+                # Sin memoria para el snapshot se degrada al rollup de SQLite
+                pass
+        if monthly is None:
+            self.refresh_rollup()
+            with self.pool.reader() as conn:
+                monthly = pd.read_sql_query('''
+                    SELECT product, region, strftime('%Y-%m', date) AS month,
+                           SUM(sales_amount) AS sales_amount
+                    FROM sales_daily
+                    GROUP BY product, region, month
+                ''', conn)
+        if monthly.empty:
+            return {}
+        
+        months = pd.period_range(monthly['month'].min(), monthly['month'].max(), freq='M')
+        if len(months) < 2:
+            return {}
+        matrix = (monthly.set_index(['product', 'region', 'month'])['sales_amount']
+                  .unstack('month', fill_value=0.0)
+                  .reindex(columns=months.strftime('%Y-%m'), fill_value=0.0))
+        if by != 'product_region':
+            matrix = matrix.groupby(level=TREND_GROUPINGS[by]).sum()
+        
+        slopes = self.ols_slopes(matrix.to_numpy())
+        trends = {}
+        for key, slope in zip(matrix.index, slopes):
+            trend = {
+                'trend': round(float(slope), 2),
+                'direction': 'up' if slope > 0 else 'down',
+                'strength': 'strong' if abs(slope) > TREND_STRONG_SLOPE else 'weak'
+            }
+            if by == 'product_region':
+                product, region = key
+                trends.setdefault(product, {})[region] = trend
+            else:
+                trends[key] = trend
+        return trends
+    
+    @staticmethod
+    def ols_slopes(series: np.ndarray) -> np.ndarray:
+        """Pendiente de mínimos cuadrados de cada fila frente a x = 0..n-1
+
+        Forma cerrada sum((x - x̄) * y) / sum((x - x̄)²), equivalente a
+        np.polyfit(x, y, 1)[0] fila a fila pero en una sola operación.
+        """
+        x = np.arange(series.shape[1], dtype=float)
+        x -= x.mean()
+        return series @ x / (x @ x)
+    
+    def get_cube(self, grouping, start_date: Optional[str] = None, end_date: Optional[str] = None,
+                 product: Optional[str] = None, region: Optional[str] = None,
+                 category: Optional[str] = None) -> pd.DataFrame:
+        """Cuboide de sales_daily agrupado por las dimensiones de grouping
+
+        Una sola consulta GROUP BY calcula todas las medidas base a la vez;
+        la categoría se obtiene de products. Sin dimensiones devuelve una
+        fila con los totales.
+        """
+        invalid = [dim for dim in grouping if dim not in CUBE_SQL_DIMENSIONS]
+        if invalid:
+            raise ValueError(f"Dimensiones no válidas: {', '.join(invalid)}")
+        parse_day(start_date, "start_date")
+        parse_day(end_date, "end_date")
+        where, params = summary_where(start_date, end_date, product, region)
+        if category:
+            where = f"{where} AND p.category = ?" if where else "WHERE p.category = ?"
+            params.append(category)
+        
+        dims = [dim for dim in CUBE_DIMENSIONS if dim in grouping]
+        select = [f"{CUBE_SQL_DIMENSIONS[dim]} AS {dim}" for dim in dims]
+        select += [f"COALESCE(SUM(d.{measure}), 0) AS {measure}" for measure in BASE_MEASURES]
+        query = f"SELECT {', '.join(select)} FROM sales_daily d LEFT JOIN products p ON p.name = d.product {where}"
+        if dims:
+            query += f" GROUP BY {', '.join(dims)} ORDER BY {', '.join(dims)}"
+        
+        self.refresh_rollup()
+        with self.pool.reader() as conn:
+            return pd.read_sql_query(query, conn, params=params)
+    
+    def prefix_index(self) -> PrefixSumIndex:
+        """Índice de sumas prefijas por día (se crea bajo demanda)"""
+        if self._prefix_index is None:
+            self._prefix_index = PrefixSumIndex(self)
+        return self._prefix_index
+    
+    def range_totals(self, start_date: Optional[str] = None, end_date: Optional[str] = None,
+                     product: Optional[str] = None, region: Optional[str] = None) -> Dict:
+        """Totales de ventas, beneficio, cantidad y pedidos de un rango de fechas inclusivo"""
+        parse_day(start_date, "start_date")
+        parse_day(end_date, "end_date")
+        return self._window_totals(start_date, end_date, product, region)
+    
+    def _window_totals(self, start_date: Optional[str], end_date: Optional[str],
+                       product: Optional[str], region: Optional[str]) -> Dict:
+        """Totales con el índice de sumas prefijas, o con SQL si no cabe en max_working_set"""
+        try:
+            return self.prefix_index().totals(start_date, end_date, product, region)
+        except WorkingSetExceededError:
+            totals = self.get_cube(frozenset(), start_date, end_date, product, region).iloc[0]
+            return {'sales_amount': float(totals['sales_amount']),
+                    'profit': float(totals['profit']),
+                    'quantity': int(totals['quantity']),
+                    'orders': int(totals['orders'])}
+    
+    def _date_bounds(self):
+        """Primer y último día con ventas (del índice o, si no cabe, de sales_daily)"""
+        try:
+            return self.prefix_index().bounds()
+        except WorkingSetExceededError:
+            self.refresh_rollup()
+            with self.pool.reader() as conn:
+                return conn.execute("SELECT MIN(date), MAX(date) FROM sales_daily").fetchone()
+    
+    def compare_periods(self, start_date: Optional[str] = None, end_date: Optional[str] = None,
+                        compare: Optional[str] = None, product: Optional[str] = None,
+                        region: Optional[str] = None, compare_start: Optional[str] = None,
+                        compare_end: Optional[str] = None) -> Dict:
+        """Totales de un rango y, con compare, del periodo con el que se compara
+
+        compare es 'previous' (ventana anterior de igual longitud), 'mom',
+        'qoq', 'yoy' (mismo rango 1, 3 o 12 meses antes) o 'custom'
+        (compare_start/compare_end). Sin fechas se usa el rango con datos.
+        Cada ventana son dos filas del índice de sumas prefijas (o una consulta a
+        sales_daily si el índice no cabe en max_working_set).
+        """
+        if compare is not None and compare not in PERIOD_COMPARISONS:
+            raise ValueError(f"Comparación no soportada: {compare}")
+        start = parse_day(start_date, "start_date")
+        end = parse_day(end_date, "end_date")
+        if start is None or end is None:
+            first, last = self._date_bounds()
+            today = datetime.now().strftime('%Y-%m-%d')
+            start = start or datetime.strptime(first or today, '%Y-%m-%d')
+            end = end or datetime.strptime(last or today, '%Y-%m-%d')
+        if start > end:
+            raise ValueError("start_date posterior a end_date")
+        
+        def window(window_start: datetime, window_end: datetime) -> Dict:
+            totals = self._window_totals(window_start.strftime('%Y-%m-%d'),
+                                         window_end.strftime('%Y-%m-%d'), product, region)
+            return {'start_date': window_start.strftime('%Y-%m-%d'),
+                    'end_date': window_end.strftime('%Y-%m-%d'),
+                    **totals,
+                    'sales_amount': round(totals['sales_amount'], 2),
+                    'profit': round(totals['profit'], 2)}
+        
+        result = {'current': window(start, end)}
+        if compare is None:
+            return result
+        if compare == 'custom':
+            previous_start = parse_day(compare_start, "compare_start")
+            previous_end = parse_day(compare_end, "compare_end")
+            if previous_start is None or previous_end is None:
+                raise ValueError("compare=custom requiere compare_start y compare_end")
+            if previous_start > previous_end:
+                raise ValueError("compare_start posterior a compare_end")
+        elif compare == 'previous':
+            previous_end = start - timedelta(days=1)
+            previous_start = previous_end - (end - start)
+        else:
+            offset = pd.DateOffset(months=PERIOD_COMPARISONS[compare])
+            previous_start = (pd.Timestamp(start) - offset).to_pydatetime()
+            previous_end = pd.Timestamp(end) - offset
+            if pd.Timestamp(end).is_month_end:
+                # Un rango que acaba a fin de mes se compara hasta fin de mes (30 sep -> 31 ago)
+                previous_end += pd.offsets.MonthEnd(0)
+            previous_end = previous_end.to_pydatetime()
+        
+        current = result['current']
+        previous = window(previous_start, previous_end)
+        result.update(compare=compare, previous=previous, change={
+            measure: (round((current[measure] - previous[measure]) / previous[measure] * 100, 2)
+                      if previous[measure] else None)
+            for measure in PREFIX_MEASURES
+        })
+        return result
+    
+    def iter_table(self, table_name: str, fmt: str = 'csv', gzip: bool = False,
+                   chunk_size: int = 5000, progress: Optional[Callable[[int], None]] = None):
+        """Generar una tabla en CSV, Arrow IPC o Parquet por bloques leídos desde un cursor
+
+        La memoria usada depende de chunk_size y no del tamaño de la tabla.
+        En Arrow/Parquet cada bloque del cursor pasa a un RecordBatch tipado
+        sin crear dicts por fila. progress(n) recibe el número de filas de
+        cada bloque ya escrito. Sin pyarrow, arrow y parquet lanzan
+        ArrowUnavailableError.
+        """
+        if table_name not in TABLE_COLUMNS:
+            raise ValueError(f"Tabla no válida: {table_name}")
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"Formato no soportado: {fmt}")
+        columns = TABLE_COLUMNS[table_name]
+        rows = with_progress(self._iter_query(select_all_sql(table_name), [], chunk_size),
+                             progress)
+        if fmt == 'arrow':
+            return arrow_chunks(columns, column_types(columns), rows)
+        if fmt == 'parquet':
+            return parquet_chunks(columns, column_types(columns), rows)
+        chunks = csv_chunks(columns, rows)
+        return gzip_chunks(chunks) if gzip else chunks
+    
+    def iter_table_csv(self, table_name: str, gzip: bool = False, chunk_size: int = 5000,
+                       progress: Optional[Callable[[int], None]] = None):
+        """Generar el CSV de una tabla por bloques leídos desde un cursor"""
+        return self.iter_table(table_name, 'csv', gzip, chunk_size, progress)
+    
+    def export_to_csv(self, table_name: str, filename: str = None, gzip: bool = False,
+                      progress: Optional[Callable[[int], None]] = None):
+        """Exportar datos a CSV (opcionalmente comprimido con gzip)"""
+        return self.export_table(table_name, 'csv', filename, gzip, progress)
+    
+    def export_table(self, table_name: str, fmt: str = 'csv', filename: str = None,
+                     gzip: bool = False, progress: Optional[Callable[[int], None]] = None,
+                     chunk_size: int = 5000):
+        """Exportar una tabla a CSV (opcionalmente gzip), Arrow IPC o Parquet"""
         import os
-        conn = sqlite3.connect(self.db_path)
-        df = pd.read_sql_query(f"SELECT * FROM {table_name}", conn)
-        conn.close()
+        chunks = self.iter_table(table_name, fmt, gzip=gzip, chunk_size=chunk_size,
+                                 progress=progress)
         
         if filename is None:
-            filename = f"exports/{table_name}_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+            extension = EXPORT_FORMATS[fmt] + (".gz" if gzip and fmt == 'csv' else "")
+            filename = f"exports/{table_name}_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}"
             # Crear directorio si no existe
             os.makedirs(os.path.dirname(filename), exist_ok=True)
         
-        df.to_csv(filename, index=False)
+        with open(filename, 'wb') as f:
+            for chunk in chunks:
+                f.write(chunk)
         return filename
     
-    def export_to_excel(self, filename: str = None):
-        """Exportar todos los datos a Excel"""
+    def export_to_excel(self, filename: str = None, summary: Optional[Dict] = None,
+                        max_rows_per_sheet: int = EXCEL_MAX_DATA_ROWS,
+                        progress: Optional[Callable[[int], None]] = None):
+        """Exportar todos los datos a Excel con memoria constante
+
+        Usa el modo write-only de openpyxl alimentado por bloques de un
+        cursor, así que las filas nunca se cargan todas en memoria. Las
+        tablas que superan el límite de filas de Excel se reparten en
+        varias hojas ('Ventas', 'Ventas (2)', ...). Si se pasa summary (por
+        ejemplo el de la caché) no se vuelve a agregar la tabla sales.
+        progress(n) recibe el número de filas de cada bloque ya escrito.
+        """
         import os
+        from openpyxl import Workbook
+        
         if filename is None:
             filename = f"exports/analytics_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
             # Crear directorio si no existe
             os.makedirs(os.path.dirname(filename), exist_ok=True)
         
-        conn = sqlite3.connect(self.db_path)
-        
-        with pd.ExcelWriter(filename, engine='openpyxl') as writer:
-            # Hoja de ventas
-            sales_df = pd.read_sql_query("SELECT * FROM sales", conn)
-            sales_df.to_excel(writer, sheet_name='Ventas', index=False)
-            
-            # Hoja de productos
-            products_df = pd.read_sql_query("SELECT * FROM products", conn)
-            products_df.to_excel(writer, sheet_name='Productos', index=False)
-            
-            # Hoja de regiones
-            regions_df = pd.read_sql_query("SELECT * FROM regions", conn)
-            regions_df.to_excel(writer, sheet_name='Regiones', index=False)
-            
-            # Hoja de resumen
+        if summary is None:
             summary = self.get_analytics_summary()
-            summary_df = pd.DataFrame([summary['metrics']])
-            summary_df.to_excel(writer, sheet_name='Resumen', index=False)
         
-        conn.close()
+        workbook = Workbook(write_only=True)
+        for table, sheet_name in EXCEL_SHEETS.items():
+            rows = with_progress(self._iter_query(select_all_sql(table), [], 5000), progress)
+            self._write_sheets(workbook, sheet_name, TABLE_COLUMNS[table], rows,
+                               max_rows_per_sheet)
+        
+        # Hoja de resumen
+        metrics = summary['metrics']
+        summary_sheet = workbook.create_sheet('Resumen')
+        summary_sheet.append(list(metrics.keys()))
+        summary_sheet.append(list(metrics.values()))
+        
+        workbook.save(filename)
         return filename
+    
+    @staticmethod
+    def _write_sheets(workbook, sheet_name: str, columns: List[str], row_chunks,
+                      max_rows_per_sheet: int):
+        """Escribir bloques de filas en una o varias hojas con cabecera"""
+        sheet = workbook.create_sheet(sheet_name)
+        sheet.append(columns)
+        sheet_number, rows_in_sheet = 1, 0
+        for rows in row_chunks:
+            for row in rows:
+                if rows_in_sheet == max_rows_per_sheet:
+                    sheet_number += 1
+                    sheet = workbook.create_sheet(f"{sheet_name} ({sheet_number})")
+                    sheet.append(columns)
+                    rows_in_sheet = 0
+                sheet.append(row)
+                rows_in_sheet += 1
+
+def main():
+    """Generar una base de datos de muestra o comprobar su rollup sin arrancar el servidor"""
+    import argparse
+    import time
+    
+    parser = argparse.ArgumentParser(description='Generar datos de muestra - Data Analytics Dashboard')
+    parser.add_argument('--rows', type=int, default=1000, help='Registros de ventas a generar')
+    parser.add_argument('--db', default='analytics.db', help='Ruta de la base de datos SQLite')
+    parser.add_argument('--seed', type=int, default=42, help='Semilla del generador aleatorio')
+    parser.add_argument('--chunk-size', type=int, default=100000,
+                        help='Filas generadas e insertadas por bloque')
+    parser.add_argument('--check-rollup', action='store_true',
+                        help='Comparar sales_daily con un rollup reconstruido (no genera datos)')
+    parser.add_argument('--repair', action='store_true',
+                        help='Con --check-rollup, sustituir sales_daily si hay diferencias')
+    args = parser.parse_args()
+    
+    db = DatabaseManager(args.db)
+    if args.check_rollup:
+        report = db.check_rollup(repair=args.repair)
+        db.close()
+        for key, value in report.items():
+            print(f"{key}: {value}")
+        return 0 if report['consistent'] or report['repaired'] else 1
+    
+    start = time.perf_counter()
+    db.generate_sample_data(args.rows, seed=args.seed, chunk_size=args.chunk_size,
+                            return_df=False)
+    elapsed = time.perf_counter() - start
+    db.close()
+    print(f"{args.rows} registros generados en {args.db} en {elapsed:.1f}s "
+          f"({args.rows / max(elapsed, 1e-9):,.0f} filas/s)")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+DuckDB backend module for Data Analytics Dashboard
+Agregaciones analíticas con DuckDB sobre un espejo Parquet de la tabla sales
+"""
+
+import glob
+import os
+import threading
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+try:
+    import duckdb
+except ImportError:  # duckdb es opcional; sin él solo existe el backend SQLite
+    duckdb = None
+
+# Columnas del espejo (created_at no interviene en las agregaciones)
+MIRROR_COLUMNS = ['id', 'date', 'product', 'region', 'sales_amount', 'profit', 'quantity']
+
+# Partes pequeñas (menos filas que un bloque) que se acumulan al final del
+# espejo antes de unirlas en una sola
+MIRROR_MAX_TAIL_PARTS = 8
+
+
+class DuckDBUnavailableError(RuntimeError):
+    """Se pidió el backend duckdb sin tener el paquete instalado"""
+
+
+class DuckDBBackend:
+    """Espejo Parquet de sales consultado con DuckDB
+
+    El espejo es un directorio de ficheros
+    part-<generación>-<primer id>-<último id>.parquet. Antes de cada consulta
+    se añaden las filas con id posterior al último volcado (la tabla solo
+    crece por inserción); si cambia la generación de sales (metadata
+    sales_generation, que aumenta al regenerar la tabla) o el último id
+    retrocede, el espejo se reconstruye entero. Cada ingesta deja una parte
+    pequeña; cuando hay más de MIRROR_MAX_TAIL_PARTS seguidas al final se
+    unen en una, así que el número de ficheros depende del tamaño de la
+    tabla y no del número de ingestas. Las consultas reproducen las
+    de sales_daily en SQLite, así que ambos backends devuelven los mismos
+    agregados.
+    """
+
+    def __init__(self, db, mirror_dir: str = None, chunk_size: int = 1000000):
+        if duckdb is None:
+            raise DuckDBUnavailableError("El backend duckdb requiere el paquete duckdb")
+        self.db = db
+        self.mirror_dir = mirror_dir or f"{db.db_path}.mirror"
+        self.chunk_size = chunk_size
+        self._lock = threading.Lock()
+        self._conn = duckdb.connect()
+        self._checked_version = None
+
+    def close(self):
+        self._conn.close()
+
+    def _parts(self) -> List[Tuple[int, int, int, str]]:
+        """(generación, primer id, último id, ruta) de cada fichero del espejo, en orden"""
+        parts = []
+        for path in glob.glob(os.path.join(self.mirror_dir, "part-*.parquet")):
+            _, generation, first, last = os.path.basename(path)[:-len(".parquet")].split("-")
+            parts.append((int(generation), int(first), int(last), path))
+        return sorted(parts)
+
+    def refresh(self):
+        """Poner el espejo al día con sales (no hace nada si la versión no cambió)"""
+        from database import file_lock
+
+        version = self.db.get_data_version()
+        if version == self._checked_version:
+            return
+        with self._lock:
+            os.makedirs(self.mirror_dir, exist_ok=True)
+            with file_lock(os.path.join(self.mirror_dir, ".lock")):
+                self._refresh()
+            self._checked_version = version
+
+    def _refresh(self):
+        with self.db.pool.reader() as conn:
+            max_id = conn.execute("SELECT MAX(id) FROM sales").fetchone()[0]
+            generation = conn.execute(
+                "SELECT value FROM metadata WHERE key = 'sales_generation'").fetchone()[0]
+        parts = self._parts()
+        stale = any(part[0] != generation for part in parts)
+        if parts and (stale or max_id is None or max_id < parts[-1][2]):
+            for *_, path in parts:
+                os.remove(path)
+            parts = []
+        if max_id is None:
+            return
+
+        last_id = parts[-1][2] if parts else 0
+        query = (f"SELECT {', '.join(MIRROR_COLUMNS)} FROM sales "
+                 f"WHERE id > ? AND id <= ? ORDER BY id")
+        cursor = self._conn.cursor()
+        for rows in self.db._iter_query(query, [last_id, max_id], self.chunk_size):
+            chunk = pd.DataFrame.from_records(rows, columns=MIRROR_COLUMNS)
+            path = os.path.join(self.mirror_dir,
+                                f"part-{generation}-{rows[0][0]:012d}-{rows[-1][0]:012d}.parquet")
+            cursor.register("chunk", chunk)
+            # Se escribe con otro nombre y se renombra para no exponer ficheros a medias
+            cursor.execute(f'''
+                COPY (
+                    SELECT id, CAST(date AS DATE) AS date, product, region,
+                           sales_amount, profit, quantity
+                    FROM chunk
+                ) TO '{path}.tmp' (FORMAT parquet)
+            ''')
+            cursor.unregister("chunk")
+            os.replace(f"{path}.tmp", path)
+        self._compact(generation)
+
+    def _compact(self, generation: int):
+        """Unir las partes pequeñas del final si hay más de MIRROR_MAX_TAIL_PARTS"""
+        tail = []
+        for part in reversed(self._parts()):
+            if part[2] - part[1] + 1 >= self.chunk_size:
+                break
+            tail.insert(0, part)
+        if len(tail) <= MIRROR_MAX_TAIL_PARTS:
+            return
+        paths = [path for *_, path in tail]
+        path = os.path.join(self.mirror_dir,
+                            f"part-{generation}-{tail[0][1]:012d}-{tail[-1][2]:012d}.parquet")
+        sources = ", ".join(f"'{old}'" for old in paths)
+        self._conn.cursor().execute(f'''
+            COPY (
+                SELECT * FROM read_parquet([{sources}]) ORDER BY id
+            ) TO '{path}.tmp' (FORMAT parquet)
+        ''')
+        os.replace(f"{path}.tmp", path)
+        for old in paths:
+            if old != path:
+                os.remove(old)
+
+    def _source(self):
+        """Expresión FROM del espejo, o None si está vacío"""
+        parts = self._parts()
+        if not parts:
+            return None
+        return "read_parquet([" + ", ".join(f"'{path}'" for *_, path in parts) + "])"
+
+    def summary_aggregates(self, filters: Tuple[str, List], recent_start: str,
+                           growth_filters: Tuple[str, List]) -> Dict:
+        """Mismos agregados que DatabaseManager._summary_aggregates_sql
+
+        filters y growth_filters son pares (WHERE, parámetros) de summary_where.
+        """
+        self.refresh()
+        source = self._source()
+        if source is None:
+            return {
+                'total_sales': 0, 'total_profit': 0, 'total_quantity': 0,
+                'avg_order_value': np.nan, 'recent_sales': 0, 'previous_sales': 0,
+                'monthly': [], 'products': [], 'regions': [],
+            }
+
+        where, params = filters
+        growth_where, growth_params = growth_filters
+        cursor = self._conn.cursor()
+        total_sales, total_profit, total_quantity, avg_order_value = cursor.execute(f'''
+            SELECT
+                COALESCE(SUM(sales_amount), 0),
+                COALESCE(SUM(profit), 0),
+                COALESCE(SUM(quantity), 0),
+                SUM(sales_amount) / COUNT(*)
+            FROM {source} {where}
+        ''', params).fetchone()
+
+        recent_sales, previous_sales = cursor.execute(f'''
+            SELECT
+                COALESCE(SUM(sales_amount) FILTER (WHERE date >= CAST(? AS DATE)), 0),
+                COALESCE(SUM(sales_amount) FILTER (WHERE date < CAST(? AS DATE)), 0)
+            FROM {source} {growth_where}
+        ''', [recent_start, recent_start] + growth_params).fetchone()
+
+        monthly = cursor.execute(f'''
+            SELECT strftime(date, '%Y-%m') AS month, SUM(sales_amount), SUM(profit)
+            FROM {source} {where}
+            GROUP BY month
+            ORDER BY month
+        ''', params).fetchall()
+
+        products = cursor.execute(f'''
+            SELECT product, SUM(sales_amount) AS total, SUM(quantity)
+            FROM {source} {where}
+            GROUP BY product
+            ORDER BY total DESC, product
+        ''', params).fetchall()
+
+        regions = cursor.execute(f'''
+            SELECT region, SUM(sales_amount) AS total, SUM(quantity)
+            FROM {source} {where}
+            GROUP BY region
+            ORDER BY total DESC, region
+        ''', params).fetchall()
+
+        return {
+            'total_sales': total_sales,
+            'total_profit': total_profit,
+            'total_quantity': int(total_quantity),
+            'avg_order_value': avg_order_value if avg_order_value is not None else np.nan,
+            'recent_sales': recent_sales,
+            'previous_sales': previous_sales,
+            'monthly': monthly,
+            'products': [(name, total, int(quantity)) for name, total, quantity in products],
+            'regions': [(name, total, int(quantity)) for name, total, quantity in regions],
+        }
+
+    def monthly_sales(self) -> pd.DataFrame:
+        """Ventas por producto, región y mes (entrada de get_trends)"""
+        self.refresh()
+        source = self._source()
+        if source is None:
+            return pd.DataFrame(columns=['product', 'region', 'month', 'sales_amount'])
+        return self._conn.cursor().execute(f'''
+            SELECT product, region, strftime(date, '%Y-%m') AS month,
+                   SUM(sales_amount) AS sales_amount
+            FROM {source}
+            GROUP BY product, region, month
+        ''').df()
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Executor module for Data Analytics Dashboard
+Ejecución acotada de trabajo síncrono (sqlite3/pandas) fuera del event loop
+"""
+
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Optional
+
+# Segundos entre lecturas del contador de progreso de una tarea en otro proceso
+PROGRESS_POLL_INTERVAL = 0.2
+
+
+class QueueFullError(Exception):
+    """La cola del executor está llena y la petición se rechaza"""
+
+
+class SharedProgress:
+    """Callback de progreso que se puede enviar a un proceso del pool
+
+    Suma las filas en un contador de multiprocessing.Manager que el proceso
+    principal lee mientras espera.
+    """
+
+    def __init__(self, counter):
+        self.counter = counter
+
+    def __call__(self, count: int):
+        self.counter.value += count
+
+
+class DatabaseExecutor:
+    """Pool acotado con límite de cola y timeout por petición
+
+    Como máximo max_workers tareas se ejecutan a la vez y max_queue esperan
+    turno; el resto se rechaza con QueueFullError en lugar de acumularse.
+    Si una tarea supera el timeout se devuelve asyncio.TimeoutError al
+    cliente; el worker termina su trabajo y libera el hueco al acabar.
+
+    Con processes=True se usa un pool de procesos para trabajo intensivo en
+    CPU (openpyxl, pandas) que de otro modo competiría por el GIL con el
+    event loop; las funciones y argumentos deben poder serializarse.
+    """
+
+    def __init__(self, max_workers: int = 4, max_queue: int = 32,
+                 timeout: Optional[float] = 30.0, name: str = "db",
+                 processes: bool = False):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.processes = processes
+        self.name = name
+        self._pool = None
+        self._slots = threading.BoundedSemaphore(max_workers + max_queue)
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._manager = None
+
+    @property
+    def pending(self) -> int:
+        """Tareas en ejecución o esperando turno"""
+        return self._pending
+
+    def _get_pool(self):
+        """Crear el pool bajo demanda (también tras un shutdown)"""
+        with self._lock:
+            if self._pool is None:
+                if self.processes:
+                    self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+                else:
+                    self._pool = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix=self.name)
+            return self._pool
+
+    def _release(self, _future):
+        with self._lock:
+            self._pending -= 1
+        self._slots.release()
+
+    def submit(self, fn: Callable[..., Any], *args, blocking: bool = False, **kwargs) -> Future:
+        """Enviar fn(*args, **kwargs) al pool respetando el límite de cola
+
+        Sin blocking una cola llena lanza QueueFullError; con blocking (desde
+        hilos de fondo) se espera a que quede un hueco.
+        """
+        if not self._slots.acquire(blocking=blocking):
+            raise QueueFullError(
+                f"Cola llena ({self.max_workers} en ejecución, {self.max_queue} en espera)"
+            )
+        with self._lock:
+            self._pending += 1
+        try:
+            future = self._get_pool().submit(fn, *args, **kwargs)
+        except BaseException:
+            self._release(None)
+            raise
+        future.add_done_callback(self._release)
+        return future
+
+    def call_with_progress(self, fn: Callable[..., Any], *args,
+                           progress: Optional[Callable[[int], None]] = None, **kwargs):
+        """Ejecutar fn(*args, progress=..., **kwargs) en el pool y esperar (desde un hilo de fondo)
+
+        Con procesos el callback no puede cruzar al worker: este recibe un
+        SharedProgress y las filas acumuladas se reenvían a progress cada
+        PROGRESS_POLL_INTERVAL segundos.
+        """
+        if not self.processes:
+            return self.submit(fn, *args, blocking=True, progress=progress, **kwargs).result()
+        counter = self._shared_manager().Value('q', 0)
+        future = self.submit(fn, *args, blocking=True, progress=SharedProgress(counter), **kwargs)
+        reported = 0
+        while True:
+            try:
+                result = future.result(timeout=PROGRESS_POLL_INTERVAL)
+                done = True
+            except FutureTimeoutError:
+                done = False
+            rows = counter.value
+            if progress is not None and rows > reported:
+                progress(rows - reported)
+                reported = rows
+            if done:
+                return result
+
+    def _shared_manager(self):
+        """Proceso de multiprocessing.Manager para los contadores (bajo demanda)"""
+        with self._lock:
+            if self._manager is None:
+                self._manager = multiprocessing.Manager()
+            return self._manager
+
+    async def run(self, fn: Callable[..., Any], *args, timeout: Optional[float] = None, **kwargs):
+        """Ejecutar fn(*args, **kwargs) en el pool y esperar su resultado"""
+        future = self.submit(fn, *args, **kwargs)
+
+        wait_timeout = self.timeout if timeout is None else timeout
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), wait_timeout)
+        except asyncio.TimeoutError:
+            # Si aún no empezó, no llega a ejecutarse
+            future.cancel()
+            raise
+
+    def shutdown(self, wait: bool = True):
+        """Cerrar el pool (llamado al apagar la aplicación)"""
+        with self._lock:
+            pool, self._pool = self._pool, None
+            manager, self._manager = self._manager, None
+        if pool is not None:
+            pool.shutdown(wait=wait, cancel_futures=True)
+        if manager is not None:
+            manager.shutdown()
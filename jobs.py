@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Jobs module for Data Analytics Dashboard
+Cola de exportaciones en segundo plano con progreso, deduplicación y retención
+"""
+
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from executor import QueueFullError
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class ExportJob:
+    """Estado de una exportación encolada"""
+
+    def __init__(self, job_id: str, kind: str, params: Dict[str, Any], path: str,
+                 filename: str, key: Hashable, created_at: float):
+        self.id = job_id
+        self.kind = kind
+        self.params = params
+        self.path = path
+        self.filename = filename
+        self.key = key
+        self.status = QUEUED
+        self.rows_written = 0
+        self.error: Optional[str] = None
+        self.created_at = created_at
+        self.finished_at: Optional[float] = None
+
+    def add_rows(self, count: int):
+        """Callback de progreso para los métodos export_* de DatabaseManager"""
+        self.rows_written += count
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "params": self.params,
+            "status": self.status,
+            "rows_written": self.rows_written,
+            "filename": self.filename,
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class ExportJobManager:
+    """Ejecuta exportaciones en un pool acotado y conserva el resultado un tiempo
+
+    runners asocia cada tipo de exportación con una función
+    runner(path, progress, **params) que escribe el fichero en path. Las
+    peticiones idénticas (mismo tipo, parámetros y versión de datos) que
+    llegan mientras un trabajo está en cola, en curso o terminado reutilizan
+    ese trabajo. Los ficheros terminados se borran pasados retention segundos;
+    sweep() también borra los del directorio que no están en la tabla de
+    trabajos (por ejemplo, de un proceso anterior).
+
+    Los hilos del pool solo orquestan: un runner con trabajo intensivo en CPU
+    debe delegarlo en un pool de procesos (en la aplicación,
+    export_executor.call_with_progress) para no competir por el GIL con las
+    peticiones.
+    """
+
+    def __init__(self, runners: Dict[str, Callable[..., Any]], directory: str,
+                 max_workers: int = 2, max_queue: int = 8, retention: float = 3600.0,
+                 clock: Callable[[], float] = time.time):
+        self.runners = runners
+        self.directory = directory
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.retention = retention
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, ExportJob] = {}
+        self._by_key: Dict[Hashable, ExportJob] = {}
+        self._pool = None
+
+    def _get_pool(self) -> ThreadPoolExecutor:
+        """Crear el pool bajo demanda (también tras un shutdown)"""
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.max_workers,
+                                            thread_name_prefix="export-job")
+        return self._pool
+
+    def submit(self, kind: str, params: Optional[Dict[str, Any]] = None,
+               filename: str = "export", version: Any = None):
+        """Encolar una exportación; devuelve (trabajo, creado)
+
+        Lanza ValueError si el tipo no existe y QueueFullError si ya hay
+        max_workers + max_queue trabajos pendientes.
+        """
+        if kind not in self.runners:
+            raise ValueError(f"Tipo de exportación no válido: {kind}")
+        params = dict(params or {})
+        key = (kind, tuple(sorted(params.items())), version)
+
+        with self._lock:
+            self._purge_expired()
+            existing = self._by_key.get(key)
+            if existing is not None:
+                return existing, False
+
+            active = sum(1 for job in self._jobs.values() if job.status in (QUEUED, RUNNING))
+            if active >= self.max_workers + self.max_queue:
+                raise QueueFullError(
+                    f"Cola de exportaciones llena ({active} trabajos pendientes)"
+                )
+
+            os.makedirs(self.directory, exist_ok=True)
+            job_id = uuid.uuid4().hex
+            job = ExportJob(job_id, kind, params, os.path.join(self.directory, f"{job_id}_{filename}"),
+                            filename, key, self._clock())
+            self._jobs[job_id] = job
+            self._by_key[key] = job
+            self._get_pool().submit(self._run, job)
+        return job, True
+
+    def _run(self, job: ExportJob):
+        job.status = RUNNING
+        try:
+            self.runners[job.kind](job.path, job.add_rows, **job.params)
+        except Exception as e:
+            with self._lock:
+                job.status = FAILED
+                job.error = str(e)
+                job.finished_at = self._clock()
+                # Un fallo no se deduplica: la siguiente petición lo reintenta
+                if self._by_key.get(job.key) is job:
+                    del self._by_key[job.key]
+            self._remove_file(job)
+            return
+        with self._lock:
+            job.status = DONE
+            job.finished_at = self._clock()
+
+    def get(self, job_id: str) -> Optional[ExportJob]:
+        """Devolver el trabajo o None si no existe o ya caducó"""
+        with self._lock:
+            self._purge_expired()
+            return self._jobs.get(job_id)
+
+    def purge_expired(self) -> int:
+        """Borrar los trabajos terminados cuya retención ha vencido"""
+        with self._lock:
+            return self._purge_expired()
+
+    def _purge_expired(self) -> int:
+        """Llamar con el lock adquirido"""
+        now = self._clock()
+        expired = [job for job in self._jobs.values()
+                   if job.finished_at is not None and job.finished_at + self.retention <= now]
+        for job in expired:
+            del self._jobs[job.id]
+            if self._by_key.get(job.key) is job:
+                del self._by_key[job.key]
+            self._remove_file(job)
+        return len(expired)
+
+    def sweep(self) -> int:
+        """Purgar los trabajos caducados y los ficheros del directorio más antiguos que la retención
+
+        Los ficheros se borran según su fecha de modificación, estén o no en
+        la tabla de trabajos; solo se respetan los de trabajos en curso.
+        Devuelve el número de trabajos y ficheros eliminados.
+        """
+        with self._lock:
+            removed = self._purge_expired()
+            active = {job.path for job in self._jobs.values() if job.status in (QUEUED, RUNNING)}
+        cutoff = self._clock() - self.retention
+        try:
+            entries = list(os.scandir(self.directory))
+        except FileNotFoundError:
+            return removed
+        for entry in entries:
+            if entry.path in active:
+                continue
+            try:
+                if entry.is_file() and entry.stat().st_mtime <= cutoff:
+                    os.remove(entry.path)
+                    removed += 1
+            except FileNotFoundError:
+                pass
+        return removed
+
+    @staticmethod
+    def _remove_file(job: ExportJob):
+        try:
+            os.remove(job.path)
+        except FileNotFoundError:
+            pass
+
+    def shutdown(self, wait: bool = True):
+        """Cerrar el pool; los trabajos aún en cola se cancelan"""
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=wait, cancel_futures=True)
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Prefix index module for Data Analytics Dashboard
+Sumas prefijas por día para totales de cualquier rango de fechas en O(1)
+"""
+
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from snapshot import day_number
+
+# Medidas acumuladas, en el orden del último eje de los arrays
+PREFIX_MEASURES = ('sales_amount', 'profit', 'quantity', 'orders')
+
+# Prefijos guardados: por (producto, región) y sus marginales por producto,
+# por región y total, para que un rango sin filtros o con uno solo sean dos filas
+PREFIX_MARGINALS = ('cells', 'product', 'region', 'total')
+
+ROLLUP_QUERY = ("SELECT date, product, region, sales_amount, profit, quantity, orders "
+                "FROM sales_daily")
+
+
+class PrefixSumIndex:
+    """Sumas prefijas por día, producto y región alimentadas desde sales_daily
+
+    prefix[d, p, r] acumula las medidas del producto p en la región r desde
+    el primer día con ventas hasta el día d - 1, así que el total de
+    [inicio, fin] es prefix[fin + 1] - prefix[inicio]. Junto a ese prefijo se
+    guardan sus marginales por producto, por región y total: cualquier rango
+    se responde restando dos filas del prefijo que corresponde a los filtros,
+    sin sumar sobre productos ni regiones.
+
+    Se actualiza con el agregado diario de las ventas con id posterior al
+    último incorporado y solo se recalcula el prefijo desde el primer día
+    afectado; si únicamente llegan días nuevos basta con escribir filas al
+    final. Un día anterior al primero, una categoría nueva o un cambio de
+    sales_generation obligan a reconstruirlo desde sales_daily. Los arrays
+    son densos (días x productos x regiones), así que antes de reservarlos
+    se comprueba su tamaño con db.check_working_set.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self._lock = threading.Lock()
+        self._checked_version = None
+        self._reset(None, None)
+        self._publish()
+
+    def _reset(self, generation: Optional[int], last_id: Optional[int]):
+        """Vaciar los arrays; la vista publicada no cambia hasta _publish"""
+        self._generation = generation
+        self._last_id = last_id
+        self._first_day = 0
+        self._days = 0
+        self._products: List[str] = []
+        self._regions: List[str] = []
+        self._daily = np.zeros((0, 0, 0, len(PREFIX_MEASURES)))
+        self._prefixes = self._allocate(0)
+
+    def _allocate(self, capacity: int) -> Dict[str, np.ndarray]:
+        """Prefijos a cero con capacity + 1 filas"""
+        products, regions = len(self._products), len(self._regions)
+        shapes = {'cells': (products, regions), 'product': (products,),
+                  'region': (regions,), 'total': ()}
+        return {name: np.zeros((capacity + 1,) + shapes[name] + (len(PREFIX_MEASURES),))
+                for name in PREFIX_MARGINALS}
+
+    def _check_size(self, capacity: int):
+        """Rechazar unos arrays de capacity días que no quepan en max_working_set"""
+        products, regions = len(self._products), len(self._regions)
+        positions = (capacity * products * regions
+                     + (capacity + 1) * (products * regions + products + regions + 1))
+        self.db.check_working_set(positions * len(PREFIX_MEASURES) * 8,
+                                  "El índice de sumas prefijas")
+
+    def _publish(self):
+        """Publicar los prefijos vigentes y las categorías en una sola asignación"""
+        self._view = (self._first_day,
+                      {name: prefix[:self._days + 1] for name, prefix in self._prefixes.items()},
+                      {name: code for code, name in enumerate(self._products)},
+                      {name: code for code, name in enumerate(self._regions)})
+
+    def refresh(self):
+        """Incorporar las ventas nuevas (no hace nada si la versión no cambió)"""
+        version = self.db.get_data_version()
+        if version == self._checked_version:
+            return
+        with self._lock:
+            if version == self._checked_version:
+                return
+            self.db.refresh_rollup()
+            try:
+                self._load()
+            except BaseException:
+                # Arrays a medio actualizar: el siguiente refresco los reconstruye
+                self._last_id = None
+                raise
+            # Las lecturas usan la vista anterior hasta que el prefijo está completo
+            self._publish()
+            self._checked_version = version
+
+    def _load(self):
+        from database import SALES_DAILY_AGGREGATE_SQL
+
+        with self.db.pool.reader() as conn:
+            # Una transacción de lectura: rollup_last_id y sales_daily consistentes
+            conn.execute("BEGIN")
+            last_id = conn.execute(
+                "SELECT value FROM metadata WHERE key = 'rollup_last_id'").fetchone()[0]
+            generation = conn.execute(
+                "SELECT value FROM metadata WHERE key = 'sales_generation'").fetchone()[0]
+            if (self._last_id is None or generation != self._generation
+                    or last_id < self._last_id):
+                self._rebuild(conn.execute(ROLLUP_QUERY).fetchall(), generation, last_id)
+            elif last_id > self._last_id:
+                delta = conn.execute(SALES_DAILY_AGGREGATE_SQL,
+                                     (self._last_id, last_id)).fetchall()
+                if not self._extend(delta):
+                    self._rebuild(conn.execute(ROLLUP_QUERY).fetchall(), generation, last_id)
+                self._last_id = last_id
+
+    def _rebuild(self, rows: List[tuple], generation: int, last_id: int):
+        self._reset(generation, last_id)
+        if not rows:
+            return
+        dates, products, regions, *measures = zip(*rows)
+        self._products = sorted(set(products))
+        self._regions = sorted(set(regions))
+        days = np.array(dates, dtype='datetime64[D]').astype(np.int64)
+        self._first_day = int(days.min())
+        self._days = int(days.max()) - self._first_day + 1
+        self._check_size(self._days)
+        self._daily = np.zeros((self._days, len(self._products), len(self._regions),
+                                len(PREFIX_MEASURES)))
+        self._prefixes = self._allocate(self._days)
+        self._add(days, products, regions, measures)
+        self._accumulate(0)
+
+    def _add(self, days: np.ndarray, products, regions, measures):
+        """Sumar filas (día, producto, región, medidas...) a la matriz diaria"""
+        product_codes = {name: code for code, name in enumerate(self._products)}
+        region_codes = {name: code for code, name in enumerate(self._regions)}
+        np.add.at(self._daily,
+                  (days - self._first_day,
+                   np.fromiter((product_codes[name] for name in products), np.int64, len(days)),
+                   np.fromiter((region_codes[name] for name in regions), np.int64, len(days))),
+                  np.column_stack(measures).astype(float))
+
+    def _accumulate(self, start: int):
+        """Recalcular los prefijos desde la fila start + 1 hasta el último día"""
+        stop = self._days + 1
+        cells = self._prefixes['cells']
+        cells[start + 1:stop] = cells[start] + np.cumsum(self._daily[start:self._days], axis=0)
+        block = cells[start + 1:stop]
+        self._prefixes['product'][start + 1:stop] = block.sum(axis=2)
+        self._prefixes['region'][start + 1:stop] = block.sum(axis=1)
+        self._prefixes['total'][start + 1:stop] = block.sum(axis=(1, 2))
+
+    def _extend(self, rows: List[tuple]) -> bool:
+        """Incorporar el agregado de las ventas nuevas; False si hay que reconstruir"""
+        if not rows:
+            return True
+        dates, products, regions, *measures = zip(*rows)
+        days = np.array(dates, dtype='datetime64[D]').astype(np.int64)
+        if (not self._days or int(days.min()) < self._first_day
+                or not set(products) <= set(self._products)
+                or not set(regions) <= set(self._regions)):
+            return False
+
+        days_before = self._days
+        days_after = max(days_before, int(days.max()) - self._first_day + 1)
+        # Con un hueco de días el prefijo se recalcula desde el último día indexado
+        start = min(int(days.min()) - self._first_day, days_before)
+        if days_after > len(self._daily):
+            # Capacidad doble para que los días siguientes se añadan sin copiar
+            capacity = max(days_after, 2 * len(self._daily))
+            self._check_size(capacity)
+            daily = np.zeros((capacity,) + self._daily.shape[1:])
+            daily[:days_before] = self._daily[:days_before]
+            self._daily = daily
+            prefixes = self._allocate(capacity)
+            for name, prefix in prefixes.items():
+                prefix[:days_before + 1] = self._prefixes[name][:days_before + 1]
+            self._prefixes = prefixes
+        elif start < days_before:
+            # Cambian filas ya publicadas: se trabaja sobre una copia
+            self._prefixes = {name: prefix.copy() for name, prefix in self._prefixes.items()}
+
+        self._days = days_after
+        self._add(days, products, regions, measures)
+        self._accumulate(start)
+        return True
+
+    def bounds(self):
+        """(primer día, último día) con datos como 'YYYY-MM-DD', o (None, None)"""
+        self.refresh()
+        first_day, prefixes = self._view[:2]
+        days = len(prefixes['total']) - 1
+        if not days:
+            return None, None
+        return (str(np.datetime64(first_day, 'D')),
+                str(np.datetime64(first_day + days - 1, 'D')))
+
+    def totals(self, start_date: Optional[str] = None, end_date: Optional[str] = None,
+               product: Optional[str] = None, region: Optional[str] = None) -> Dict:
+        """Totales de [start_date, end_date] (inclusive) con dos filas de un prefijo"""
+        self.refresh()
+        first_day, prefixes, products, regions = self._view
+        days = len(prefixes['total']) - 1
+        low = 0 if not start_date else min(max(day_number(start_date) - first_day, 0), days)
+        high = days if not end_date else min(max(day_number(end_date) - first_day + 1, 0), days)
+        high = max(high, low)
+        if (product and product not in products) or (region and region not in regions):
+            sums = np.zeros(len(PREFIX_MEASURES))
+        elif product and region:
+            cell = (products[product], regions[region])
+            sums = prefixes['cells'][(high,) + cell] - prefixes['cells'][(low,) + cell]
+        elif product:
+            code = products[product]
+            sums = prefixes['product'][high, code] - prefixes['product'][low, code]
+        elif region:
+            code = regions[region]
+            sums = prefixes['region'][high, code] - prefixes['region'][low, code]
+        else:
+            sums = prefixes['total'][high] - prefixes['total'][low]
+        return {
+            'sales_amount': float(sums[0]),
+            'profit': float(sums[1]),
+            'quantity': int(round(sums[2])),
+            'orders': int(round(sums[3])),
+        }
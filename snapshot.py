@@ -0,0 +1,380 @@
+#!/usr/bin/env python3
+"""
+Snapshot module for Data Analytics Dashboard
+Copia compacta de sales en arrays NumPy para agregar en memoria sin SQL
+"""
+
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Tipo de cada array de filas del snapshot: días desde 1970, códigos de
+# categoría y medidas. quantity se amplía a int32 si llega un valor mayor.
+SNAPSHOT_DTYPES = {
+    'day': np.int32,
+    'product': np.int16,
+    'region': np.int16,
+    'sales_amount': np.float64,
+    'profit': np.float64,
+    'quantity': np.int16,
+}
+
+# Bytes por fila de los arrays de filas (sin la holgura de crecimiento)
+ROW_BYTES = sum(np.dtype(dtype).itemsize for dtype in SNAPSHOT_DTYPES.values())
+
+# Tipo de cada array de la tabla de celdas (día, producto, región) sobre la que se consulta
+CELL_DTYPES = {
+    'day': np.int32,
+    'month': np.int32,
+    'product': np.int32,
+    'region': np.int32,
+    'orders': np.int64,
+    'sales_amount': np.float64,
+    'profit': np.float64,
+    'quantity': np.int64,
+}
+
+# Bytes por celda de la tabla de celdas
+CELL_BYTES = sum(np.dtype(dtype).itemsize for dtype in CELL_DTYPES.values())
+
+# Posiciones máximas de la tabla de celdas densa (por encima se usa np.unique)
+CELLS_MAX_DENSE = 4_000_000
+
+SNAPSHOT_QUERY = ("SELECT id, date, product, region, sales_amount, profit, quantity "
+                  "FROM sales WHERE id > ? AND id <= ? ORDER BY id")
+
+
+def day_number(date_str: str) -> int:
+    """Días desde 1970-01-01 de una fecha 'YYYY-MM-DD'"""
+    return int(np.datetime64(date_str, 'D').astype(np.int64))
+
+
+class SalesSnapshot:
+    """Ventas en arrays NumPy contiguos con refresco incremental por id
+
+    Cada fila ocupa 26 bytes (más la holgura de crecimiento de los arrays)
+    frente a los ~110 de un DataFrame con cadenas. Producto y región se
+    guardan como códigos de categoría. Como el espejo de DuckDB, se amplía
+    con los ids nuevos y se reconstruye si cambia sales_generation o el
+    último id retrocede.
+
+    Las filas se agregan con np.bincount en una tabla de celdas (día,
+    producto, región) ordenada por día; en cada refresco solo se agregan las
+    filas nuevas y se funden con esas celdas. Las consultas cortan
+    esa tabla por fechas y agregan unos miles de celdas en lugar de millones
+    de filas. La tabla se publica de forma atómica al terminar cada refresco
+    (también las reconstrucciones), así que las lecturas en curso siguen
+    viendo la anterior completa.
+    """
+
+    def __init__(self, db, chunk_size: int = 200000):
+        self.db = db
+        self.chunk_size = chunk_size
+        self._lock = threading.Lock()
+        self._checked_version = None
+        self._reset(None)
+        self._cells = self._cells_of(0)
+        self._publish()
+
+    def _reset(self, generation: Optional[int]):
+        """Vaciar los arrays de filas; la vista publicada no cambia hasta _publish"""
+        self._generation = generation
+        self._last_id = 0
+        self._size = 0
+        self._buffers = {name: np.empty(0, dtype) for name, dtype in SNAPSHOT_DTYPES.items()}
+        self._categories = {'product': [], 'region': []}
+        self._codes = {'product': {}, 'region': {}}
+
+    def _publish(self):
+        """Publicar la tabla de celdas y los nombres de categoría en una sola asignación"""
+        self._view = (self._cells, tuple(self._categories['product']),
+                      tuple(self._categories['region']))
+
+    def refresh(self):
+        """Cargar las filas nuevas de sales (no hace nada si la versión no cambió)"""
+        version = self.db.get_data_version()
+        if version == self._checked_version:
+            return
+        with self._lock:
+            if version == self._checked_version:
+                return
+            self._refresh()
+            self._checked_version = version
+
+    def _refresh(self):
+        with self.db.pool.reader() as conn:
+            max_id = conn.execute("SELECT MAX(id) FROM sales").fetchone()[0]
+            generation = conn.execute(
+                "SELECT value FROM metadata WHERE key = 'sales_generation'").fetchone()[0]
+        rebuild = generation != self._generation or max_id is None or max_id < self._last_id
+        capacity = 0
+        if max_id is not None:
+            # Los ids crecen, así que max_id - último id acota las filas nuevas
+            new_rows = max_id if rebuild else max_id - self._last_id
+            capacity = self._capacity(0 if rebuild else self._size, new_rows)
+            # Celdas: la tabla publicada sigue viva junto a la nueva; al reconstruir
+            # sales_daily da el número exacto y al añadir cada fila aporta como mucho una
+            cells = len(self._cells['day'])
+            new_cells = self._daily_cells() if rebuild else cells + new_rows
+            self.db.check_working_set(capacity * ROW_BYTES + (cells + new_cells) * CELL_BYTES,
+                                      "El snapshot de ventas")
+        # Las lecturas siguen con la vista anterior mientras se cargan las filas
+        if rebuild:
+            self._reset(generation)
+        try:
+            loaded = self._size
+            if max_id is not None:
+                self._reserve(capacity)
+                for rows in self.db._iter_query(SNAPSHOT_QUERY, [self._last_id, max_id],
+                                                self.chunk_size):
+                    self._append(rows)
+                self._last_id = max_id
+            self._aggregate_cells(loaded)
+        except BaseException:
+            # Arrays a medio cargar: el siguiente refresco los reconstruye
+            self._generation = None
+            raise
+        self._publish()
+
+    def _capacity(self, size: int, new_rows: int) -> int:
+        """Filas reservadas para size + new_rows (crecimiento geométrico)"""
+        allocated = len(self._buffers['day']) if size else 0
+        needed = size + new_rows
+        return allocated if needed <= allocated else max(needed, 2 * allocated)
+
+    def _reserve(self, capacity: int):
+        """Ampliar los arrays de filas a capacity de una vez antes de cargar"""
+        for name, buffer in self._buffers.items():
+            if capacity > len(buffer):
+                # Los arrays anteriores siguen válidos para las vistas publicadas
+                grown = np.empty(capacity, dtype=buffer.dtype)
+                grown[:self._size] = buffer[:self._size]
+                self._buffers[name] = grown
+
+    def _daily_cells(self) -> int:
+        """Celdas (día, producto, región) con ventas según sales_daily"""
+        self.db.refresh_rollup()
+        with self.db.pool.reader() as conn:
+            return conn.execute("SELECT COUNT(*) FROM sales_daily").fetchone()[0]
+
+    def _encode(self, name: str, values) -> np.ndarray:
+        """Códigos de categoría, añadiendo los nombres nuevos al diccionario"""
+        local_codes, uniques = pd.factorize(pd.Index(values))
+        codes = self._codes[name]
+        mapping = np.empty(len(uniques), dtype=np.int32)
+        for i, value in enumerate(uniques):
+            if value not in codes:
+                codes[value] = len(self._categories[name])
+                self._categories[name].append(value)
+            mapping[i] = codes[value]
+        return mapping[local_codes]
+
+    def _append(self, rows: List[tuple]):
+        _, dates, products, regions, sales_amount, profit, quantity = zip(*rows)
+        days = np.array(dates, dtype='datetime64[D]')
+        columns = {
+            'day': days.astype(np.int32),
+            'product': self._encode('product', products),
+            'region': self._encode('region', regions),
+            'sales_amount': np.array(sales_amount, dtype=np.float64),
+            'profit': np.array(profit, dtype=np.float64),
+            'quantity': np.array(quantity, dtype=np.int64),
+        }
+
+        count = len(rows)
+        needed = self._size + count
+        for name, values in columns.items():
+            buffer = self._buffers[name]
+            dtype = buffer.dtype
+            if np.issubdtype(dtype, np.integer) and values.max() > np.iinfo(dtype).max:
+                dtype = np.int32
+            if needed > len(buffer) or dtype != buffer.dtype:
+                # Crecimiento geométrico: los arrays anteriores siguen válidos para las vistas publicadas
+                grown = np.empty(max(needed, 2 * len(buffer)), dtype=dtype)
+                grown[:self._size] = buffer[:self._size]
+                buffer = self._buffers[name] = grown
+            buffer[self._size:needed] = values
+        self._size = needed
+
+    def _aggregate_cells(self, start: int = 0):
+        """Agregar las filas desde start en celdas y fundirlas con la tabla vigente
+
+        Al reconstruir (start 0) la tabla se calcula entera; en un refresco
+        incremental solo se agregan las filas nuevas y se funden con las
+        celdas ya existentes, así que el coste depende de las filas nuevas y
+        del número de celdas, no del total de filas.
+        """
+        delta = self._cells_of(start)
+        current = self._cells if start else None
+        if current is None or not len(current['day']):
+            self._cells = delta
+        elif not len(delta['day']):
+            return
+        elif delta['day'][0] > current['day'][-1]:
+            # Solo días posteriores: basta con añadir las celdas al final
+            self._cells = {name: np.concatenate([current[name], delta[name]])
+                           for name in CELL_DTYPES}
+        else:
+            self._cells = self._merge_cells(current, delta)
+
+    def _cells_of(self, start: int) -> Dict[str, np.ndarray]:
+        """Celdas (día, producto, región) de las filas desde start, ordenadas por día
+
+        Con pocas categorías y días la tabla de celdas es densa y se obtiene
+        con np.bincount; si no cabe en CELLS_MAX_DENSE posiciones se usa
+        np.unique sobre la misma clave. Solo se incluyen celdas con pedidos.
+        """
+        arrays = {name: buffer[start:self._size] for name, buffer in self._buffers.items()}
+        products = len(self._categories['product'])
+        regions = len(self._categories['region'])
+        if not len(arrays['day']):
+            return {name: np.empty(0, dtype) for name, dtype in CELL_DTYPES.items()}
+
+        first_day = int(arrays['day'].min())
+        span = int(arrays['day'].max()) - first_day + 1
+        key = ((arrays['day'] - first_day).astype(np.int64) * products
+               + arrays['product']) * regions + arrays['region']
+        dense = span * products * regions <= CELLS_MAX_DENSE
+        if dense:
+            inverse = key
+            orders = np.bincount(key, minlength=span * products * regions)
+            present = np.flatnonzero(orders)
+        else:
+            present, inverse = np.unique(key, return_inverse=True)
+            orders = np.bincount(inverse)
+
+        cells = {'orders': orders}
+        for name in ('sales_amount', 'profit', 'quantity'):
+            cells[name] = np.bincount(inverse, weights=arrays[name], minlength=len(orders))
+        if dense:
+            cells = {name: values[present] for name, values in cells.items()}
+        day_offsets, rest = np.divmod(present, products * regions)
+        cells['product'], cells['region'] = np.divmod(rest, regions)
+        cells['day'] = (day_offsets + first_day).astype(np.int32)
+        cells['month'] = cells['day'].astype('datetime64[D]').astype('datetime64[M]').astype(np.int32)
+        return {name: values.astype(CELL_DTYPES[name], copy=False)
+                for name, values in cells.items()}
+
+    def _merge_cells(self, current: Dict[str, np.ndarray],
+                     delta: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        """Sumar dos tablas de celdas con días solapados (coste según el número de celdas)"""
+        combined = {name: np.concatenate([current[name], delta[name]]) for name in CELL_DTYPES}
+        products = len(self._categories['product'])
+        regions = len(self._categories['region'])
+        key = ((combined['day'].astype(np.int64) * products + combined['product']) * regions
+               + combined['region'])
+        _, first, inverse = np.unique(key, return_index=True, return_inverse=True)
+        cells = {name: combined[name][first] for name in ('day', 'month', 'product', 'region')}
+        for name in ('orders', 'sales_amount', 'profit', 'quantity'):
+            cells[name] = np.bincount(inverse, weights=combined[name], minlength=len(first))
+        return {name: values.astype(CELL_DTYPES[name], copy=False)
+                for name, values in cells.items()}
+
+    @staticmethod
+    def _select(view, start_date: Optional[str] = None, end_date: Optional[str] = None,
+                product: Optional[str] = None, region: Optional[str] = None) -> Dict[str, np.ndarray]:
+        """Celdas que cumplen los filtros
+
+        El rango de fechas es un corte de las celdas (ordenadas por día) y
+        producto/región una máscara sobre ese corte.
+        """
+        cells, products, regions = view
+        low, high = 0, len(cells['day'])
+        if start_date:
+            low = np.searchsorted(cells['day'], day_number(start_date), side='left')
+        if end_date:
+            high = np.searchsorted(cells['day'], day_number(end_date), side='right')
+        selected = {name: values[low:high] for name, values in cells.items()}
+        mask = None
+        for name, value, names in (('product', product, products), ('region', region, regions)):
+            if value:
+                condition = selected[name] == (names.index(value) if value in names else -1)
+                mask = condition if mask is None else mask & condition
+        if mask is not None:
+            selected = {name: values[mask] for name, values in selected.items()}
+        return selected
+
+    @staticmethod
+    def _grouped(codes: np.ndarray, names: Tuple[str, ...], selected: Dict[str, np.ndarray]):
+        """(nombre, ventas, cantidad) por categoría presente, ordenado por ventas desc."""
+        orders = np.bincount(codes, weights=selected['orders'], minlength=len(names))
+        sales = np.bincount(codes, weights=selected['sales_amount'], minlength=len(names))
+        quantity = np.bincount(codes, weights=selected['quantity'], minlength=len(names))
+        groups = [(names[code], float(sales[code]), int(quantity[code]))
+                  for code in np.flatnonzero(orders)]
+        return sorted(groups, key=lambda group: (-group[1], group[0]))
+
+    def summary_aggregates(self, filters: Dict, recent_start: str, growth_filters: Dict) -> Dict:
+        """Mismos agregados que DatabaseManager._summary_aggregates_sql"""
+        self.refresh()
+        view = self._view
+        selected = self._select(view, **filters)
+        orders = int(selected['orders'].sum())
+        total_sales = float(selected['sales_amount'].sum())
+
+        growth = self._select(view, **growth_filters)
+        recent = growth['day'] >= day_number(recent_start)
+        recent_sales = float(growth['sales_amount'][recent].sum())
+        previous_sales = float(growth['sales_amount'][~recent].sum())
+
+        monthly = []
+        if orders:
+            first_month = int(selected['month'].min())
+            offsets = selected['month'] - first_month
+            counts = np.bincount(offsets, weights=selected['orders'])
+            sales = np.bincount(offsets, weights=selected['sales_amount'])
+            profit = np.bincount(offsets, weights=selected['profit'])
+            monthly = [(str(np.datetime64(first_month + int(offset), 'M')),
+                        float(sales[offset]), float(profit[offset]))
+                       for offset in np.flatnonzero(counts)]
+
+        return {
+            'total_sales': total_sales,
+            'total_profit': float(selected['profit'].sum()),
+            'total_quantity': int(selected['quantity'].sum()),
+            'avg_order_value': total_sales / orders if orders else np.nan,
+            'recent_sales': recent_sales,
+            'previous_sales': previous_sales,
+            'monthly': monthly,
+            'products': self._grouped(selected['product'], view[1], selected),
+            'regions': self._grouped(selected['region'], view[2], selected),
+        }
+
+    def monthly_sales(self) -> pd.DataFrame:
+        """Ventas por producto, región y mes (entrada de get_trends)"""
+        self.refresh()
+        cells, products, regions = self._view
+        if not len(cells['day']):
+            return pd.DataFrame(columns=['product', 'region', 'month', 'sales_amount'])
+
+        first_month = int(cells['month'].min())
+        months = int(cells['month'].max()) - first_month + 1
+        key = ((cells['product'].astype(np.int64) * len(regions) + cells['region']) * months
+               + (cells['month'] - first_month))
+        counts = np.bincount(key, weights=cells['orders'])
+        sales = np.bincount(key, weights=cells['sales_amount'])
+        present = np.flatnonzero(counts)
+        product_codes, rest = np.divmod(present, len(regions) * months)
+        region_codes, month_offsets = np.divmod(rest, months)
+        return pd.DataFrame({
+            'product': np.array(products, dtype=object)[product_codes],
+            'region': np.array(regions, dtype=object)[region_codes],
+            'month': (month_offsets + first_month).astype('datetime64[M]').astype(str),
+            'sales_amount': sales[present],
+        })
+
+    def memory_usage(self) -> Dict:
+        """Bytes de las filas cargadas y de la tabla de celdas, y bytes por millón de filas"""
+        with self._lock:
+            rows = self._size
+            used = sum(buffer[:rows].nbytes for buffer in self._buffers.values())
+            return {
+                'rows': rows,
+                'cells': len(self._cells['day']),
+                'bytes': used,
+                'allocated_bytes': sum(buffer.nbytes for buffer in self._buffers.values()),
+                'cell_bytes': sum(values.nbytes for values in self._cells.values()),
+                'bytes_per_million_rows': round(used / rows * 1_000_000) if rows else 0,
+            }
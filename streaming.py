@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Streaming module for Data Analytics Dashboard
+Codificación por bloques (NDJSON/CSV/Arrow/Parquet) de filas leídas desde un cursor SQLite
+"""
+
+import csv
+import io
+import json
+import zlib
+from typing import Iterable, Iterator, List, Sequence
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow es opcional; sin él no hay formatos Arrow/Parquet
+    pa = None
+    pq = None
+
+ARROW_AVAILABLE = pa is not None
+
+
+class ArrowUnavailableError(RuntimeError):
+    """Se pidió un formato Arrow/Parquet sin tener pyarrow instalado"""
+
+
+def ndjson_chunks(columns: List[str], row_chunks: Iterable[Sequence[tuple]]) -> Iterator[bytes]:
+    """Codificar bloques de filas como JSON delimitado por saltos de línea"""
+    for rows in row_chunks:
+        lines = [json.dumps(dict(zip(columns, row)), ensure_ascii=False) for row in rows]
+        lines.append("")
+        yield "\n".join(lines).encode("utf-8")
+
+
+def csv_chunks(columns: List[str], row_chunks: Iterable[Sequence[tuple]],
+               header: bool = True) -> Iterator[bytes]:
+    """Codificar bloques de filas como CSV, con cabecera opcional"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    if header:
+        writer.writerow(columns)
+        yield buffer.getvalue().encode("utf-8")
+    for rows in row_chunks:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(rows)
+        yield buffer.getvalue().encode("utf-8")
+
+
+def gzip_chunks(byte_chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    """Comprimir un flujo de bytes en formato gzip sin acumularlo en memoria"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in byte_chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def _arrow_type(logical_type: str):
+    """Tipo Arrow de cada tipo lógico de columna (ver COLUMN_TYPES en database)"""
+    return {
+        "integer": pa.int64(),
+        "real": pa.float64(),
+        "text": pa.string(),
+        "date": pa.date32(),
+        "timestamp": pa.timestamp("s"),
+    }[logical_type]
+
+
+def arrow_schema(columns: List[str], types: List[str]):
+    """Esquema Arrow con tipos reales en lugar de texto"""
+    return pa.schema([pa.field(name, _arrow_type(logical)) for name, logical in zip(columns, types)])
+
+
+def _record_batch(schema, rows: Sequence[tuple]):
+    """Pasar un bloque de tuplas del cursor a un RecordBatch columna a columna"""
+    arrays = []
+    for field, values in zip(schema, zip(*rows)):
+        if pa.types.is_date32(field.type):
+            # SQLite guarda fechas ISO como texto: se analizan en Arrow, no en Python
+            array = pa.array(values, pa.string()).cast(pa.timestamp("s")).cast(field.type)
+        elif pa.types.is_timestamp(field.type):
+            array = pa.array(values, pa.string()).cast(field.type)
+        else:
+            array = pa.array(values, field.type)
+        arrays.append(array)
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+class _ChunkSink(io.RawIOBase):
+    """Destino de escritura que acumula los bytes hasta que se recogen"""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _require_pyarrow():
+    if not ARROW_AVAILABLE:
+        raise ArrowUnavailableError("Los formatos arrow y parquet requieren el paquete pyarrow")
+
+
+def arrow_chunks(columns: List[str], types: List[str],
+                 row_chunks: Iterable[Sequence[tuple]]) -> Iterator[bytes]:
+    """Codificar bloques de filas como un stream Arrow IPC (un RecordBatch por bloque)"""
+    _require_pyarrow()
+    return _arrow_chunks(arrow_schema(columns, types), row_chunks)
+
+
+def _arrow_chunks(schema, row_chunks):
+    sink = _ChunkSink()
+    writer = pa.ipc.new_stream(sink, schema)
+    for rows in row_chunks:
+        writer.write_batch(_record_batch(schema, rows))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+def parquet_chunks(columns: List[str], types: List[str],
+                   row_chunks: Iterable[Sequence[tuple]]) -> Iterator[bytes]:
+    """Codificar bloques de filas como Parquet (un row group por bloque)"""
+    _require_pyarrow()
+    return _parquet_chunks(arrow_schema(columns, types), row_chunks)
+
+
+def _parquet_chunks(schema, row_chunks):
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    for rows in row_chunks:
+        writer.write_batch(_record_batch(schema, rows))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
@@ -4,15 +4,37 @@ Tests unitarios para Data Analytics Dashboard
 """
 
 import unittest
+import asyncio
+import io
+import json
+import sqlite3
+import tracemalloc
 import tempfile
+import threading
+import time
 import os
+import pickle
+import shutil
 import pandas as pd
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
 
-from database import DatabaseManager
+from database import DatabaseManager, SALES_INDEXES, WorkingSetExceededError, file_lock
+import duckdb_backend
+from duckdb_backend import duckdb
+import snapshot
+from cache import SummaryCache
+from executor import DatabaseExecutor, QueueFullError
+from connection_pool import ConnectionPool
+from jobs import DONE, FAILED, ExportJobManager
+from serialization import columnar, dumps, finite_int, finite_round
+from streaming import ARROW_AVAILABLE, csv_chunks, ndjson_chunks
+import app_advanced
 from app_advanced import app
 from fastapi.testclient import TestClient
+import httpx
+from unittest import mock
 
 class TestDatabaseManager(unittest.TestCase):
     def setUp(self):
@@ -23,7 +45,10 @@ class TestDatabaseManager(unittest.TestCase):
     
     def tearDown(self):
         """Limpiar después del test"""
+        self.db.close()
         os.unlink(self.temp_db.name)
+        if os.path.exists(self.temp_db.name + '.seed.lock'):
+            os.remove(self.temp_db.name + '.seed.lock')
     
     def test_database_initialization(self):
         """Test: La base de datos se inicializa correctamente"""
@@ -48,6 +73,106 @@ class TestDatabaseManager(unittest.TestCase):
         self.assertTrue(pd.api.types.is_numeric_dtype(df['profit']))
         self.assertTrue(pd.api.types.is_numeric_dtype(df['quantity']))
     
+    def test_generate_sample_data_seed(self):
+        """Test: La generación es reproducible con la misma semilla"""
+        first = self.db.generate_sample_data(250, seed=7, chunk_size=100)
+        second = self.db.generate_sample_data(250, seed=7, chunk_size=100)
+        other = self.db.generate_sample_data(250, seed=8, chunk_size=100)
+        
+        pd.testing.assert_frame_equal(first, second)
+        self.assertFalse(first.equals(other))
+        self.assertTrue(first['quantity'].between(1, 9).all())
+        self.assertTrue((first['profit'] < first['sales_amount']).all())
+    
+    def test_generate_sample_data_chunked(self):
+        """Test: Sin DataFrame, las filas se escriben por bloques y los índices se recrean"""
+        result = self.db.generate_sample_data(250, chunk_size=60, return_df=False)
+        
+        self.assertIsNone(result)
+        df = self.db.get_sales_data()
+        self.assertEqual(list(df['id']), list(range(1, 251)))
+        with self.db.pool.reader() as conn:
+            indexes = {row[0] for row in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'sales'")}
+        self.assertTrue(set(SALES_INDEXES) <= indexes)
+    
+    def test_seed_modes(self):
+        """Test: Modos de siembra al arrancar"""
+        self.assertFalse(self.db.has_sales_data())
+        self.assertFalse(self.db.seed('never', 50))
+        self.assertFalse(self.db.has_sales_data())
+        
+        self.assertTrue(self.db.seed('seed-if-empty', 50))
+        self.assertFalse(self.db.seed('seed-if-empty', 80))
+        self.assertEqual(len(self.db.get_sales_data()), 50)
+        
+        self.assertTrue(self.db.seed('always', 80))
+        self.assertEqual(len(self.db.get_sales_data()), 80)
+        with self.assertRaises(ValueError):
+            self.db.seed('sometimes')
+    
+    def test_seed_once_across_workers(self):
+        """Test: Con varios workers arrancando a la vez solo uno siembra"""
+        managers = [DatabaseManager(self.temp_db.name) for _ in range(4)]
+        results = []
+        threads = [threading.Thread(target=lambda m=m: results.append(m.seed('seed-if-empty', 50)))
+                   for m in managers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for manager in managers:
+            manager.close()
+        
+        self.assertEqual(sorted(results), [False, False, False, True])
+        self.assertEqual(len(self.db.get_sales_data()), 50)
+    
+    def test_seed_always_once_per_startup(self):
+        """Test: Con 'always' y varios workers arrancando a la vez solo uno regenera"""
+        self.db.seed('always', 50)
+        with self.db.pool.reader() as conn:
+            generation = conn.execute(
+                "SELECT value FROM metadata WHERE key = 'sales_generation'").fetchone()[0]
+        
+        managers = [DatabaseManager(self.temp_db.name) for _ in range(2)]
+        results = []
+        threads = [threading.Thread(target=lambda m=m: results.append(m.seed('always', 80)))
+                   for m in managers]
+        # Los dos workers piden la siembra mientras el lock sigue ocupado
+        with file_lock(f"{self.temp_db.name}.seed.lock"):
+            for thread in threads:
+                thread.start()
+            time.sleep(0.2)
+        for thread in threads:
+            thread.join()
+        for manager in managers:
+            manager.close()
+        
+        self.assertEqual(sorted(results), [False, True])
+        self.assertEqual(len(self.db.get_sales_data()), 80)
+        with self.db.pool.reader() as conn:
+            self.assertEqual(conn.execute(
+                "SELECT value FROM metadata WHERE key = 'sales_generation'").fetchone()[0],
+                generation + 1)
+        # Un arranque posterior vuelve a sembrar
+        self.assertTrue(self.db.seed('always', 60))
+    
+    def test_manager_reused_in_process_workers(self):
+        """Test: Las tareas de un pool de procesos reutilizan un gestor por worker"""
+        self.db.generate_sample_data(20)
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            managers = {pool.submit(id, self.db).result() for _ in range(3)}
+            self.assertTrue(pool.submit(self.db.has_sales_data).result())
+        self.assertEqual(len(managers), 1)
+        
+        copy = pickle.loads(pickle.dumps(self.db))
+        try:
+            self.assertIsNot(copy, self.db)
+            self.assertIs(pickle.loads(pickle.dumps(self.db)), copy)
+            self.assertEqual(copy.get_data_version(), self.db.get_data_version())
+        finally:
+            copy.close()
+    
     def test_get_analytics_summary(self):
         """Test: Obtener resumen analítico funciona"""
         # Generar datos de prueba
@@ -86,6 +211,19 @@ class TestDatabaseManager(unittest.TestCase):
         # Limpiar archivo
         os.remove(filename)
     
+    def test_export_csv_gzip(self):
+        """Test: Exportar a CSV comprimido con gzip funciona"""
+        self.db.generate_sample_data(10)
+        
+        filename = self.db.export_to_csv('sales', gzip=True)
+        
+        self.assertTrue(filename.endswith('.csv.gz'))
+        df = pd.read_csv(filename, compression='gzip')
+        self.assertEqual(len(df), 10)
+        self.assertEqual(list(df.columns), list(self.db.get_sales_data().columns))
+        
+        os.remove(filename)
+    
     def test_export_excel(self):
         """Test: Exportar a Excel funciona"""
         self.db.generate_sample_data(10)
@@ -102,6 +240,195 @@ class TestDatabaseManager(unittest.TestCase):
         # Limpiar archivo
         os.remove(filename)
 
+class TestSchemaMigrations(unittest.TestCase):
+    def setUp(self):
+        """Configurar base de datos temporal"""
+        self.temp_db = tempfile.NamedTemporaryFile(delete=False)
+        self.temp_db.close()
+    
+    def tearDown(self):
+        """Limpiar después del test"""
+        os.unlink(self.temp_db.name)
+    
+    def test_legacy_to_sql_schema_is_rebuilt(self):
+        """Test: Una tabla sales creada con to_sql recupera el esquema declarado"""
+        legacy = pd.DataFrame([
+            {'date': '2024-01-01', 'product': 'A', 'region': 'Norte',
+             'sales_amount': 10.0, 'profit': 2.0, 'quantity': 1},
+            {'date': '2024-01-02', 'product': 'B', 'region': 'Sur',
+             'sales_amount': 20.0, 'profit': 4.0, 'quantity': 2},
+        ])
+        conn = sqlite3.connect(self.temp_db.name)
+        legacy.to_sql('sales', conn, index=False)
+        conn.close()
+        
+        db = DatabaseManager(self.temp_db.name)
+        df = db.get_sales_data()
+        db.close()
+        
+        self.assertEqual(list(df['id']), [1, 2])
+        self.assertEqual(list(df['sales_amount']), [10.0, 20.0])
+    
+    def test_sample_data_keeps_schema_and_indexes(self):
+        """Test: Generar datos no elimina el esquema ni los índices"""
+        db = DatabaseManager(self.temp_db.name)
+        db.generate_sample_data(20)
+        
+        with db.pool.reader() as conn:
+            indexes = {row[1] for row in conn.execute("PRAGMA index_list(sales)")}
+            plan = " ".join(row[3] for row in conn.execute(
+                "EXPLAIN QUERY PLAN SELECT SUM(sales_amount) FROM sales "
+                "WHERE product = ? AND date BETWEEN ? AND ?",
+                ('Laptop Pro', '2024-01-01', '2024-12-31')
+            ))
+        df = db.get_sales_data()
+        db.close()
+        
+        self.assertTrue({'idx_sales_date', 'idx_sales_product_date',
+                         'idx_sales_region_date'} <= indexes)
+        self.assertIn('COVERING INDEX idx_sales_product_date', plan)
+        self.assertEqual(list(df['id']), list(range(1, 21)))
+    
+    def test_day_numbers_filter_matches_text_dates(self):
+        """Test: El filtro con números de día devuelve lo mismo que con fechas texto"""
+        db = DatabaseManager(self.temp_db.name)
+        db.generate_sample_data(200)
+        dates = sorted(db.get_sales_data()['date'])
+        start_date, end_date = dates[50], dates[150]
+        expected = db.get_sales_data(start_date, end_date)
+        db.close()
+        
+        day_db = DatabaseManager(self.temp_db.name, day_numbers=True)
+        actual = day_db.get_sales_data(start_date, end_date)
+        day_db.close()
+        
+        self.assertEqual(list(actual.columns), list(expected.columns))
+        self.assertEqual(sorted(actual['id']), sorted(expected['id']))
+
+class TestSalesRollup(unittest.TestCase):
+    def setUp(self):
+        """Configurar base de datos temporal con datos"""
+        self.temp_db = tempfile.NamedTemporaryFile(delete=False)
+        self.temp_db.close()
+        self.db = DatabaseManager(self.temp_db.name)
+        self.db.generate_sample_data(300)
+    
+    def tearDown(self):
+        """Limpiar después del test"""
+        self.db.close()
+        os.unlink(self.temp_db.name)
+    
+    def rollup(self):
+        with self.db.pool.reader() as conn:
+            return pd.read_sql_query(
+                "SELECT * FROM sales_daily ORDER BY date, product, region", conn)
+    
+    def insert_sales(self, rows):
+        with self.db.pool.writer() as conn:
+            conn.executemany(
+                "INSERT INTO sales (date, product, region, sales_amount, profit, quantity) "
+                "VALUES (?, ?, ?, ?, ?, ?)", rows)
+    
+    def test_rollup_matches_sales(self):
+        """Test: sales_daily coincide con agrupar sales por día, producto y región"""
+        expected = (self.db.get_sales_data()
+                    .groupby(['date', 'product', 'region'])
+                    .agg(sales_amount=('sales_amount', 'sum'), profit=('profit', 'sum'),
+                         quantity=('quantity', 'sum'), orders=('id', 'count'))
+                    .reset_index())
+        actual = self.rollup()
+        
+        self.assertEqual(len(actual), len(expected))
+        pd.testing.assert_frame_equal(actual, expected, check_dtype=False, check_categorical=False)
+    
+    def test_incremental_refresh(self):
+        """Test: Solo se agregan las filas nuevas y se suman a las claves existentes"""
+        first = self.db.get_sales_data().iloc[0]
+        self.insert_sales([
+            (first['date'], first['product'], first['region'], 100.0, 10.0, 2),
+            ('2030-01-01', 'Nuevo', 'Norte', 50.0, 5.0, 1),
+        ])
+        total_before = self.rollup()['sales_amount'].sum()
+        
+        self.assertEqual(self.db.refresh_rollup(), 2)
+        self.assertEqual(self.db.refresh_rollup(), 0)
+        self.assertAlmostEqual(self.rollup()['sales_amount'].sum(), total_before + 150.0)
+        self.assertTrue(self.db.check_rollup()['consistent'])
+        self.assertIn('Nuevo', self.db.get_filter_options()['products'])
+    
+    def test_rebuilt_after_replacing_sales(self):
+        """Test: Regenerar sales reconstruye el rollup en lugar de acumular"""
+        self.db.generate_sample_data(50)
+        
+        self.assertEqual(self.rollup()['orders'].sum(), 50)
+        self.assertTrue(self.db.check_rollup()['consistent'])
+    
+    def test_check_detects_and_repairs(self):
+        """Test: La comprobación detecta cambios no incrementales y los repara"""
+        with self.db.pool.writer() as conn:
+            conn.execute("UPDATE sales SET sales_amount = sales_amount + 1 WHERE id = 5")
+            conn.execute("DELETE FROM sales WHERE id = 6")
+        
+        report = self.db.check_rollup()
+        self.assertFalse(report['consistent'])
+        self.assertGreaterEqual(report['mismatched'] + report['extra'], 1)
+        
+        self.assertTrue(self.db.check_rollup(repair=True)['repaired'])
+        self.assertTrue(self.db.check_rollup()['consistent'])
+    
+    def test_migration_builds_rollup(self):
+        """Test: Una base de datos anterior al rollup lo construye al abrirse"""
+        with self.db.pool.writer() as conn:
+            conn.execute("DROP TABLE sales_daily")
+            conn.execute("PRAGMA user_version = 2")
+        self.db.close()
+        
+        self.db = DatabaseManager(self.temp_db.name)
+        self.assertEqual(self.rollup()['orders'].sum(), 300)
+        self.assertTrue(self.db.check_rollup()['consistent'])
+
+class TestExcelExport(unittest.TestCase):
+    def setUp(self):
+        """Configurar base de datos temporal con datos"""
+        self.temp_db = tempfile.NamedTemporaryFile(delete=False)
+        self.temp_db.close()
+        self.db = DatabaseManager(self.temp_db.name)
+        self.db.generate_sample_data(100)
+        self.filename = self.temp_db.name + '.xlsx'
+    
+    def tearDown(self):
+        """Limpiar después del test"""
+        self.db.close()
+        os.unlink(self.temp_db.name)
+        if os.path.exists(self.filename):
+            os.remove(self.filename)
+    
+    def test_rows_split_across_sheets(self):
+        """Test: Las tablas que superan el límite de filas se reparten en varias hojas"""
+        self.db.export_to_excel(self.filename, max_rows_per_sheet=30)
+        
+        sheets = pd.read_excel(self.filename, sheet_name=None)
+        sales_sheets = ['Ventas', 'Ventas (2)', 'Ventas (3)', 'Ventas (4)']
+        for name in sales_sheets:
+            self.assertEqual(list(sheets[name].columns), list(self.db.get_sales_data().columns))
+        self.assertEqual([len(sheets[name]) for name in sales_sheets], [30, 30, 30, 10])
+        
+        combined = pd.concat([sheets[name] for name in sales_sheets])
+        self.assertEqual(list(combined['id']), list(range(1, 101)))
+        self.assertEqual(len(sheets['Productos']), 10)
+        self.assertEqual(len(sheets['Regiones']), 5)
+    
+    def test_summary_not_recomputed(self):
+        """Test: Con un resumen ya calculado no se vuelve a agregar sales"""
+        summary = self.db.get_analytics_summary()
+        
+        with mock.patch.object(self.db, 'get_analytics_summary') as aggregate:
+            self.db.export_to_excel(self.filename, summary=summary)
+        
+        aggregate.assert_not_called()
+        resumen = pd.read_excel(self.filename, sheet_name='Resumen')
+        self.assertAlmostEqual(resumen['total_sales'][0], summary['metrics']['total_sales'])
+
 class TestAPI(unittest.TestCase):
     def setUp(self):
         """Configurar cliente de test"""
@@ -125,6 +452,28 @@ class TestAPI(unittest.TestCase):
         self.assertTrue(data['success'])
         self.assertIn('data', data)
     
+    def test_static_and_dashboard_caching(self):
+        """Test: Cache-Control en /static y ETag del dashboard en memoria"""
+        static = self.client.get("/static/dashboard_advanced.html")
+        self.assertIn('max-age', static.headers['cache-control'])
+        
+        page = self.client.get("/")
+        self.assertEqual(page.status_code, 200)
+        self.assertEqual(page.headers['cache-control'], 'no-cache')
+        with mock.patch('builtins.open') as opened:
+            cached = self.client.get("/", headers={'If-None-Match': page.headers['etag']})
+        opened.assert_not_called()
+        self.assertEqual(cached.status_code, 304)
+    
+    def test_get_trends_grouping(self):
+        """Test: Tendencias por región y agrupación no válida"""
+        response = self.client.get("/api/trends", params={'by': 'region'})
+        self.assertEqual(response.status_code, 200)
+        for trend in response.json()['data'].values():
+            self.assertIn(trend['direction'], ('up', 'down'))
+        
+        self.assertEqual(self.client.get("/api/trends", params={'by': 'month'}).status_code, 422)
+    
     def test_get_metrics(self):
         """Test: Obtener métricas funciona"""
         response = self.client.get("/api/metrics")
@@ -183,11 +532,81 @@ class TestAPI(unittest.TestCase):
         self.assertIn('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 
                      response.headers['content-type'])
     
+    def test_export_csv_leaves_no_files(self):
+        """Test: La exportación CSV se transmite sin escribir ficheros en disco"""
+        os.makedirs('exports', exist_ok=True)
+        before = set(os.listdir('exports'))
+        
+        response = self.client.get("/api/export/csv/products")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('attachment', response.headers['content-disposition'])
+        
+        self.assertEqual(set(os.listdir('exports')), before)
+    
+    def test_export_csv_gzip(self):
+        """Test: La exportación CSV con gzip=true se descomprime correctamente"""
+        import gzip
+        response = self.client.get("/api/export/csv/regions?gzip=true")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['content-type'], 'application/gzip')
+        
+        text = gzip.decompress(response.content).decode('utf-8')
+        self.assertTrue(text.startswith('id,name,country,population,created_at'))
+    
+    def test_export_csv_invalid_table(self):
+        """Test: Exportar una tabla desconocida devuelve 400"""
+        response = self.client.get("/api/export/csv/sqlite_master")
+        self.assertEqual(response.status_code, 400)
+    
+    def test_export_excel_removes_temp_file(self):
+        """Test: El fichero temporal de Excel se borra tras enviarlo"""
+        created = []
+        original_mkstemp = tempfile.mkstemp
+        
+        def tracking_mkstemp(*args, **kwargs):
+            fd, path = original_mkstemp(*args, **kwargs)
+            created.append(path)
+            return fd, path
+        
+        with mock.patch.object(app_advanced.tempfile, 'mkstemp', side_effect=tracking_mkstemp):
+            response = self.client.get("/api/export/excel")
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(created), 1)
+        self.assertFalse(os.path.exists(created[0]))
+    
     def test_dashboard_page(self):
         """Test: Página del dashboard carga"""
         response = self.client.get("/")
         self.assertEqual(response.status_code, 200)
         self.assertIn('text/html', response.headers['content-type'])
+    
+    def test_lifespan_closes_connections(self):
+        """Test: Al apagar la aplicación se cierran las conexiones del pool"""
+        with TestClient(app) as client:
+            self.assertEqual(client.get("/health").status_code, 200)
+            self.assertGreater(app_advanced.db.pool._created, 0)
+        
+        self.assertEqual(app_advanced.db.pool._created, 0)
+
+    def test_lifespan_seed_mode_never(self):
+        """Test: Con modo never el arranque no toca la base de datos y mide el tiempo"""
+        temp_db = tempfile.NamedTemporaryFile(delete=False)
+        temp_db.close()
+        db = DatabaseManager(temp_db.name)
+        try:
+            with mock.patch.object(app_advanced, 'db', db), \
+                    mock.patch.object(app_advanced, 'SEED_MODE', 'never'):
+                with TestClient(app) as client:
+                    startup = client.get("/health").json()['startup']
+            
+            self.assertFalse(db.has_sales_data())
+            self.assertEqual(startup['seed_mode'], 'never')
+            self.assertFalse(startup['seeded'])
+            self.assertGreater(startup['time_to_first_request_ms'], 0)
+        finally:
+            db.close()
+            os.unlink(temp_db.name)
 
 class TestDataProcessing(unittest.TestCase):
     def setUp(self):
@@ -199,8 +618,20 @@ class TestDataProcessing(unittest.TestCase):
     
     def tearDown(self):
         """Limpiar después del test"""
+        self.db.close()
         os.unlink(self.temp_db.name)
     
+    def test_vectorized_sanitizing(self):
+        """Test: inf/nan pasan a 0 o null sin recorrer valores en Python"""
+        self.assertEqual(finite_round([1.234, np.inf, np.nan, -2.5], 1), [1.2, 0.0, 0.0, -2.5])
+        self.assertEqual(finite_int([3.0, np.nan]), [3, 0])
+        
+        df = pd.DataFrame({'id': [1, 2], 'product': ['A', 'B'], 'profit': [1.5, np.nan]})
+        self.assertEqual(columnar(df), {'columns': ['id', 'product', 'profit'],
+                                        'data': [(1, 'A', 1.5), (2, 'B', None)]})
+        self.assertEqual(json.loads(dumps({'values': np.arange(3), 'total': np.float64(2.5)})),
+                         {'values': [0, 1, 2], 'total': 2.5})
+    
     def test_data_consistency(self):
         """Test: Los datos generados son consistentes"""
         df = self.db.get_sales_data()
@@ -228,6 +659,1289 @@ class TestDataProcessing(unittest.TestCase):
             self.assertTrue((df['date'] >= start_date).all())
             self.assertTrue((df['date'] <= end_date).all())
 
+    def assertSummaryEqual(self, expected, actual):
+        """Comparar dos resúmenes con tolerancia en los valores numéricos"""
+        if isinstance(expected, dict):
+            self.assertEqual(set(expected), set(actual))
+            for key in expected:
+                self.assertSummaryEqual(expected[key], actual[key])
+        elif isinstance(expected, list):
+            self.assertEqual(len(expected), len(actual))
+            for exp_item, act_item in zip(expected, actual):
+                self.assertSummaryEqual(exp_item, act_item)
+        elif isinstance(expected, float):
+            self.assertAlmostEqual(expected, actual, places=2)
+        else:
+            self.assertEqual(expected, actual)
+
+    def test_sql_summary_matches_pandas(self):
+        """Test: El resumen agregado en SQL coincide con la referencia en pandas"""
+        sql_summary = self.db.get_analytics_summary(engine='sql')
+        pandas_summary = self.db.get_analytics_summary(engine='pandas')
+
+        self.assertSummaryEqual(pandas_summary, sql_summary)
+        self.assertGreater(sql_summary['metrics']['total_sales'], 0)
+
+    def test_filtered_summary_matches_pandas(self):
+        """Test: Con filtros, SQL y pandas coinciden y el crecimiento se ancla en end_date"""
+        dates = sorted(self.db.get_sales_data()['date'])
+        middle = dates[len(dates) // 2]
+        for filters in ({'product': 'Laptop Pro'},
+                        {'start_date': dates[0], 'end_date': middle, 'region': 'Norte'},
+                        {'end_date': middle}):
+            self.assertSummaryEqual(self.db.get_analytics_summary(engine='pandas', **filters),
+                                    self.db.get_analytics_summary(engine='sql', **filters))
+        
+        # Filtrar solo por end_date recorta los meses al rango pedido
+        months = self.db.get_analytics_summary(end_date=middle)['monthly_data']['months']
+        self.assertEqual(months[-1], middle[:7])
+        
+        with self.assertRaises(ValueError):
+            self.db.get_analytics_summary(start_date='2024-13-01')
+    
+    def test_chunked_reads(self):
+        """Test: Las lecturas por bloques conservan tipos y agregados"""
+        df = self.db.get_sales_data()
+        self.assertIsInstance(df['product'].dtype, pd.CategoricalDtype)
+        self.assertEqual(df['quantity'].dtype, np.int64)
+        
+        with mock.patch('database.READ_CHUNK_SIZE', 7):
+            chunked = self.db.get_sales_data()
+            self.assertSummaryEqual(self.db.get_analytics_summary(engine='pandas'),
+                                    self.db.get_analytics_summary(engine='sql'))
+        pd.testing.assert_frame_equal(chunked, df)
+    
+    def test_working_set_limit(self):
+        """Test: Lo que supera max_working_set se rechaza y el snapshot se degrada a SQLite"""
+        expected = self.db.get_analytics_summary(engine='sql')
+        self.db.max_working_set = 2000
+        with self.assertRaises(WorkingSetExceededError):
+            self.db.get_sales_data()
+        self.assertEqual(len(self.db.get_sales_data(fields=['id'])), 100)
+        
+        # 100 filas de 26 bytes no caben en el snapshot: se responde desde sales_daily
+        self.assertEqual(self.db.get_analytics_summary(engine='snapshot'), expected)
+        self.assertEqual(self.db.get_trends('region', engine='snapshot'), self.db.get_trends('region'))
+        self.assertEqual(self.db.sales_snapshot().memory_usage()['rows'], 0)
+    
+    def test_sql_summary_matches_pandas_empty_table(self):
+        """Test: Ambos motores coinciden con la tabla de ventas vacía"""
+        empty_db = tempfile.NamedTemporaryFile(delete=False)
+        empty_db.close()
+        try:
+            db = DatabaseManager(empty_db.name)
+            self.assertSummaryEqual(
+                db.get_analytics_summary(engine='pandas'),
+                db.get_analytics_summary(engine='sql')
+            )
+            db.close()
+        finally:
+            os.unlink(empty_db.name)
+
+    def test_trends_match_polyfit_with_empty_months(self):
+        """Test: Las pendientes coinciden con np.polyfit sobre meses rellenados a cero"""
+        df = self.db.get_sales_data()
+        df['month'] = pd.to_datetime(df['date']).dt.to_period('M')
+        months = pd.period_range(df['month'].min(), df['month'].max(), freq='M')
+        
+        trends = self.db.get_trends('product')
+        self.assertEqual(set(trends), set(df['product']))
+        for product, trend in trends.items():
+            monthly = (df[df['product'] == product].groupby('month')['sales_amount'].sum()
+                       .reindex(months, fill_value=0.0))
+            expected = np.polyfit(np.arange(len(months)), monthly.values, 1)[0]
+            self.assertAlmostEqual(trend['trend'], round(expected, 2), places=2)
+            self.assertEqual(trend['direction'], 'up' if expected > 0 else 'down')
+    
+    def test_trend_groupings_are_consistent(self):
+        """Test: Las pendientes por región suman la pendiente del producto"""
+        by_product = self.db.get_trends('product')
+        by_pair = self.db.get_trends('product_region')
+        by_region = self.db.get_trends('region')
+        
+        self.assertEqual(set(by_pair), set(by_product))
+        for product, regions in by_pair.items():
+            total = sum(trend['trend'] for trend in regions.values())
+            self.assertAlmostEqual(total, by_product[product]['trend'], delta=0.05)
+        self.assertEqual(set(by_region), set(self.db.get_sales_data()['region']))
+        with self.assertRaises(ValueError):
+            self.db.get_trends('month')
+    
+    def test_ols_slopes(self):
+        """Test: Pendientes en forma cerrada para varias series a la vez"""
+        series = np.array([[0.0, 1.0, 2.0, 3.0], [5.0, 5.0, 5.0, 5.0], [3.0, 2.0, 1.0, 0.0]])
+        np.testing.assert_allclose(DatabaseManager.ols_slopes(series), [1.0, 0.0, -1.0],
+                                   atol=1e-12)
+
+class TestSalesQueries(unittest.TestCase):
+    def setUp(self):
+        """Configurar base de datos temporal y cliente apuntando a ella"""
+        self.temp_db = tempfile.NamedTemporaryFile(delete=False)
+        self.temp_db.close()
+        self.db = DatabaseManager(self.temp_db.name)
+        self.db.generate_sample_data(300)
+        self.db_patch = mock.patch.object(app_advanced, 'db', self.db)
+        self.db_patch.start()
+        self.client = TestClient(app)
+    
+    def tearDown(self):
+        """Limpiar después del test"""
+        self.db_patch.stop()
+        self.db.close()
+        os.unlink(self.temp_db.name)
+    
+    def test_filters_run_in_sql(self):
+        """Test: Los filtros de producto y región coinciden con filtrar en pandas"""
+        all_rows = self.db.get_sales_data()
+        expected = all_rows[(all_rows['product'] == 'Laptop Pro') & (all_rows['region'] == 'Norte')]
+        
+        df = self.db.get_sales_data(product='Laptop Pro', region='Norte')
+        
+        self.assertEqual(list(df['id']), list(expected['id']))
+    
+    def test_filter_options_index(self):
+        """Test: Opciones de filtro con recuentos y límites de fechas sin la lista completa"""
+        sales = self.db.get_sales_data()
+        
+        response = self.client.get("/api/filters")
+        self.assertEqual(response.status_code, 200)
+        data = response.json()['data']
+        
+        self.assertNotIn('available', data['dates'])
+        self.assertEqual(data['dates']['min'], sales['date'].min())
+        self.assertEqual(data['dates']['max'], sales['date'].max())
+        self.assertEqual(data['dates']['days'], sales['date'].nunique())
+        self.assertEqual(data['products'], sorted(sales['product'].unique()))
+        self.assertEqual(data['counts']['products'], sales['product'].value_counts().to_dict())
+        self.assertEqual(data['counts']['regions'], sales['region'].value_counts().to_dict())
+        
+        full = self.client.get("/api/filters", params={'include_dates': 'true'}).json()['data']
+        self.assertEqual(full['dates']['available'], sorted(sales['date'].unique()))
+    
+    def test_filter_options_etag(self):
+        """Test: /api/filters responde 304 mientras los datos no cambian"""
+        first = self.client.get("/api/filters")
+        etag = first.headers['etag']
+        
+        cached = self.client.get("/api/filters", headers={'If-None-Match': etag})
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached.content, b"")
+        
+        self.db.ingest(io.BytesIO(b'{"date": "2030-01-01", "product": "Nuevo", "region": "Norte", '
+                                  b'"sales_amount": 1, "profit": 1, "quantity": 1}\n'))
+        changed = self.client.get("/api/filters", headers={'If-None-Match': etag})
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed.headers['etag'], etag)
+        self.assertEqual(changed.json()['data']['dates']['max'], '2030-01-01')
+    
+    def test_read_endpoints_not_modified(self):
+        """Test: /api/data y /api/trends revalidan sin recalcular la agregación"""
+        for path in ("/api/data", "/api/trends", "/api/sales"):
+            first = self.client.get(path)
+            self.assertEqual(first.status_code, 200)
+            self.assertIn('last-modified', first.headers)
+            
+            with mock.patch.object(self.db, 'get_analytics_summary') as summary, \
+                 mock.patch.object(self.db, 'get_trends') as trends:
+                by_etag = self.client.get(path, headers={'If-None-Match': first.headers['etag']})
+                by_date = self.client.get(path, headers={'If-Modified-Since': first.headers['last-modified']})
+            summary.assert_not_called()
+            trends.assert_not_called()
+            self.assertEqual(by_etag.status_code, 304)
+            self.assertEqual(by_date.status_code, 304)
+        
+        # Cada consulta de /api/sales tiene su propio ETag
+        self.assertNotEqual(self.client.get("/api/sales", params={'region': 'Sur'}).headers['etag'],
+                            self.client.get("/api/sales").headers['etag'])
+        
+        self.db.ingest(io.BytesIO(b'{"date": "2030-01-01", "product": "Nuevo", "region": "Norte", '
+                                  b'"sales_amount": 1, "profit": 1, "quantity": 1}\n'))
+        changed = self.client.get("/api/data", headers={'If-None-Match': first.headers['etag']})
+        self.assertEqual(changed.status_code, 200)
+    
+    def test_sales_over_working_set(self):
+        """Test: /api/sales rechaza con 413 lo que no cabe en memoria; el streaming sigue"""
+        self.db.max_working_set = 12000
+        response = self.client.get("/api/sales")
+        self.assertEqual(response.status_code, 413)
+        self.assertIn("format=ndjson", response.json()["detail"])
+        
+        self.assertEqual(self.client.get("/api/sales", params={"limit": 10}).status_code, 200)
+        streamed = self.client.get("/api/sales", params={"format": "ndjson"})
+        self.assertEqual(len(streamed.text.splitlines()), 300)
+    
+    def test_sales_json_over_working_set(self):
+        """Test: Una respuesta que cabe como DataFrame pero no como JSON se rechaza con 413"""
+        self.db.max_working_set = 100000
+        self.assertEqual(len(self.db.get_sales_data()), 300)
+        
+        for layout in ("records", "columns"):
+            response = self.client.get("/api/sales", params={"layout": layout})
+            self.assertEqual(response.status_code, 413)
+            self.assertIn("JSON", response.json()["detail"])
+        self.assertEqual(self.client.get("/api/sales", params={"limit": 50}).status_code, 200)
+    
+    def test_range_totals_match_sales(self):
+        """Test: Los totales del índice de sumas prefijas coinciden con sumar las ventas"""
+        sales = self.db.get_sales_data()
+        dates = sorted(sales['date'])
+        for start, end, product, region in [(dates[0], dates[-1], None, None),
+                                            (dates[40], dates[200], 'Laptop Pro', None),
+                                            (dates[10], dates[10], None, 'Sur'),
+                                            ('2000-01-01', dates[100], 'Laptop Pro', 'Norte'),
+                                            (dates[50], '2099-12-31', 'Inexistente', None)]:
+            expected = sales[(sales['date'] >= start) & (sales['date'] <= end)]
+            if product:
+                expected = expected[expected['product'] == product]
+            if region:
+                expected = expected[expected['region'] == region]
+            totals = self.db.range_totals(start, end, product, region)
+            self.assertAlmostEqual(totals['sales_amount'], expected['sales_amount'].sum(), places=6)
+            self.assertAlmostEqual(totals['profit'], expected['profit'].sum(), places=6)
+            self.assertEqual(totals['quantity'], expected['quantity'].sum())
+            self.assertEqual(totals['orders'], len(expected))
+    
+    def test_prefix_index_extends(self):
+        """Test: El índice incorpora días nuevos, días ya indexados y categorías nuevas"""
+        first, last = self.db.prefix_index().bounds()
+        before = self.db.range_totals(first, last)
+        rows = [(last, 'Laptop Pro', 'Norte', 10.0), ('2031-06-30', 'Laptop Pro', 'Norte', 20.0),
+                (first, 'Nuevo', 'Norte', 30.0)]
+        for date, product, region, amount in rows:
+            orders = self.db.range_totals(date, date, product, region)['orders']
+            self.db.ingest(io.BytesIO(json.dumps({
+                "date": date, "product": product, "region": region,
+                "sales_amount": amount, "profit": 1, "quantity": 1}).encode() + b"\n"))
+            self.assertEqual(self.db.range_totals(date, date, product, region)['orders'], orders + 1)
+        
+        self.assertEqual(self.db.prefix_index().bounds(), (first, '2031-06-30'))
+        self.assertAlmostEqual(self.db.range_totals(first, last)['sales_amount'],
+                               before['sales_amount'] + 40.0, places=6)
+        self.assertEqual(self.db.range_totals()['orders'], 303)
+    
+    def test_prefix_index_extends_after_gap(self):
+        """Test: Un día nuevo tras un hueco sin ventas mantiene los totales acumulados"""
+        first, last = self.db.prefix_index().bounds()
+        gap_day = (datetime.strptime(last, '%Y-%m-%d') + timedelta(days=5)).strftime('%Y-%m-%d')
+        self.db.ingest(io.BytesIO(json.dumps({
+            "date": gap_day, "product": "Laptop Pro", "region": "Norte",
+            "sales_amount": 50, "profit": 1, "quantity": 1}).encode() + b"\n"))
+        
+        def sql_sum(start, end):
+            with self.db.pool.reader() as conn:
+                return conn.execute("SELECT COALESCE(SUM(sales_amount), 0), COUNT(*) FROM sales "
+                                    "WHERE date BETWEEN ? AND ?", (start, end)).fetchone()
+        
+        gap_start = (datetime.strptime(last, '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d')
+        for start, end in [(first, gap_day), (gap_start, gap_day), (gap_start, gap_start),
+                           (first, last)]:
+            totals = self.db.range_totals(start, end)
+            sales, orders = sql_sum(start, end)
+            self.assertAlmostEqual(totals['sales_amount'], sales, places=6)
+            self.assertEqual(totals['orders'], orders)
+        whole = self.db.range_totals()
+        self.assertEqual(whole['orders'], 301)
+        self.assertAlmostEqual(whole['sales_amount'], sql_sum(first, gap_day)[0], places=6)
+    
+    def test_prefix_index_rebuild_keeps_view(self):
+        """Test: Mientras se reconstruye el índice las lecturas ven el prefijo anterior"""
+        index = self.db.prefix_index()
+        self.assertEqual(self.db.range_totals()['orders'], 300)
+        seen = []
+        rebuild = index._rebuild
+        
+        def observed(*args):
+            rebuild(*args)
+            seen.append(int(index._view[1]['total'][-1][3]))
+        
+        self.db.generate_sample_data(200, seed=5)
+        with mock.patch.object(index, '_rebuild', side_effect=observed):
+            self.assertEqual(self.db.range_totals()['orders'], 200)
+        self.assertEqual(seen, [300])
+        
+        self.db.generate_sample_data(100, seed=6)
+        with mock.patch.object(index, '_rebuild', side_effect=RuntimeError("fallo")):
+            with self.assertRaises(RuntimeError):
+                index.refresh()
+        self.assertEqual(int(index._view[1]['total'][-1][3]), 200)
+        self.assertEqual(self.db.range_totals()['orders'], 100)
+    
+    def test_prefix_index_over_working_set(self):
+        """Test: Si el índice no cabe en max_working_set los totales salen de SQL"""
+        expected = {window: self.db.range_totals(*window)
+                    for window in [(None, None, None, None), ('2026-01-01', '2026-06-30', None, 'Sur'),
+                                   (None, None, 'Laptop Pro', None)]}
+        fallback = DatabaseManager(self.db.db_path, max_working_set=1000)
+        try:
+            for window, totals in expected.items():
+                result = fallback.range_totals(*window)
+                self.assertEqual({k: result[k] for k in ('quantity', 'orders')},
+                                 {k: totals[k] for k in ('quantity', 'orders')})
+                self.assertAlmostEqual(result['sales_amount'], totals['sales_amount'], places=6)
+            self.assertEqual(fallback.compare_periods(compare='previous')['current']['orders'], 300)
+            self.assertEqual(len(fallback.prefix_index()._view[1]['total']), 1)
+        finally:
+            fallback.close()
+    
+    def test_totals_endpoint_comparisons(self):
+        """Test: /api/totals compara con el periodo anterior, el mes anterior o uno dado"""
+        # Los datos de muestra son relativos a hoy: se usa el último mes completo con ventas
+        last = pd.Timestamp(self.db.prefix_index().bounds()[1])
+        month_end = last - pd.offsets.MonthBegin(1) - pd.Timedelta(days=1)
+        month_start = month_end - pd.offsets.MonthBegin(1)
+        before_end = month_start - pd.Timedelta(days=1)
+        before_start = before_end - pd.offsets.MonthBegin(1)
+        day = lambda ts: ts.strftime('%Y-%m-%d')
+        
+        response = self.client.get("/api/totals", params={
+            "start_date": day(month_start), "end_date": day(month_end), "compare": "mom"})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()["data"]
+        self.assertEqual((data["previous"]["start_date"], data["previous"]["end_date"]),
+                         (day(before_start), day(before_end)))
+        earlier = self.db.range_totals(day(before_start), day(before_end))
+        self.assertEqual(data["previous"]["orders"], earlier["orders"])
+        if earlier["sales_amount"]:
+            self.assertAlmostEqual(
+                data["change"]["sales_amount"],
+                (data["current"]["sales_amount"] - earlier["sales_amount"]) / earlier["sales_amount"] * 100,
+                places=1)
+        
+        previous = self.client.get("/api/totals", params={
+            "start_date": day(month_start), "end_date": day(month_start + pd.Timedelta(days=9)),
+            "compare": "previous"}).json()["data"]
+        self.assertEqual((previous["previous"]["start_date"], previous["previous"]["end_date"]),
+                         (day(before_end - pd.Timedelta(days=9)), day(before_end)))
+        
+        whole = self.client.get("/api/totals").json()["data"]
+        self.assertEqual(whole["current"]["orders"], 300)
+        self.assertNotIn("previous", whole)
+        
+        custom = self.client.get("/api/totals", params={
+            "compare": "custom", "compare_start": "1999-01-01", "compare_end": "1999-12-31"}).json()["data"]
+        self.assertEqual(custom["previous"]["orders"], 0)
+        self.assertIsNone(custom["change"]["orders"])
+        
+        for params in ({"compare": "wow"}, {"compare": "custom"},
+                       {"compare": "custom", "compare_start": "2026-03-31", "compare_end": "2026-03-01"},
+                       {"start_date": "2026-09-10", "end_date": "2026-09-01"}):
+            self.assertEqual(self.client.get("/api/totals", params=params).status_code, 400)
+    
+    def test_cube_matches_sales(self):
+        """Test: /api/cube agrega como un groupby de las ventas, también por categoría"""
+        sales = self.db.get_sales_data()
+        sales['month'] = sales['date'].astype(str).str[:7]
+        with self.db.pool.reader() as conn:
+            categories = dict(conn.execute("SELECT name, category FROM products").fetchall())
+        sales['category'] = sales['product'].astype(str).map(categories)
+        
+        response = self.client.get("/api/cube", params={
+            "dims": "region,month", "measures": "sales_amount,orders,avg_order_value"})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()["data"]
+        self.assertEqual(data["columns"], ["region", "month", "sales_amount", "orders", "avg_order_value"])
+        expected = sales.groupby(['region', 'month'], observed=True)['sales_amount'].agg(['sum', 'count'])
+        self.assertEqual(len(data["data"]), len(expected))
+        self.assertEqual([row[:2] for row in data["data"]], [list(key) for key in expected.index])
+        for row, (total, count) in zip(data["data"], expected.itertuples(index=False)):
+            self.assertAlmostEqual(row[2], total, places=1)
+            self.assertEqual(row[3], count)
+            self.assertAlmostEqual(row[4], total / count, places=1)
+        
+        by_category = self.client.get("/api/cube", params={
+            "dims": "category", "measures": "quantity", "region": "Norte"}).json()["data"]
+        north = sales[sales['region'] == 'Norte']
+        self.assertEqual(dict(by_category["data"]),
+                         north.groupby('category')['quantity'].sum().to_dict())
+        
+        total = self.client.get("/api/cube", params={"dims": ""}).json()["data"]
+        self.assertEqual(total["data"][0][3], 300)
+        
+        for params in ({"dims": "month,year"}, {"measures": "margin"}, {"measures": ""}):
+            self.assertEqual(self.client.get("/api/cube", params=params).status_code, 400)
+    
+    def test_cube_rolls_up_cached_cuboid(self):
+        """Test: Un cuboide más grueso se obtiene del más fino en caché sin consultar"""
+        fine = self.client.get("/api/cube", params={"dims": "day,product,region"}).json()["data"]
+        expected = {}
+        for day, _, _, *measures in fine["data"]:
+            expected[day[:7]] = [a + b for a, b in zip(expected.get(day[:7], [0] * 4), measures)]
+        
+        with mock.patch.object(self.db, 'get_cube', side_effect=AssertionError("sin roll-up")):
+            month = self.client.get("/api/cube", params={"dims": "month"})
+            category = self.client.get("/api/cube", params={"dims": "category,week"})
+        self.assertEqual(month.status_code, 200)
+        self.assertEqual(category.status_code, 200)
+        for month_name, *measures in month.json()["data"]["data"]:
+            for value, total in zip(measures, expected[month_name]):
+                self.assertAlmostEqual(value, total, places=1)
+        
+        # Todas las claves candidatas se construyen con una sola lectura de la versión
+        with mock.patch.object(self.db, 'get_data_version',
+                               wraps=self.db.get_data_version) as version:
+            app_advanced.get_cuboid(('region',), product='Inexistente')
+        self.assertEqual(version.call_count, 1)
+        
+        direct = self.db.get_cube(frozenset({'category', 'week'}))
+        self.assertEqual(len(category.json()["data"]["data"]), len(direct))
+        self.assertEqual(sorted(week for _, week, *_ in category.json()["data"]["data"]),
+                         sorted(direct['week']))
+    
+    def test_filtered_analytics_data(self):
+        """Test: /api/data con filtros agrega en el servidor solo las filas que cumplen"""
+        rows = self.db.get_sales_data(product='Laptop Pro', region='Sur')
+        response = self.client.get("/api/data", params={'product': 'Laptop Pro', 'region': 'Sur'})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()['data']
+        
+        self.assertAlmostEqual(data['metrics']['total_sales'], rows['sales_amount'].sum(), places=2)
+        self.assertEqual(data['metrics']['total_customers'], rows['quantity'].sum())
+        self.assertEqual(data['product_data']['products'], ['Laptop Pro'])
+        self.assertEqual(data['region_data']['regions'], ['Sur'])
+        self.assertNotEqual(response.headers['etag'], self.client.get("/api/data").headers['etag'])
+        
+        bad = self.client.get("/api/data", params={'end_date': '17/10/2026'})
+        self.assertEqual(bad.status_code, 400)
+    
+    def test_sales_columnar_layout(self):
+        """Test: layout=columns devuelve las mismas filas que los registros"""
+        records = self.client.get("/api/sales", params={'region': 'Norte'}).json()['data']
+        body = self.client.get("/api/sales", params={'region': 'Norte', 'layout': 'columns'}).json()
+        
+        self.assertEqual([dict(zip(body['columns'], row)) for row in body['data']], records)
+        self.assertIsNone(body['next_cursor'])
+    
+    @unittest.skipUnless(ARROW_AVAILABLE, "requiere pyarrow")
+    def test_sales_arrow_and_parquet(self):
+        """Test: Arrow IPC y Parquet devuelven las mismas filas con columnas tipadas"""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        
+        expected = self.db.get_sales_data(region='Sur')
+        arrow = self.client.get("/api/sales", params={'region': 'Sur', 'format': 'arrow'})
+        self.assertEqual(arrow.headers['content-type'], 'application/vnd.apache.arrow.stream')
+        table = pa.ipc.open_stream(arrow.content).read_all()
+        self.assertEqual(table.schema.field('date').type, pa.date32())
+        self.assertEqual(table.schema.field('quantity').type, pa.int64())
+        self.assertEqual(table.column('id').to_pylist(), list(expected['id']))
+        self.assertEqual([d.isoformat() for d in table.column('date').to_pylist()],
+                         list(expected['date']))
+        
+        parquet = self.client.get("/api/export/parquet/sales")
+        self.assertEqual(parquet.status_code, 200)
+        table = pq.read_table(pa.BufferReader(parquet.content))
+        self.assertEqual(table.num_rows, len(self.db.get_sales_data()))
+        self.assertAlmostEqual(sum(table.column('sales_amount').to_pylist()),
+                               self.db.get_sales_data()['sales_amount'].sum(), places=2)
+    
+    @unittest.skipIf(ARROW_AVAILABLE, "pyarrow instalado")
+    def test_columnar_formats_need_pyarrow(self):
+        """Test: Sin pyarrow los formatos arrow/parquet responden 501"""
+        self.assertEqual(self.client.get("/api/sales", params={'format': 'arrow'}).status_code, 501)
+        self.assertEqual(self.client.get("/api/export/parquet/sales").status_code, 501)
+        self.assertEqual(self.client.post("/api/exports", json={'kind': 'parquet'}).status_code, 501)
+    
+    def test_compression_negotiation(self):
+        """Test: gzip por encima del umbral y solo si el cliente lo acepta"""
+        compressed = self.client.get("/api/sales", headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(compressed.headers['content-encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', compressed.headers['vary'])
+        self.assertEqual(len(compressed.json()['data']), len(self.db.get_sales_data()))
+        
+        streamed = self.client.get("/api/sales", params={'format': 'ndjson'},
+                                   headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(streamed.headers['content-encoding'], 'gzip')
+        self.assertEqual(len(streamed.text.splitlines()), len(self.db.get_sales_data()))
+        
+        plain = self.client.get("/api/sales", headers={'Accept-Encoding': 'identity'})
+        self.assertNotIn('content-encoding', plain.headers)
+        
+        small = self.client.get("/api/metrics", headers={'Accept-Encoding': 'gzip'})
+        self.assertNotIn('content-encoding', small.headers)
+    
+    def test_compressed_strong_etag_gets_suffix(self):
+        """Test: El ETag fuerte del dashboard cambia al comprimir y revalida con sufijo"""
+        plain = self.client.get("/", headers={'Accept-Encoding': 'identity'})
+        compressed = self.client.get("/", headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(compressed.headers['content-encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', compressed.headers['vary'])
+        self.assertEqual(compressed.headers['etag'], plain.headers['etag'][:-1] + '-gzip"')
+        
+        cached = self.client.get("/", headers={'Accept-Encoding': 'gzip',
+                                               'If-None-Match': compressed.headers['etag']})
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached.headers['etag'], compressed.headers['etag'])
+        self.assertIn('Accept-Encoding', cached.headers['vary'])
+        
+        revalidated = self.client.get("/", headers={'Accept-Encoding': 'identity',
+                                                    'If-None-Match': plain.headers['etag']})
+        self.assertEqual(revalidated.status_code, 304)
+        self.assertEqual(revalidated.headers['etag'], plain.headers['etag'])
+        
+        weak = self.client.get("/api/sales", headers={'Accept-Encoding': 'gzip'})
+        self.assertTrue(weak.headers['etag'].startswith('W/'))
+        self.assertNotIn('-gzip', weak.headers['etag'])
+    
+    def test_keyset_pagination_covers_all_rows(self):
+        """Test: Recorrer las páginas devuelve cada fila exactamente una vez"""
+        ids = []
+        cursor = None
+        while True:
+            page, cursor = self.db.get_sales_page(region='Sur', fields=['id', 'date'],
+                                                  after_id=cursor, limit=25)
+            self.assertEqual(list(page.columns), ['id', 'date'])
+            ids.extend(page['id'])
+            if cursor is None:
+                break
+        
+        self.assertEqual(ids, list(self.db.get_sales_data(region='Sur')['id']))
+    
+    def test_invalid_fields_rejected(self):
+        """Test: Una proyección con columnas desconocidas se rechaza"""
+        with self.assertRaises(ValueError):
+            self.db.get_sales_data(fields=['date', 'password'])
+        
+        response = self.client.get("/api/sales?fields=date,password")
+        self.assertEqual(response.status_code, 400)
+    
+    def test_api_pagination_and_projection(self):
+        """Test: /api/sales pagina con cursor y proyecta columnas"""
+        first = self.client.get("/api/sales?limit=100&fields=id,sales_amount").json()
+        self.assertEqual(len(first['data']), 100)
+        self.assertEqual(set(first['data'][0]), {'id', 'sales_amount'})
+        self.assertEqual(first['next_cursor'], first['data'][-1]['id'])
+        
+        rest = self.client.get(f"/api/sales?limit=1000&cursor={first['next_cursor']}").json()
+        self.assertEqual(len(rest['data']), 200)
+        self.assertIsNone(rest['next_cursor'])
+        self.assertGreater(rest['data'][0]['id'], first['next_cursor'])
+
+class TestSalesIngest(unittest.TestCase):
+    def setUp(self):
+        """Configurar base de datos temporal y cliente apuntando a ella"""
+        self.temp_db = tempfile.NamedTemporaryFile(delete=False)
+        self.temp_db.close()
+        self.db = DatabaseManager(self.temp_db.name)
+        self.db.generate_sample_data(100)
+        self.db_patch = mock.patch.object(app_advanced, 'db', self.db)
+        self.db_patch.start()
+        self.client = TestClient(app)
+    
+    def tearDown(self):
+        """Limpiar después del test"""
+        self.db_patch.stop()
+        self.db.close()
+        os.unlink(self.temp_db.name)
+    
+    def ndjson(self, records):
+        return "".join(json.dumps(record) + "\n" for record in records).encode('utf-8')
+    
+    def test_ingest_csv_appends_rows(self):
+        """Test: La ingesta CSV añade filas, actualiza el rollup y la versión de datos"""
+        version = self.db.get_data_version()
+        body = (b"date,product,region,sales_amount,profit,quantity\n"
+                b"2030-01-01,Nuevo,Norte,100.5,20,2\n"
+                b"2030-01-02,Nuevo,Sur,50,5,1\n")
+        
+        report = self.db.ingest(io.BytesIO(body), 'csv')
+        
+        self.assertEqual(report['rows_inserted'], 2)
+        self.assertEqual(report['rows_rejected'], 0)
+        self.assertGreaterEqual(report['rows_per_second'], 0)
+        df = self.db.get_sales_data(product='Nuevo')
+        self.assertEqual(list(df['sales_amount']), [100.5, 50.0])
+        self.assertEqual(list(df['id']), [101, 102])
+        self.assertGreater(self.db.get_data_version(), version)
+        self.assertTrue(self.db.check_rollup()['consistent'])
+    
+    def test_ingest_rejects_invalid_rows(self):
+        """Test: Las filas no válidas se descartan y se informa de cuáles"""
+        valid = {'date': '2030-01-01', 'product': 'Nuevo', 'region': 'Norte',
+                 'sales_amount': 10, 'profit': 1, 'quantity': 1}
+        body = b"".join([
+            self.ndjson([valid, dict(valid, date='2030-1-1')]),
+            b"{no es json\n",
+            self.ndjson([dict(valid, product='  '), dict(valid, quantity=1.5),
+                         dict(valid, sales_amount='abc'), valid]),
+        ])
+        
+        report = self.db.ingest(io.BytesIO(body), 'ndjson', chunk_size=3)
+        
+        self.assertEqual(report['rows_received'], 7)
+        self.assertEqual(report['rows_inserted'], 2)
+        self.assertEqual([(e['row'], e['error']) for e in report['errors']], [
+            (2, 'fecha no válida (YYYY-MM-DD)'),
+            (3, 'fecha no válida (YYYY-MM-DD)'),
+            (4, 'producto vacío'),
+            (5, 'quantity debe ser un entero positivo'),
+            (6, 'sales_amount no numérico'),
+        ])
+        self.assertEqual(len(self.db.get_sales_data(product='Nuevo')), 2)
+    
+    def test_ingest_joined_ndjson_line(self):
+        """Test: Una línea con dos objetos separados por coma es una sola fila no válida"""
+        valid = {'date': '2030-01-01', 'product': 'Nuevo', 'region': 'Norte',
+                 'sales_amount': 10, 'profit': 1, 'quantity': 1}
+        line = json.dumps(valid).encode()
+        body = line + b"\n" + line + b"," + line + b"\n" + line + b"\n"
+        
+        report = self.db.ingest(io.BytesIO(body), 'ndjson')
+        
+        self.assertEqual(report['rows_received'], 3)
+        self.assertEqual(report['rows_inserted'], 2)
+        self.assertEqual([e['row'] for e in report['errors']], [2])
+        self.assertEqual(len(self.db.get_sales_data(product='Nuevo')), 2)
+    
+    def test_ingest_csv_missing_columns(self):
+        """Test: Un CSV sin las columnas de sales se rechaza"""
+        with self.assertRaises(ValueError):
+            self.db.ingest(io.BytesIO(b"date,product\n2030-01-01,Nuevo\n"), 'csv')
+        with self.assertRaises(ValueError):
+            self.db.ingest(io.BytesIO(b""), 'xml')
+    
+    def test_bulk_endpoint(self):
+        """Test: POST /api/sales/bulk acepta NDJSON y CSV y actualiza el resumen"""
+        total_before = self.client.get("/api/metrics").json()['data']['total_sales']
+        records = [{'date': '2030-01-01', 'product': 'Nuevo', 'region': 'Norte',
+                    'sales_amount': 1000, 'profit': 100, 'quantity': 1}] * 3
+        
+        response = self.client.post("/api/sales/bulk", content=self.ndjson(records),
+                                    headers={'Content-Type': 'application/x-ndjson'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['data']['rows_inserted'], 3)
+        
+        response = self.client.post("/api/sales/bulk",
+                                    content=b"date,product,region,sales_amount,profit,quantity\n"
+                                            b"2030-01-02,Nuevo,Sur,500,50,1\n",
+                                    headers={'Content-Type': 'text/csv'})
+        self.assertEqual(response.json()['data']['rows_inserted'], 1)
+        
+        total_after = self.client.get("/api/metrics").json()['data']['total_sales']
+        self.assertAlmostEqual(total_after, total_before + 3500, places=2)
+    
+    def test_bulk_endpoint_errors(self):
+        """Test: Formato no válido o CSV sin columnas devuelven error"""
+        response = self.client.post("/api/sales/bulk", params={'format': 'xml'}, content=b"")
+        self.assertEqual(response.status_code, 422)
+        response = self.client.post("/api/sales/bulk", params={'format': 'csv'},
+                                    content=b"date\n2030-01-01\n")
+        self.assertEqual(response.status_code, 400)
+
+class TestSalesStreaming(unittest.TestCase):
+    def setUp(self):
+        """Configurar base de datos temporal y cliente apuntando a ella"""
+        self.temp_db = tempfile.NamedTemporaryFile(delete=False)
+        self.temp_db.close()
+        self.db = DatabaseManager(self.temp_db.name)
+        self.db.generate_sample_data(1000)
+        self.db_patch = mock.patch.object(app_advanced, 'db', self.db)
+        self.db_patch.start()
+        self.client = TestClient(app)
+    
+    def tearDown(self):
+        """Limpiar después del test"""
+        self.db_patch.stop()
+        self.db.close()
+        os.unlink(self.temp_db.name)
+    
+    def double_sales(self, times):
+        """Duplicar las filas de sales varias veces (más rápido que generarlas)"""
+        columns = "date, product, region, sales_amount, profit, quantity"
+        with self.db.pool.writer() as conn:
+            for _ in range(times):
+                conn.execute(f"INSERT INTO sales ({columns}) SELECT {columns} FROM sales")
+    
+    def peak_streaming_memory(self):
+        """Memoria pico de Python al exportar todas las ventas como NDJSON"""
+        tracemalloc.start()
+        columns, chunks = self.db.iter_sales_rows(chunk_size=1000)
+        total = sum(len(chunk) for chunk in ndjson_chunks(columns, chunks))
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        self.assertGreater(total, 0)
+        return peak
+    
+    def test_streaming_memory_is_bounded(self):
+        """Test: La memoria pico no crece con el número de filas exportadas"""
+        self.double_sales(3)  # 8.000 filas
+        small_peak = self.peak_streaming_memory()
+        
+        self.double_sales(3)  # 64.000 filas
+        large_peak = self.peak_streaming_memory()
+        
+        self.assertLess(large_peak, small_peak * 2)
+    
+    def test_ndjson_format(self):
+        """Test: /api/sales?format=ndjson devuelve una fila JSON por línea"""
+        response = self.client.get("/api/sales?format=ndjson&region=Norte&fields=id,region")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('application/x-ndjson', response.headers['content-type'])
+        
+        rows = [json.loads(line) for line in response.text.splitlines()]
+        self.assertEqual(len(rows), len(self.db.get_sales_data(region='Norte')))
+        self.assertTrue(all(row['region'] == 'Norte' for row in rows))
+    
+    def test_csv_format(self):
+        """Test: /api/sales?format=csv devuelve CSV con cabecera"""
+        response = self.client.get("/api/sales?format=csv")
+        self.assertEqual(response.status_code, 200)
+        
+        df = pd.read_csv(io.StringIO(response.text))
+        self.assertEqual(len(df), 1000)
+        self.assertEqual(list(df.columns), list(self.db.get_sales_data().columns))
+    
+    def test_stream_invalid_fields(self):
+        """Test: Las columnas no válidas se rechazan antes de empezar a transmitir"""
+        response = self.client.get("/api/sales?format=csv&fields=nope")
+        self.assertEqual(response.status_code, 400)
+
+@unittest.skipUnless(duckdb, "requiere duckdb")
+class TestDuckDBBackend(unittest.TestCase):
+    def setUp(self):
+        """Gestores SQLite y DuckDB sobre la misma base de datos temporal"""
+        self.temp_dir = tempfile.mkdtemp()
+        db_path = os.path.join(self.temp_dir, 'analytics.db')
+        self.sqlite_db = DatabaseManager(db_path)
+        self.sqlite_db.generate_sample_data(500, return_df=False)
+        self.duck_db = DatabaseManager(db_path, backend='duckdb',
+                                       mirror_dir=os.path.join(self.temp_dir, 'mirror'))
+        self.client = TestClient(app)
+    
+    def tearDown(self):
+        """Limpiar después del test"""
+        self.duck_db.close()
+        self.sqlite_db.close()
+        shutil.rmtree(self.temp_dir)
+    
+    def get_json(self, db, path, **params):
+        with mock.patch.object(app_advanced, 'db', db):
+            return self.client.get(path, params=params).json()
+    
+    def test_endpoints_match_sqlite(self):
+        """Test: Los endpoints analíticos dan lo mismo con ambos backends"""
+        for path, params in [("/api/data", {}), ("/api/metrics", {}), ("/api/products", {}),
+                             ("/api/regions", {}), ("/api/trends", {'by': 'product'}),
+                             ("/api/trends", {'by': 'product_region'})]:
+            self.assertEqual(self.get_json(self.duck_db, path, **params),
+                             self.get_json(self.sqlite_db, path, **params), path)
+    
+    def test_mirror_follows_writes(self):
+        """Test: El espejo añade las filas ingeridas y se rehace al regenerar sales"""
+        self.assertEqual(self.duck_db.get_analytics_summary(),
+                         self.sqlite_db.get_analytics_summary())
+        
+        self.sqlite_db.ingest(io.BytesIO(b'{"date": "2030-01-01", "product": "Nuevo", '
+                                         b'"region": "Norte", "sales_amount": 1, "profit": 1, '
+                                         b'"quantity": 1}\n'))
+        self.assertEqual(self.duck_db.get_analytics_summary(),
+                         self.sqlite_db.get_analytics_summary())
+        self.assertEqual(self.duck_db.get_trends('region'), self.sqlite_db.get_trends('region'))
+        
+        # Más filas que antes con los ids reiniciados: no vale con añadir
+        self.sqlite_db.generate_sample_data(800, seed=7, return_df=False)
+        self.assertEqual(self.duck_db.get_analytics_summary(),
+                         self.sqlite_db.get_analytics_summary())
+        self.assertEqual(len(os.listdir(os.path.join(self.temp_dir, 'mirror'))), 2)  # parte y .lock
+    
+    def test_mirror_parts_stay_bounded(self):
+        """Test: Muchas ingestas pequeñas no multiplican los ficheros del espejo"""
+        backend = self.duck_db._duckdb
+        for day in range(30):
+            self.sqlite_db.ingest(io.BytesIO(json.dumps({
+                "date": f"2030-01-{day + 1:02d}", "product": "Nuevo", "region": "Norte",
+                "sales_amount": day, "profit": 1, "quantity": 1}).encode() + b"\n"))
+            self.duck_db.get_analytics_summary()
+            self.assertLessEqual(len(backend._parts()), duckdb_backend.MIRROR_MAX_TAIL_PARTS + 1)
+        
+        self.assertEqual(self.duck_db.get_analytics_summary(),
+                         self.sqlite_db.get_analytics_summary())
+        self.assertEqual(self.duck_db.get_trends('product'), self.sqlite_db.get_trends('product'))
+        ids = [(first, last) for _, first, last, _ in backend._parts()]
+        self.assertEqual((ids[0][0], ids[-1][1]), (1, 530))
+        self.assertTrue(all(prev[1] + 1 == nxt[0] for prev, nxt in zip(ids, ids[1:])))
+    
+    def test_unknown_backend(self):
+        """Test: Un backend desconocido se rechaza al crear el gestor"""
+        with self.assertRaises(ValueError):
+            DatabaseManager(os.path.join(self.temp_dir, 'other.db'), backend='postgres')
+
+class TestSnapshotEngine(unittest.TestCase):
+    def setUp(self):
+        """Gestores SQLite y snapshot sobre la misma base de datos temporal"""
+        self.temp_dir = tempfile.mkdtemp()
+        db_path = os.path.join(self.temp_dir, 'analytics.db')
+        self.sqlite_db = DatabaseManager(db_path)
+        self.sqlite_db.generate_sample_data(500, return_df=False)
+        self.snapshot_db = DatabaseManager(db_path, backend='snapshot')
+        self.client = TestClient(app)
+    
+    def tearDown(self):
+        """Limpiar después del test"""
+        self.snapshot_db.close()
+        self.sqlite_db.close()
+        shutil.rmtree(self.temp_dir)
+    
+    def get_json(self, db, path, **params):
+        with mock.patch.object(app_advanced, 'db', db):
+            return self.client.get(path, params=params).json()
+    
+    def test_endpoints_match_sqlite(self):
+        """Test: Los endpoints analíticos dan lo mismo con el snapshot y con SQLite"""
+        start = (datetime.now() - timedelta(days=120)).strftime('%Y-%m-%d')
+        for path, params in [("/api/data", {}), ("/api/metrics", {}), ("/api/products", {}),
+                             ("/api/regions", {}), ("/api/trends", {'by': 'product'}),
+                             ("/api/trends", {'by': 'product_region'}),
+                             ("/api/data", {'start_date': start, 'region': 'Norte'}),
+                             ("/api/data", {'product': 'Laptop', 'end_date': start}),
+                             ("/api/data", {'product': 'Inexistente'})]:
+            self.assertEqual(self.get_json(self.snapshot_db, path, **params),
+                             self.get_json(self.sqlite_db, path, **params), (path, params))
+        
+        health = self.get_json(self.snapshot_db, "/health")
+        self.assertEqual(health["backend"], "snapshot")
+        self.assertEqual(health["snapshot"]["rows"], 500)
+    
+    def test_sparse_cells_match_dense(self):
+        """Test: La tabla de celdas dispersa (np.unique) da lo mismo que la densa"""
+        dense = self.snapshot_db.get_analytics_summary()
+        with mock.patch.object(snapshot, 'CELLS_MAX_DENSE', 0):
+            sparse_db = DatabaseManager(self.snapshot_db.db_path, backend='snapshot')
+            try:
+                self.assertEqual(sparse_db.get_analytics_summary(), dense)
+                self.assertEqual(sparse_db.get_trends('region'), self.sqlite_db.get_trends('region'))
+            finally:
+                sparse_db.close()
+    
+    def test_snapshot_follows_writes(self):
+        """Test: El snapshot añade las filas ingeridas y se rehace al regenerar sales"""
+        self.assertEqual(self.snapshot_db.get_analytics_summary(),
+                         self.sqlite_db.get_analytics_summary())
+        
+        self.sqlite_db.ingest(io.BytesIO(b'{"date": "2030-01-01", "product": "Nuevo", '
+                                         b'"region": "Norte", "sales_amount": 1, "profit": 1, '
+                                         b'"quantity": 40000}\n'))
+        self.assertEqual(self.snapshot_db.get_analytics_summary(),
+                         self.sqlite_db.get_analytics_summary())
+        self.assertEqual(self.snapshot_db.get_trends('product'),
+                         self.sqlite_db.get_trends('product'))
+        # quantity se amplía a int32 por la fila con 40000 unidades
+        usage = self.snapshot_db.sales_snapshot().memory_usage()
+        self.assertEqual((usage['rows'], usage['bytes_per_million_rows']), (501, 28_000_000))
+        
+        # Más filas que antes con los ids reiniciados: no vale con añadir
+        self.sqlite_db.generate_sample_data(800, seed=7, return_df=False)
+        self.assertEqual(self.snapshot_db.get_analytics_summary(),
+                         self.sqlite_db.get_analytics_summary())
+        usage = self.snapshot_db.sales_snapshot().memory_usage()
+        self.assertEqual((usage['rows'], usage['bytes_per_million_rows']), (800, 26_000_000))
+
+    def test_incremental_cells_match_rebuild(self):
+        """Test: Las celdas fundidas tras ingestas coinciden con agregar todas las filas"""
+        snap = self.snapshot_db.sales_snapshot()
+        first_day = self.sqlite_db.get_sales_data()['date'].min()
+        self.snapshot_db.get_analytics_summary()
+        body = b"".join(json.dumps({"date": date, "product": product, "region": "Norte",
+                                    "sales_amount": 5, "profit": 1, "quantity": 2}).encode() + b"\n"
+                        for date, product in [(first_day, "Laptop Pro"), (first_day, "Nuevo"),
+                                              ("2030-01-01", "Laptop Pro")])
+        checked = []
+        with mock.patch.object(self.snapshot_db, 'check_working_set',
+                               side_effect=lambda nbytes, _: checked.append(nbytes)):
+            self.sqlite_db.ingest(io.BytesIO(body))
+            with mock.patch.object(snap, '_cells_of', wraps=snap._cells_of) as cells_of:
+                self.assertEqual(self.snapshot_db.get_analytics_summary(),
+                                 self.sqlite_db.get_analytics_summary())
+        # Solo se agregaron las 3 filas nuevas
+        self.assertEqual([call.args for call in cells_of.call_args_list], [(500,)])
+        
+        full = snap._cells_of(0)
+        for name, values in snap._cells.items():
+            np.testing.assert_array_equal(values, full[name], err_msg=name)
+        # El presupuesto cubre la capacidad reservada y las celdas, no solo las filas
+        allocated = sum(buffer.nbytes for buffer in snap._buffers.values())
+        self.assertGreaterEqual(checked[-1], allocated + len(full['day']) * snapshot.CELL_BYTES)
+    
+    def test_rebuild_keeps_previous_view(self):
+        """Test: Durante una reconstrucción las lecturas ven el snapshot anterior completo"""
+        snap = self.snapshot_db.sales_snapshot()
+        snap.chunk_size = 100
+        self.snapshot_db.get_analytics_summary()
+        seen = []
+        iter_query = self.snapshot_db._iter_query
+        
+        def observed(*args):
+            for rows in iter_query(*args):
+                seen.append(int(snap._view[0]['orders'].sum()))
+                yield rows
+        
+        self.sqlite_db.generate_sample_data(800, seed=7, return_df=False)
+        with mock.patch.object(self.snapshot_db, '_iter_query', side_effect=observed):
+            summary = self.snapshot_db.get_analytics_summary()
+        self.assertEqual(seen, [500] * 8)
+        self.assertEqual(summary, self.sqlite_db.get_analytics_summary())
+        
+        # Un fallo a mitad de carga conserva la vista y fuerza otra reconstrucción
+        self.sqlite_db.generate_sample_data(300, seed=3, return_df=False)
+        with mock.patch.object(self.snapshot_db, '_iter_query', side_effect=RuntimeError("fallo")):
+            with self.assertRaises(RuntimeError):
+                snap.refresh()
+        self.assertEqual(int(snap._view[0]['orders'].sum()), 800)
+        self.assertEqual(self.snapshot_db.get_analytics_summary(),
+                         self.sqlite_db.get_analytics_summary())
+
+class TestSummaryCache(unittest.TestCase):
+    def setUp(self):
+        """Configurar caché con reloj controlado"""
+        self.now = 0.0
+        self.cache = SummaryCache(ttl=10, maxsize=2, clock=lambda: self.now)
+    
+    def test_ttl_expiration(self):
+        """Test: Las entradas caducan al superar el TTL"""
+        self.assertEqual(self.cache.get_or_compute('a', lambda: 1), 1)
+        self.assertEqual(self.cache.get_or_compute('a', lambda: 2), 1)
+        
+        self.now = 11
+        self.assertEqual(self.cache.get_or_compute('a', lambda: 3), 3)
+    
+    def test_lru_eviction(self):
+        """Test: Se expulsa la entrada menos usada al superar el tamaño"""
+        self.cache.set('a', 1)
+        self.cache.set('b', 2)
+        self.cache.get('a')
+        self.cache.set('c', 3)
+        
+        self.assertEqual(self.cache.get('a'), (True, 1))
+        self.assertEqual(self.cache.get('b'), (False, None))
+        self.assertEqual(len(self.cache), 2)
+    
+    def test_concurrent_misses_compute_once(self):
+        """Test: N fallos simultáneos provocan un único cálculo"""
+        calls = []
+        started = threading.Event()
+        
+        def compute():
+            calls.append(1)
+            started.set()
+            time.sleep(0.2)
+            return 'summary'
+        
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(self.cache.get_or_compute('k', compute)))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ['summary'] * 8)
+    
+    def test_invalidated_on_sample_data_generation(self):
+        """Test: Generar datos invalida la caché y cambia la versión"""
+        temp_db = tempfile.NamedTemporaryFile(delete=False)
+        temp_db.close()
+        try:
+            db = DatabaseManager(temp_db.name)
+            db.add_change_listener(self.cache.invalidate)
+            version = db.get_data_version()
+            self.cache.set('summary', {'cached': True})
+            
+            db.generate_sample_data(10)
+            
+            self.assertEqual(self.cache.get('summary'), (False, None))
+            self.assertGreater(db.get_data_version(), version)
+            db.close()
+        finally:
+            os.unlink(temp_db.name)
+
+class TestExecution(unittest.TestCase):
+    def test_queue_depth_limit(self):
+        """Test: Se rechazan peticiones cuando la cola está llena"""
+        executor = DatabaseExecutor(max_workers=1, max_queue=1, timeout=5)
+        release = threading.Event()
+        
+        async def scenario():
+            running = asyncio.ensure_future(executor.run(release.wait))
+            queued = asyncio.ensure_future(executor.run(release.wait))
+            await asyncio.sleep(0.05)
+            with self.assertRaises(QueueFullError):
+                await executor.run(release.wait)
+            release.set()
+            await asyncio.gather(running, queued)
+        
+        try:
+            asyncio.run(scenario())
+            self.assertEqual(executor.pending, 0)
+        finally:
+            executor.shutdown()
+    
+    def test_progress_from_process_pool(self):
+        """Test: Una exportación en un proceso del pool informa del progreso al hilo que espera"""
+        temp_dir = tempfile.mkdtemp()
+        db = DatabaseManager(os.path.join(temp_dir, 'analytics.db'))
+        executor = DatabaseExecutor(max_workers=1, max_queue=1, processes=True)
+        try:
+            db.generate_sample_data(120, return_df=False)
+            rows = []
+            path = os.path.join(temp_dir, 'sales.csv')
+            executor.call_with_progress(db.export_table, 'sales', 'csv', path,
+                                        progress=rows.append, chunk_size=50)
+            self.assertEqual(sum(rows), 120)
+            self.assertEqual(len(pd.read_csv(path)), 120)
+            with self.assertRaises(ValueError):
+                executor.call_with_progress(db.export_table, 'inexistente', 'csv', path)
+        finally:
+            executor.shutdown()
+            db.close()
+            shutil.rmtree(temp_dir)
+    
+    def test_request_timeout(self):
+        """Test: Una tarea que supera el timeout devuelve TimeoutError"""
+        executor = DatabaseExecutor(max_workers=1, max_queue=0, timeout=0.05)
+        try:
+            with self.assertRaises(asyncio.TimeoutError):
+                asyncio.run(executor.run(time.sleep, 0.3))
+        finally:
+            executor.shutdown()
+    
+    def test_health_not_blocked_by_export(self):
+        """Test: /health responde mientras una exportación está en curso"""
+        original_export = app_advanced.db.export_to_excel
+        
+        def slow_export(filename, summary=None):
+            time.sleep(1.0)
+            return original_export(filename, summary)
+        
+        async def scenario():
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                export_task = asyncio.create_task(client.get("/api/export/excel"))
+                await asyncio.sleep(0.1)
+                
+                start = time.perf_counter()
+                response = await client.get("/health")
+                elapsed = time.perf_counter() - start
+                
+                self.assertEqual(response.status_code, 200)
+                self.assertFalse(export_task.done())
+                self.assertLess(elapsed, 0.5)
+                self.assertEqual((await export_task).status_code, 200)
+        
+        # El pool de procesos no puede serializar el mock; usar hilos en el test
+        thread_executor = DatabaseExecutor(max_workers=1, max_queue=1, timeout=10)
+        with mock.patch.object(app_advanced, 'export_executor', thread_executor), \
+                mock.patch.object(app_advanced.db, 'export_to_excel', side_effect=slow_export):
+            asyncio.run(scenario())
+        thread_executor.shutdown()
+
+class TestExportJobs(unittest.TestCase):
+    def setUp(self):
+        """Configurar base de datos, directorio de trabajos y cliente"""
+        self.temp_db = tempfile.NamedTemporaryFile(delete=False)
+        self.temp_db.close()
+        self.db = DatabaseManager(self.temp_db.name)
+        self.db.generate_sample_data(300)
+        self.directory = tempfile.mkdtemp()
+        self.now = 1000.0
+        self.release = threading.Event()
+        self.calls = []
+        
+        def blocked_runner(path, progress, **params):
+            self.calls.append(params)
+            self.release.wait(5)
+            if params.get('fail'):
+                raise RuntimeError("fallo")
+            progress(7)
+            with open(path, 'w') as f:
+                f.write("ok")
+        
+        self.manager = ExportJobManager({'test': blocked_runner}, self.directory,
+                                        max_workers=1, max_queue=1, retention=60,
+                                        clock=lambda: self.now)
+        self.app_jobs = ExportJobManager(
+            {'excel': app_advanced.run_excel_job, 'csv': app_advanced.run_csv_job},
+            self.directory
+        )
+        self.patches = [mock.patch.object(app_advanced, 'db', self.db),
+                        mock.patch.object(app_advanced, 'export_jobs', self.app_jobs)]
+        for patch in self.patches:
+            patch.start()
+        self.client = TestClient(app)
+    
+    def tearDown(self):
+        """Limpiar después del test"""
+        self.release.set()
+        for patch in self.patches:
+            patch.stop()
+        self.manager.shutdown()
+        self.app_jobs.shutdown()
+        self.db.close()
+        os.unlink(self.temp_db.name)
+        for name in os.listdir(self.directory):
+            os.remove(os.path.join(self.directory, name))
+        os.rmdir(self.directory)
+    
+    def wait_for(self, job_id):
+        """Consultar el estado hasta que el trabajo termine"""
+        for _ in range(200):
+            job = self.client.get(f"/api/exports/{job_id}").json()['data']
+            if job['status'] in (DONE, FAILED):
+                return job
+            time.sleep(0.02)
+        self.fail("La exportación no terminó")
+    
+    def test_csv_job_progress_and_download(self):
+        """Test: Una exportación CSV encolada informa de las filas y se descarga"""
+        response = self.client.post("/api/exports", json={'kind': 'csv', 'table': 'sales'})
+        self.assertEqual(response.status_code, 202)
+        job_id = response.json()['data']['id']
+        self.assertEqual(response.headers['location'], f"/api/exports/{job_id}")
+        
+        job = self.wait_for(job_id)
+        self.assertEqual(job['status'], DONE)
+        self.assertEqual(job['rows_written'], 300)
+        
+        download = self.client.get(job['download_url'])
+        self.assertEqual(download.status_code, 200)
+        self.assertEqual(download.headers['content-type'], 'text/csv; charset=utf-8')
+        df = pd.read_csv(io.StringIO(download.text))
+        self.assertEqual(list(df['id']), list(range(1, 301)))
+    
+    def test_excel_job_counts_all_sheets(self):
+        """Test: El progreso de Excel suma las filas de todas las tablas"""
+        response = self.client.post("/api/exports", json={'kind': 'excel'})
+        job = self.wait_for(response.json()['data']['id'])
+        self.assertEqual(job['status'], DONE)
+        self.assertEqual(job['rows_written'], 300 + 10 + 5)
+    
+    def test_invalid_requests(self):
+        """Test: Tipos o tablas no válidos y trabajos desconocidos"""
+        self.assertEqual(self.client.post("/api/exports", json={'kind': 'pdf'}).status_code, 422)
+        response = self.client.post("/api/exports", json={'kind': 'csv', 'table': 'users'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get("/api/exports/desconocido").status_code, 404)
+        self.assertEqual(self.client.get("/api/exports/desconocido/download").status_code, 404)
+    
+    def test_download_before_done(self):
+        """Test: Descargar un trabajo sin terminar devuelve 409"""
+        blocked = ExportJobManager({'excel': lambda path, progress: self.release.wait(5)},
+                                   self.directory)
+        with mock.patch.object(app_advanced, 'export_jobs', blocked):
+            job_id = self.client.post("/api/exports", json={'kind': 'excel'}).json()['data']['id']
+            response = self.client.get(f"/api/exports/{job_id}/download")
+        self.release.set()
+        blocked.shutdown()
+        self.assertEqual(response.status_code, 409)
+    
+    def test_identical_requests_deduplicated(self):
+        """Test: Peticiones idénticas reutilizan el mismo trabajo"""
+        first, created = self.manager.submit('test', {'table': 'sales'}, 'a.csv', version=1)
+        second, created_again = self.manager.submit('test', {'table': 'sales'}, 'a.csv', version=1)
+        other, _ = self.manager.submit('test', {'table': 'sales'}, 'a.csv', version=2)
+        
+        self.assertTrue(created)
+        self.assertFalse(created_again)
+        self.assertIs(first, second)
+        self.assertIsNot(first, other)
+    
+    def test_queue_limit(self):
+        """Test: Se rechazan trabajos cuando el pool y la cola están llenos"""
+        self.manager.submit('test', {'n': 1})
+        self.manager.submit('test', {'n': 2})
+        with self.assertRaises(QueueFullError):
+            self.manager.submit('test', {'n': 3})
+        with self.assertRaises(ValueError):
+            self.manager.submit('desconocido')
+    
+    def test_failed_job_is_retried(self):
+        """Test: Un trabajo fallido no se deduplica y no deja fichero"""
+        self.release.set()
+        job, _ = self.manager.submit('test', {'fail': True})
+        self.manager.shutdown()
+        self.assertEqual(job.status, FAILED)
+        self.assertEqual(job.error, "fallo")
+        self.assertFalse(os.path.exists(job.path))
+        
+        retry, created = self.manager.submit('test', {'fail': True})
+        self.assertTrue(created)
+        self.assertIsNot(retry, job)
+    
+    def test_retention_removes_artifacts(self):
+        """Test: Los ficheros terminados se borran al vencer la retención"""
+        self.release.set()
+        job, _ = self.manager.submit('test', {})
+        self.manager.shutdown()
+        self.assertEqual(job.status, DONE)
+        self.assertEqual(job.rows_written, 7)
+        self.assertTrue(os.path.exists(job.path))
+        
+        self.now += 59
+        self.assertIs(self.manager.get(job.id), job)
+        self.now += 1
+        self.assertIsNone(self.manager.get(job.id))
+        self.assertFalse(os.path.exists(job.path))
+
+    def test_sweep_removes_orphaned_files(self):
+        """Test: El barrido borra ficheros caducados que no están en la tabla de trabajos"""
+        stale = os.path.join(self.directory, "anterior_sales.csv")
+        fresh = os.path.join(self.directory, "reciente_sales.csv")
+        for path, mtime in ((stale, self.now - 61), (fresh, self.now - 59)):
+            with open(path, 'w') as f:
+                f.write("x")
+            os.utime(path, (mtime, mtime))
+        
+        self.assertEqual(self.manager.sweep(), 1)
+        self.assertEqual(os.listdir(self.directory), ["reciente_sales.csv"])
+        
+        # Al arrancar la aplicación se barre el directorio de exportaciones
+        os.utime(fresh, (0, 0))
+        with mock.patch.object(app_advanced, 'export_jobs', self.app_jobs):
+            with TestClient(app):
+                self.assertFalse(os.path.exists(fresh))
+    
+class TestConnectionPool(unittest.TestCase):
+    def setUp(self):
+        """Configurar pool sobre una base de datos temporal"""
+        self.temp_db = tempfile.NamedTemporaryFile(delete=False)
+        self.temp_db.close()
+        self.pool = ConnectionPool(self.temp_db.name, size=2)
+    
+    def tearDown(self):
+        """Limpiar después del test"""
+        self.pool.close()
+        os.unlink(self.temp_db.name)
+    
+    def test_pragmas_applied(self):
+        """Test: Las conexiones se abren con WAL y pragmas ajustados"""
+        with self.pool.reader() as conn:
+            self.assertEqual(conn.execute("PRAGMA journal_mode").fetchone()[0], 'wal')
+            self.assertEqual(conn.execute("PRAGMA synchronous").fetchone()[0], 1)  # NORMAL
+            self.assertEqual(conn.execute("PRAGMA temp_store").fetchone()[0], 2)  # MEMORY
+            self.assertLess(conn.execute("PRAGMA cache_size").fetchone()[0], 0)
+    
+    def test_connections_are_reused(self):
+        """Test: Las conexiones de lectura se reutilizan entre peticiones"""
+        with self.pool.reader() as first:
+            pass
+        with self.pool.reader() as second:
+            pass
+        self.assertIs(first, second)
+    
+    def test_writer_rolls_back_on_error(self):
+        """Test: El escritor revierte la transacción si hay un error"""
+        with self.pool.writer() as conn:
+            conn.execute("CREATE TABLE t (x INTEGER)")
+        
+        with self.assertRaises(ValueError):
+            with self.pool.writer() as conn:
+                conn.execute("INSERT INTO t VALUES (1)")
+                raise ValueError("fallo")
+        
+        with self.pool.reader() as conn:
+            self.assertEqual(conn.execute("SELECT COUNT(*) FROM t").fetchone()[0], 0)
+
 def run_tests():
     """Ejecutar todos los tests"""
     # Crear suite de tests
@@ -235,6 +1949,9 @@ def run_tests():
     
     # Añadir tests de base de datos
     test_suite.addTest(unittest.makeSuite(TestDatabaseManager))
+    test_suite.addTest(unittest.makeSuite(TestSchemaMigrations))
+    test_suite.addTest(unittest.makeSuite(TestSalesRollup))
+    test_suite.addTest(unittest.makeSuite(TestExcelExport))
     
     # Añadir tests de API
     test_suite.addTest(unittest.makeSuite(TestAPI))
@@ -242,6 +1959,23 @@ def run_tests():
     # Añadir tests de procesamiento de datos
     test_suite.addTest(unittest.makeSuite(TestDataProcessing))
     
+    # Añadir tests de consultas de ventas
+    test_suite.addTest(unittest.makeSuite(TestSalesQueries))
+    test_suite.addTest(unittest.makeSuite(TestSalesStreaming))
+    test_suite.addTest(unittest.makeSuite(TestSalesIngest))
+    test_suite.addTest(unittest.makeSuite(TestDuckDBBackend))
+    test_suite.addTest(unittest.makeSuite(TestSnapshotEngine))
+    
+    # Añadir tests de caché
+    test_suite.addTest(unittest.makeSuite(TestSummaryCache))
+    
+    # Añadir tests del modelo de ejecución
+    test_suite.addTest(unittest.makeSuite(TestExecution))
+    test_suite.addTest(unittest.makeSuite(TestExportJobs))
+    
+    # Añadir tests del pool de conexiones
+    test_suite.addTest(unittest.makeSuite(TestConnectionPool))
+    
     # Ejecutar tests
     runner = unittest.TextTestRunner(verbosity=2)
     result = runner.run(test_suite)